@@ -5,9 +5,8 @@ from alembic import context
 import os
 import sys
 
-# import Base และ models
-from models import Base
-from database import Base
+# ตารางของ SQL storage backend
+from models.backends.sql import metadata
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -18,7 +17,7 @@ if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
 # เพิ่ม target_metadata
-target_metadata = Base.metadata
+target_metadata = metadata
 
 def get_url():
     DATABASE_URL = os.getenv("DATABASE_URL")
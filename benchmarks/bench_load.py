@@ -0,0 +1,209 @@
+"""End-to-end load test of the chat API
+
+Drives the real FastAPI app from main.py in process (httpx ASGI transport)
+with simulated students against the in-memory storage backend. Every
+student registers, logs in, starts a chat and waits to be matched,
+exchanges messages while polling for new ones, then leaves the chat.
+
+Reports requests/sec and p50/p95/p99 latency per endpoint and compares
+them with the stored baseline. The exit status is 1 when an endpoint
+regresses by more than --tolerance. Timings depend on the machine, so
+re-save the baseline when comparing on different hardware.
+
+    python benchmarks/bench_load.py --students 200 --messages 10
+    python benchmarks/bench_load.py --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baselines", "load.json")
+sys.path.insert(0, ROOT)
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.throttled: Dict[str, int] = defaultdict(int)
+
+    def add(self, endpoint: str, seconds: float, status: int) -> None:
+        if status == 503:
+            self.throttled[endpoint] += 1
+            return
+        self.latencies[endpoint].append(seconds)
+        if status >= 400:
+            self.errors[endpoint] += 1
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class Student:
+    def __init__(self, client, recorder: Recorder, username: str, school: str):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.school = school
+        self.headers: Dict[str, str] = {}
+
+    async def call(self, method: str, endpoint: str, path: Optional[str] = None, **kwargs):
+        while True:
+            start = time.perf_counter()
+            response = await self.client.request(method, path or endpoint, headers=self.headers, **kwargs)
+            self.recorder.add(f"{method} {endpoint}", time.perf_counter() - start, response.status_code)
+            # 503 คือ backpressure (เช่นคิว bcrypt เต็ม) ให้รอแล้วลองใหม่เหมือน client จริง
+            if response.status_code != 503:
+                return response
+            await asyncio.sleep(0.05)
+
+    async def run(self, messages: int, match_timeout: float) -> None:
+        await self.call("POST", "/register", json={
+            "username": self.username,
+            "email": f"{self.username}@example.com",
+            "school": self.school,
+            "password": "load-test-password"
+        })
+        token = await self.call("POST", "/token", data={
+            "username": self.username,
+            "password": "load-test-password"
+        })
+        self.headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+
+        result = (await self.call("POST", "/chat/start-chat")).json()
+        deadline = time.perf_counter() + match_timeout
+        while result.get("status") != "matched":
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{self.username} was never matched")
+            await asyncio.sleep(0.01)
+            result = (await self.call("GET", "/chat/waiting-status")).json() or {}
+        chat_id = result["chat_id"]
+
+        messages_endpoint = "/chat/chat-messages/{chat_id}"
+        cursor = None
+        for i in range(messages):
+            await self.call(
+                "POST", "/chat/send-message/{chat_id}", f"/chat/send-message/{chat_id}",
+                json={"content": f"ข้อความที่ {i} จาก {self.username}"}
+            )
+            params = {"after": cursor} if cursor else {}
+            page = await self.call("GET", messages_endpoint, f"/chat/chat-messages/{chat_id}", params=params)
+            cursor = page.headers.get("x-next-cursor", cursor)
+
+        await self.call("POST", "/chat/leave-chat/{chat_id}", f"/chat/leave-chat/{chat_id}")
+
+async def run_load(students: int, schools: int, messages: int, concurrency: int, match_timeout: float):
+    import httpx
+    from main import app
+
+    recorder = Recorder()
+    limit = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int) -> None:
+            async with limit:
+                await Student(client, recorder, f"student{i:05d}", f"school-{i % schools}").run(
+                    messages, match_timeout
+                )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(students)))
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        results[endpoint] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throttled": recorder.throttled.get(endpoint, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        }
+    return results
+
+def compare(results, baseline, tolerance: float) -> List[str]:
+    regressions = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        current = results.get(endpoint)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: {base['rps']:.1f} -> {current['rps']:.1f} req/s")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{endpoint}: {current['errors']} errors")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--schools", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--match-timeout", type=float, default=30.0)
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if args.students % (2 * args.schools):
+        parser.error("--students must be a multiple of 2 * --schools so everyone gets a partner")
+
+    # ต้องตั้งก่อน import main
+    os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    import logging
+    logging.disable(logging.INFO)
+
+    recorder, elapsed = asyncio.run(run_load(
+        args.students, args.schools, args.messages, args.concurrency, args.match_timeout
+    ))
+    results = summarize(recorder, elapsed)
+
+    total = sum(r["requests"] for r in results.values())
+    print(f"students={args.students} schools={args.schools} messages={args.messages} "
+          f"concurrency={args.concurrency} bcrypt_rounds={args.bcrypt_rounds}")
+    print(f"{total} requests in {elapsed:.2f}s ({total / elapsed:,.0f} req/s)\n")
+    print(f"{'endpoint':<38} {'reqs':>6} {'err':>4} {'503':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<38} {r['requests']:>6} {r['errors']:>4} {r['throttled']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+    config = {k: getattr(args, k) for k in ("students", "schools", "messages", "concurrency", "bcrypt_rounds")}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"config": config, "endpoints": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return
+
+    if not os.path.exists(BASELINE_PATH):
+        print("\nNo baseline yet, run with --save-baseline")
+        return
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != config:
+        print(f"\nBaseline was recorded with {baseline.get('config')}, skipping comparison")
+        return
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance:.0%} of baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Matchmaking engine throughput
+
+Fills the in-memory queues with waiting users and measures how many
+matches per second MatchmakingQueue.match() sustains while the queues
+stay at that depth.
+
+    python benchmarks/bench_matchmaking.py --waiting 10000 --schools 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.matchmaking import MatchmakingQueue
+
+def run(waiting: int, schools: int, matches: int) -> float:
+    queue = MatchmakingQueue(wait_timeout=3600)
+    school_names = [f"school-{i}" for i in range(schools)]
+    for i in range(waiting):
+        queue.enqueue(f"waiting-{i}", school_names[i % schools])
+
+    # ทุกการจับคู่ที่สำเร็จจะเติมคนใหม่เข้าคิว ให้ความลึกของคิวคงที่
+    start = time.perf_counter()
+    for i in range(matches):
+        school = school_names[i % schools]
+        if queue.match(f"arrival-{i}", school) is not None:
+            queue.enqueue(f"refill-{i}", school)
+    elapsed = time.perf_counter() - start
+
+    assert queue.depth() == waiting
+    return matches / elapsed
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--waiting", type=int, default=10_000)
+    parser.add_argument("--schools", type=int, default=20)
+    parser.add_argument("--matches", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rate = run(args.waiting, args.schools, args.matches)
+    print(f"waiting={args.waiting} schools={args.schools} matches={args.matches}")
+    print(f"{rate:,.0f} matches/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Password verification throughput (logins/sec)
+
+Runs concurrent verifications through PasswordHasher, the way a burst of
+/token requests does, and reports logins per second overall and per
+worker thread. Also reports how long the event loop went without running
+while the burst was in flight (it should stay near zero).
+
+    python benchmarks/bench_passwords.py --rounds 12 --workers 4 --logins 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.passwords import PasswordHasher
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    """Longest gap between wakeups of a 1 ms ticker"""
+    worst = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        worst = max(worst, now - last - 0.001)
+        last = now
+    return worst
+
+async def run(rounds: int, workers: int, logins: int):
+    hasher = PasswordHasher(rounds, workers, max_pending=logins)
+    hashed = await hasher.hash("correct horse battery staple")
+
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        hasher.verify("correct horse battery staple", hashed) for _ in range(logins)
+    ))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    stall = await watcher
+
+    assert all(results)
+    return logins / elapsed, stall
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    rate, stall = asyncio.run(run(args.rounds, args.workers, args.logins))
+    print(f"rounds={args.rounds} workers={args.workers} logins={args.logins} cpus={os.cpu_count()}")
+    print(f"{rate:,.1f} logins/sec ({rate / args.workers:,.1f} per worker)")
+    print(f"longest event loop stall: {stall * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
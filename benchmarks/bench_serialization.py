@@ -0,0 +1,67 @@
+"""Response encoding cost of a chat message page
+
+Encodes a page of messages the way each response path does and reports
+the time per encode and the payload size:
+
+- baseline: FastAPI's jsonable_encoder + stdlib json (the old default)
+- orjson: NegotiatedResponse for Accept: application/json
+- msgpack: NegotiatedResponse for Accept: application/msgpack
+
+    python benchmarks/bench_serialization.py --messages 50 --rounds 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from utils.serialization import dumps_json, dumps_msgpack
+
+def make_page(messages: int):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"msg{i:017d}",
+            "chat_id": "Xk2vR8mQpL4nT7wY9zAb",
+            "sender_id": "student_one" if i % 2 else "student_two",
+            "content": f"ข้อความที่ {i} สวัสดีครับ วันนี้เรียนวิชาอะไรบ้าง",
+            "emoji": None,
+            "created_at": start + timedelta(seconds=i * 7),
+        }
+        for i in range(messages)
+    ]
+
+def measure(encode, page, rounds: int):
+    payload = encode(page)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode(page)
+    elapsed = time.perf_counter() - start
+    return elapsed / rounds * 1e6, len(payload)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    page = make_page(args.messages)
+    encoders = {
+        "baseline": lambda p: json.dumps(jsonable_encoder(p)).encode(),
+        "orjson": dumps_json,
+        "msgpack": dumps_msgpack,
+    }
+
+    print(f"messages={args.messages} rounds={args.rounds}")
+    baseline_us = None
+    for name, encode in encoders.items():
+        us, size = measure(encode, page, args.rounds)
+        baseline_us = baseline_us or us
+        print(f"{name:>9}: {us:8.1f} us/encode  {size:6d} bytes  {baseline_us / us:5.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Cold start: import-to-first-request time
+
+Starts a fresh interpreter for every run, imports main, runs the startup
+events and serves GET /system/health in process. Reports the median
+import time and import-to-first-response time. Nothing in this path
+should touch the network, so it also runs without credentials.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    response = client.get("/system/health")
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({"import": imported - start, "first_request": served - start}))
+"""
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    imports = statistics.median(r["import"] for r in runs) * 1000
+    first = statistics.median(r["first_request"] for r in runs) * 1000
+    print(f"runs={args.runs}")
+    print(f"import main:               {imports:7.1f} ms (median)")
+    print(f"import to first response: {first:7.1f} ms (median)")
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,57 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    STATELESS_AUTH: bool = True  # เชื่อข้อมูลผู้ใช้ใน token โดยไม่อ่านฐานข้อมูลทุก request
+    REVOCATION_REFRESH_SECONDS: int = 30
+
+    # Password hashing
+    BCRYPT_ROUNDS: int = 12  # เปลี่ยนแล้ว hash เดิมจะถูก rehash ตอน login
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_MAX_PENDING: int = 64  # เกินนี้ตอบ 503 แทนการต่อคิว
+
+    # Storage
+    STORAGE_BACKEND: str = "firestore"  # "firestore", "memory" (ทดสอบ/load test) หรือ "sql"
+    STORAGE_SQL_URL: str = "sqlite:///local.db"
+
+    # Firestore
+    FIRESTORE_MAX_WORKERS: int = 32  # จำนวน thread สูงสุดที่เรียก Firestore พร้อมกัน
+    FIRESTORE_STATS_HEADER: bool = False  # ส่ง X-Firestore-Reads/Writes/Deletes กลับไปเพื่อ debug
+    STARTUP_READINESS_CHECK: bool = False  # อ่าน Firestore หนึ่งครั้งตอน startup ให้ล้มทันทีถ้าเชื่อมต่อไม่ได้
+
+    # User cache
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+    CACHE_INVALIDATION_CHANNEL: str = "local"  # "local" หรือ "firestore" เมื่อรันหลาย worker
+    CACHE_INVALIDATION_POLL_SECONDS: int = 5
+
+    # Matchmaking
+    MATCHMAKING_WAIT_TIMEOUT_SECONDS: int = 300  # ไม่เช็คสถานะเกินเวลานี้จะถูกข้ามตอนจับคู่
+    MATCHMAKING_MODE: str = "immediate"  # "immediate" จับคู่ทันที หรือ "tick" จับคู่เป็นรอบ
+    MATCHMAKING_TICK_MS: int = 500
+    MATCHMAKING_MAX_BATCH: int = 250  # จำนวนคู่สูงสุดต่อรอบ
+
+    # Presence
+    ONLINE_WINDOW_SECONDS: int = 300  # ถือว่าออนไลน์ถ้าส่ง heartbeat ล่าสุดภายในช่วงนี้
+    PRESENCE_FLUSH_SECONDS: int = 60  # เขียน last_online ลง Firestore ไม่เกินหนึ่งครั้งต่อผู้ใช้ต่อช่วงนี้
+
+    # Realtime
+    SSE_KEEPALIVE_SECONDS: int = 15
+
+    # Hot-chat message buffer (0 = ปิด)
+    MESSAGE_BUFFER_SIZE: int = 200  # ข้อความล่าสุดต่อห้อง
+    MESSAGE_BUFFER_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Group commit ของการเขียนข้อความ
+    MESSAGE_BATCH_MAX_OPS: int = 200  # สูงสุด 500 ตามข้อจำกัดของ Firestore
+    MESSAGE_BATCH_DELAY_MS: int = 5
+
+    # Blob store ของรูปโปรไฟล์
+    BLOB_STORE: str = "local"  # "local" หรือ "cloud_storage"
+    BLOB_STORE_PATH: str = "blobs"
+    BLOB_STORE_BUCKET: str = ""  # ว่าง = bucket เริ่มต้นของโปรเจกต์ Firebase
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024
+    AVATAR_SIZES: list = [64, 256]  # ขนาด (px) ของ thumbnail และรูปโปรไฟล์ ใช้ค่าเล็กสุดกับใหญ่สุด
+    AVATAR_WORKERS: int = 2  # จำนวน process ที่ย่อรูป
 
     # CORS
     CORS_ORIGINS: list = [
@@ -2,12 +2,25 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 import json
+import threading
 
 # Collection names
 USERS_COLLECTION = 'users'
 CHATS_COLLECTION = 'chats'
 MESSAGES_COLLECTION = 'messages'
 SCHOOLS_COLLECTION = 'schools'
+REVOKED_TOKENS_COLLECTION = 'revoked_tokens'
+CACHE_INVALIDATIONS_COLLECTION = 'cache_invalidations'
+ONLINE_COUNTS_COLLECTION = 'online_counts'
+
+# เอกสารที่ readiness probe อ่าน (ไม่จำเป็นต้องมีอยู่จริง)
+READINESS_COLLECTION = 'system'
+READINESS_DOCUMENT = 'readiness'
+
+# สร้าง Firebase app และ client ตอนใช้งานครั้งแรก ไม่ใช่ตอน import
+_app = None
+_db = None
+_lock = threading.Lock()
 
 def initialize_firebase():
     try:
@@ -21,20 +34,43 @@ def initialize_firebase():
             cred = credentials.Certificate('serviceAccountKey.json')
 
         # Initialize Firebase
-        firebase_admin.initialize_app(cred)
-        return firestore.client()
+        app = firebase_admin.initialize_app(cred)
+        print("Firebase initialized successfully!")
+        return app
     except Exception as e:
         print(f"Firebase initialization error: {e}")
         raise
 
-# Initialize Firebase and get db instance
-db = initialize_firebase()
-print("Firebase initialized successfully!")
+def get_firebase_app():
+    """Returns the Firebase app, initializing it on first use"""
+    global _app
+    if _app is None:
+        with _lock:
+            if _app is None:
+                _app = initialize_firebase()
+    return _app
 
 def get_firestore_db():
-    """Returns the Firestore database instance"""
-    return db
+    """Returns the Firestore database instance, creating it on first use"""
+    global _db
+    if _db is None:
+        app = get_firebase_app()
+        with _lock:
+            if _db is None:
+                _db = firestore.client(app)
+    return _db
+
+def check_connection():
+    """Readiness probe: one document read, no writes"""
+    get_firestore_db().collection(READINESS_COLLECTION).document(READINESS_DOCUMENT).get()
+    return True
 
 def get_server_timestamp():
     """Returns a server timestamp"""
-    return firestore.SERVER_TIMESTAMP
\ No newline at end of file
+    return firestore.SERVER_TIMESTAMP
+
+def __getattr__(name):
+    # `from firebase_config import db` ของโค้ดเก่ายังใช้ได้ แต่จะเชื่อมต่อทันที
+    if name == 'db':
+        return get_firestore_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,22 @@
+import time
 from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
 from fastapi.middleware.cors import CORSMiddleware
 from routes import auth, chat, profile, system
-from firebase_config import db
+from models import store
+from models.loader import request_loaders
+from utils.presence import presence_tracker
+from utils import images
+from utils.serialization import NegotiatedResponse, negotiate
+from metrics import http_request_duration, http_requests_in_progress
+from config import settings
 from logging_config import logger
 
 app = FastAPI(
     title="School Chat API",
     description="API for school chat application",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=NegotiatedResponse
 )
 
 # CORS middleware
@@ -23,23 +32,84 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    expose_headers=["*", "X-Next-Cursor", "X-Prev-Cursor", "X-Access-Token"],
     max_age=3600
 )
 
+class RequestScopeMiddleware:
+    """Per-request loaders, Firestore operation counts, response format and metrics
+
+    A plain ASGI middleware rather than @app.middleware("http"), which runs
+    the endpoint and a streamed body in copied contexts: the scope here
+    stays open until the whole response has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        started = False
+
+        def observe(status_code: int) -> None:
+            # ใช้ path template ของ route ไม่ใช่ URL จริง ไม่ให้ label แตกตาม chat_id
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method,
+                route.path if route is not None else "unmatched",
+                str(status_code)
+            )
+
+        http_requests_in_progress.inc(method)
+        accept = Headers(scope=scope).get("accept")
+        with store.track_operations() as stats, request_loaders(), negotiate(accept):
+            async def send_in_scope(message):
+                nonlocal started
+                if message["type"] == "http.response.start":
+                    started = True
+                    observe(message["status"])
+                    if settings.FIRESTORE_STATS_HEADER:
+                        headers = MutableHeaders(scope=message)
+                        headers["X-Firestore-Reads"] = str(stats.reads)
+                        headers["X-Firestore-Writes"] = str(stats.writes)
+                        headers["X-Firestore-Deletes"] = str(stats.deletes)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_in_scope)
+            finally:
+                http_requests_in_progress.dec(method)
+                if not started:
+                    observe(500)
+
+app.add_middleware(RequestScopeMiddleware)
+
 # Startup Event
 @app.on_event("startup")
 async def startup_event():
-    """Check database connection on startup"""
+    """Optionally check the database connection on startup (one read, no writes)"""
+    if not settings.STARTUP_READINESS_CHECK:
+        return
     try:
-        db.collection('test').document('test').set({
-            'test': 'Connection successful'
-        })
+        await store.ping()
         logger.info("Firebase connection successful")
     except Exception as e:
         logger.error(f"Firebase connection failed: {e}")
         raise
 
+# Shutdown Event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write pending presence updates and drop this worker's online counts before it exits"""
+    await presence_tracker.close()
+    images.shutdown()
+
 # Include routers
 app.include_router(
     auth.router,
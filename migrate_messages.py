@@ -0,0 +1,178 @@
+"""Move messages from the global `messages` collection to chats/{chat_id}/messages
+
+Streams the old collection in pages, split into key-range shards that run
+in parallel, and copies each page with a BulkWriter. After every page the
+shard's last copied ID is saved to system/message_migration, so an
+interrupted run picks up where it stopped. Copies are idempotent (same
+document IDs), so re-running is always safe.
+
+    python migrate_messages.py --workers 8 --page-size 500
+    python migrate_messages.py --delete-source   # also remove copied source documents
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from google.cloud.firestore_v1.base_query import FieldFilter
+from firebase_config import get_firestore_db, MESSAGES_COLLECTION
+from models.message import messages_collection
+from logging_config import logger
+
+CHECKPOINT_COLLECTION = 'system'
+CHECKPOINT_DOCUMENT = 'message_migration'
+DOCUMENT_ID = '__name__'
+
+# ตัวอักษรของ auto-ID ของ Firestore เรียงตามลำดับ byte
+ID_ALPHABET = ''.join(sorted('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'))
+
+class Progress:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.copied = 0
+        self.skipped = 0
+
+    def add(self, copied: int, skipped: int) -> None:
+        with self._lock:
+            self.copied += copied
+            self.skipped += skipped
+            elapsed = time.monotonic() - self.started_at
+            logger.info(
+                f"Migrated {self.copied} messages ({self.skipped} skipped), "
+                f"{self.copied / elapsed:,.0f} docs/sec"
+            )
+
+def shard_bounds(workers: int) -> List[tuple]:
+    """Split the ID space into `workers` contiguous [low, high) ranges by first character
+
+    There are only len(ID_ALPHABET) first characters, so at most that many shards.
+    """
+    workers = max(1, min(workers, len(ID_ALPHABET)))
+    starts = [ID_ALPHABET[i * len(ID_ALPHABET) // workers] for i in range(workers)]
+    starts[0] = None
+    return [(low, starts[i + 1] if i + 1 < workers else None) for i, low in enumerate(starts)]
+
+def migrate_shard(
+    shard: int,
+    low: Optional[str],
+    high: Optional[str],
+    resume_after: Optional[str],
+    page_size: int,
+    delete_source: bool,
+    progress: Progress
+) -> None:
+    db = get_firestore_db()
+    source = db.collection(MESSAGES_COLLECTION)
+    checkpoint = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOCUMENT)
+    last_id = resume_after
+
+    failures = []
+    writer = db.bulk_writer()
+    writer.on_write_error(lambda failure, _: _retry(failure, failures))
+
+    try:
+        while True:
+            query = source.order_by(DOCUMENT_ID)
+            if last_id is not None:
+                query = query.where(filter=FieldFilter(DOCUMENT_ID, '>', source.document(last_id)))
+            elif low is not None:
+                query = query.where(filter=FieldFilter(DOCUMENT_ID, '>=', source.document(low)))
+            if high is not None:
+                query = query.where(filter=FieldFilter(DOCUMENT_ID, '<', source.document(high)))
+            docs = list(query.limit(page_size).stream())
+            if not docs:
+                break
+
+            copied, skipped = [], 0
+            for doc in docs:
+                message = doc.to_dict()
+                chat_id = message.get('chat_id')
+                if not chat_id:
+                    skipped += 1
+                    continue
+                writer.set(db.collection(messages_collection(chat_id)).document(doc.id), message)
+                copied.append(doc)
+            writer.flush()
+            if failures:
+                raise RuntimeError(f"Shard {shard}: {len(failures)} writes failed, stopping at {last_id}")
+
+            # ลบต้นฉบับหลังจากคัดลอกสำเร็จแล้วเท่านั้น
+            if delete_source and copied:
+                for doc in copied:
+                    writer.delete(doc.reference)
+                writer.flush()
+                if failures:
+                    raise RuntimeError(f"Shard {shard}: {len(failures)} deletes failed, stopping at {last_id}")
+
+            last_id = docs[-1].id
+            checkpoint.update({f'shards.{shard}': last_id})
+            progress.add(len(copied), skipped)
+
+        checkpoint.update({f'done.{shard}': True})
+    finally:
+        # ปิด writer ทุกกรณี ไม่ให้ thread ของ BulkWriter ค้างเมื่อ shard ล้ม
+        writer.close()
+
+def _retry(failure, failures: list) -> bool:
+    # ลองใหม่สูงสุด 5 ครั้งก่อนถือว่าล้มเหลว
+    if failure.attempts < 5:
+        return True
+    failures.append(failure)
+    logger.error(f"Write failed for {failure.operation.reference.path}: {failure.message}")
+    return False
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    args = parser.parse_args()
+    if args.workers > len(ID_ALPHABET):
+        logger.warning(f"--workers {args.workers} is more than the {len(ID_ALPHABET)} possible shards, using {len(ID_ALPHABET)}")
+        args.workers = len(ID_ALPHABET)
+
+    db = get_firestore_db()
+    checkpoint_ref = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOCUMENT)
+    snapshot = checkpoint_ref.get()
+    state = snapshot.to_dict() if snapshot.exists else None
+
+    if state and not args.restart:
+        if state.get('workers') != args.workers:
+            raise SystemExit(
+                f"Checkpoint was written with --workers {state.get('workers')}; "
+                "use the same value or pass --restart"
+            )
+        logger.info("Resuming message migration from checkpoint")
+    else:
+        state = {'workers': args.workers, 'shards': {}, 'done': {}}
+        checkpoint_ref.set(state)
+
+    progress = Progress()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                migrate_shard,
+                shard,
+                low,
+                high,
+                state['shards'].get(str(shard)),
+                args.page_size,
+                args.delete_source,
+                progress
+            )
+            for shard, (low, high) in enumerate(shard_bounds(args.workers))
+            if not state['done'].get(str(shard))
+        ]
+        for future in futures:
+            future.result()
+
+    elapsed = time.monotonic() - progress.started_at
+    logger.info(
+        f"Message migration finished: {progress.copied} copied, {progress.skipped} skipped "
+        f"in {elapsed:.1f}s ({progress.copied / max(elapsed, 1e-9):,.0f} docs/sec)"
+    )
+
+if __name__ == "__main__":
+    main()
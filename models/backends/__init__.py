@@ -0,0 +1,19 @@
+from .base import ASCENDING, DESCENDING, DOCUMENT_ID, Filter, Operation, StorageBackend, Transaction
+
+def create_backend(kind: str, sql_url: str) -> StorageBackend:
+    """Build the backend named by configuration ("firestore", "memory" or "sql")"""
+    if kind == "firestore":
+        from .firestore import FirestoreBackend
+        return FirestoreBackend()
+    if kind == "memory":
+        from .memory import MemoryBackend
+        return MemoryBackend()
+    if kind == "sql":
+        from .sql import SQLBackend
+        return SQLBackend(sql_url)
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+__all__ = [
+    'ASCENDING', 'DESCENDING', 'DOCUMENT_ID', 'Filter', 'Operation',
+    'StorageBackend', 'Transaction', 'create_backend'
+]
@@ -0,0 +1,97 @@
+import random
+import string
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+# field พิเศษของ Firestore สำหรับเรียงหรือใช้ cursor ด้วย document ID
+DOCUMENT_ID = "__name__"
+
+Filter = Tuple[str, str, Any]
+Operation = Tuple[str, str, str, Optional[Dict[str, Any]]]
+Document = Tuple[str, Dict[str, Any]]
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+_random = random.SystemRandom()
+
+def auto_id() -> str:
+    """20-character random document ID, same shape as Firestore's auto IDs"""
+    return ''.join(_random.choice(_ID_ALPHABET) for _ in range(20))
+
+class Transaction(ABC):
+    """Reads and buffered writes that commit atomically when the callback returns
+
+    Reads must come before writes, as in Firestore.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.operations: List[Operation] = []
+
+    @abstractmethod
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Read a document inside the transaction, None if it does not exist"""
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        self.operations.append(("merge" if merge else "set", collection, doc_id, data))
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        self.operations.append(("update", collection, doc_id, data))
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self.operations.append(("delete", collection, doc_id, None))
+
+class StorageBackend(ABC):
+    """Document store used by models/store.py
+
+    Methods are blocking; store.py runs them on its bounded executor.
+    Implementations must be safe to call from several threads.
+    """
+
+    name = "base"
+
+    def new_id(self, collection: str) -> str:
+        return auto_id()
+
+    @abstractmethod
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        """A document's data, None if it does not exist"""
+
+    @abstractmethod
+    def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Every requested ID mapped to its data, None for missing documents"""
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        self.commit([("merge" if merge else "set", collection, doc_id, data)])
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        """Raises NotFoundError if the document does not exist"""
+        self.commit([("update", collection, doc_id, data)])
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        self.commit([("delete", collection, doc_id, None)])
+
+    @abstractmethod
+    def query(
+        self,
+        collection: str,
+        filters: Iterable[Filter],
+        order_by: Optional[Sequence[Tuple[str, str]]],
+        limit: Optional[int],
+        start_after: Optional[Dict[str, Any]] = None,
+        end_before: Optional[Dict[str, Any]] = None
+    ) -> List[Document]:
+        """Documents matching every filter, ordered, after/before the cursors, up to limit"""
+
+    @abstractmethod
+    def commit(self, operations: List[Operation]) -> None:
+        """Apply ("set" | "merge" | "update" | "delete") operations atomically"""
+
+    @abstractmethod
+    def run_transaction(self, fn: Callable[[Transaction], Any]) -> Any:
+        """Call fn with a Transaction, commit its writes and return fn's result"""
+
+    def ping(self) -> bool:
+        """Readiness probe"""
+        return True
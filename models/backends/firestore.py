@@ -0,0 +1,114 @@
+from typing import Any, Callable, Dict, List, Optional
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+from firebase_config import check_connection, get_firestore_db
+from ..base import NotFoundError
+from .base import StorageBackend, Transaction
+
+class _FirestoreTransaction(Transaction):
+    def __init__(self, db, transaction):
+        super().__init__()
+        self.db = db
+        self.transaction = transaction
+
+    def _ref(self, collection: str, doc_id: str):
+        return self.db.collection(collection).document(doc_id)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        self.reads += 1
+        doc = self._ref(collection, doc_id).get(transaction=self.transaction)
+        return doc.to_dict() if doc.exists else None
+
+    # บันทึก operation ไว้นับด้วย แต่ให้ Firestore transaction เป็นคนเขียน
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        super().set(collection, doc_id, data, merge)
+        self.transaction.set(self._ref(collection, doc_id), data, merge=merge)
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        super().update(collection, doc_id, data)
+        self.transaction.update(self._ref(collection, doc_id), data)
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        super().delete(collection, doc_id)
+        self.transaction.delete(self._ref(collection, doc_id))
+
+class FirestoreBackend(StorageBackend):
+    """Cloud Firestore through the firebase_admin client"""
+
+    name = "firestore"
+
+    def new_id(self, collection: str) -> str:
+        return get_firestore_db().collection(collection).document().id
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        doc = get_firestore_db().collection(collection).document(doc_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        db = get_firestore_db()
+        refs = [db.collection(collection).document(doc_id) for doc_id in doc_ids]
+        results = {doc_id: None for doc_id in doc_ids}
+        for doc in db.get_all(refs):
+            if doc.exists:
+                results[doc.id] = doc.to_dict()
+        return results
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+        get_firestore_db().collection(collection).document(doc_id).set(data, merge=merge)
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        try:
+            get_firestore_db().collection(collection).document(doc_id).update(data)
+        except NotFound:
+            raise NotFoundError(f"Document not found: {collection}/{doc_id}")
+
+    def delete(self, collection: str, doc_id: str) -> None:
+        get_firestore_db().collection(collection).document(doc_id).delete()
+
+    def query(self, collection, filters, order_by, limit, start_after=None, end_before=None):
+        query = get_firestore_db().collection(collection)
+        for field, op, value in filters:
+            query = query.where(filter=FieldFilter(field, op, value))
+        for field, direction in order_by or ():
+            query = query.order_by(field, direction=direction)
+        if start_after is not None:
+            query = query.start_after(start_after)
+        if end_before is not None:
+            query = query.end_before(end_before)
+        if limit is not None:
+            query = query.limit(limit)
+        return [(doc.id, doc.to_dict()) for doc in query.stream()]
+
+    def commit(self, operations) -> None:
+        db = get_firestore_db()
+        batch = db.batch()
+        for op, collection, doc_id, data in operations:
+            ref = db.collection(collection).document(doc_id)
+            if op == "set":
+                batch.set(ref, data)
+            elif op == "merge":
+                batch.set(ref, data, merge=True)
+            elif op == "update":
+                batch.update(ref, data)
+            elif op == "delete":
+                batch.delete(ref)
+            else:
+                raise ValueError(f"Unknown batch operation: {op}")
+        try:
+            batch.commit()
+        except NotFound as e:
+            raise NotFoundError(str(e))
+
+    def run_transaction(self, fn: Callable[[Transaction], Any]) -> Any:
+        db = get_firestore_db()
+
+        # Firestore เรียก callback ซ้ำเองเมื่อ transaction ชนกัน
+        @firestore.transactional
+        def body(transaction):
+            return fn(_FirestoreTransaction(db, transaction))
+
+        return body(db.transaction())
+
+    def ping(self) -> bool:
+        return check_connection()
@@ -0,0 +1,160 @@
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from ..base import NotFoundError
+from .base import DESCENDING, DOCUMENT_ID, Document, Filter, Operation
+
+# พฤติกรรมแบบ Firestore ที่ backend ในเครื่อง (memory, sql) ใช้ร่วมกัน
+
+def normalize(value: Any) -> Any:
+    """Deep copy a value the way Firestore round-trips it (datetimes come back in UTC)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    return copy.copy(value)
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any) -> None:
+    keys = path.split('.')
+    for key in keys[:-1]:
+        child = doc.get(key)
+        if not isinstance(child, dict):
+            child = doc[key] = {}
+        doc = child
+    doc[keys[-1]] = value
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+def apply_operation(current: Optional[Dict[str, Any]], operation: Operation) -> Optional[Dict[str, Any]]:
+    """New content of a document after one batch operation (None = deleted)"""
+    op, collection, doc_id, data = operation
+    if op == "set":
+        return normalize(data)
+    if op == "merge":
+        doc = copy.deepcopy(current) if current is not None else {}
+        _merge(doc, normalize(data))
+        return doc
+    if op == "update":
+        if current is None:
+            raise NotFoundError(f"Document not found: {collection}/{doc_id}")
+        doc = copy.deepcopy(current)
+        for path, value in data.items():
+            _set_path(doc, path, normalize(value))
+        return doc
+    if op == "delete":
+        return None
+    raise ValueError(f"Unknown batch operation: {op}")
+
+_MISSING = object()
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    for key in path.split('.'):
+        if not isinstance(doc, dict) or key not in doc:
+            return _MISSING
+        doc = doc[key]
+    return doc
+
+def _value(doc: Document, path: str) -> Any:
+    if path == DOCUMENT_ID:
+        return doc[0]
+    return _field(doc[1], path)
+
+def _type_rank(value: Any) -> int:
+    # ลำดับชนิดข้อมูลแบบ Firestore: null < bool < number < timestamp < string < อื่นๆ
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    return 5
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    rank = _type_rank(value)
+    return (rank, value if rank < 5 else repr(value))
+
+def _compare(a: Any, b: Any) -> int:
+    a_key, b_key = _sort_key(normalize(a)), _sort_key(normalize(b))
+    return (a_key > b_key) - (a_key < b_key)
+
+def _comparable(a: Any, b: Any) -> bool:
+    return _type_rank(a) == _type_rank(b)
+
+def _matches(doc: Dict[str, Any], field: str, op: str, value: Any) -> bool:
+    actual = _field(doc, field)
+    if actual is _MISSING:
+        return False
+    value = normalize(value)
+    if op == "==":
+        return actual == value
+    if op == "!=":
+        return actual != value and actual is not None
+    if op in ("<", "<=", ">", ">="):
+        if not _comparable(actual, value):
+            return False
+        result = _compare(actual, value)
+        return {"<": result < 0, "<=": result <= 0, ">": result > 0, ">=": result >= 0}[op]
+    if op == "in":
+        return actual in value
+    if op == "not-in" or op == "not_in":
+        return actual is not None and actual not in value
+    if op == "array_contains":
+        return isinstance(actual, list) and value in actual
+    if op == "array_contains_any":
+        return isinstance(actual, list) and any(item in actual for item in value)
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+def _cursor_position(doc: Document, order_by: Sequence[Tuple[str, str]], cursor: Dict[str, Any]) -> int:
+    """-1 / 0 / 1 when the document sorts before / at / after the cursor"""
+    for field, direction in order_by:
+        if field not in cursor:
+            break
+        result = _compare(_value(doc, field), cursor[field])
+        if direction == DESCENDING:
+            result = -result
+        if result:
+            return result
+    return 0
+
+def run_query(
+    docs: Iterable[Document],
+    filters: Iterable[Filter],
+    order_by: Optional[Sequence[Tuple[str, str]]],
+    limit: Optional[int],
+    start_after: Optional[Dict[str, Any]],
+    end_before: Optional[Dict[str, Any]]
+) -> List[Document]:
+    """Evaluate a query over (doc_id, data) pairs with Firestore semantics"""
+    filters = list(filters)
+    order_by = list(order_by or ())
+    results = [
+        (doc_id, data) for doc_id, data in docs
+        if all(_matches(data, field, op, value) for field, op, value in filters)
+        # Firestore ไม่คืนเอกสารที่ไม่มี field ที่ใช้เรียง
+        and all(_value((doc_id, data), field) is not _MISSING for field, _ in order_by)
+    ]
+
+    results.sort(key=lambda doc: doc[0])
+    for field, direction in reversed(order_by):
+        results.sort(key=lambda doc: _sort_key(_value(doc, field)), reverse=direction == DESCENDING)
+
+    if start_after is not None:
+        results = [doc for doc in results if _cursor_position(doc, order_by, start_after) > 0]
+    if end_before is not None:
+        results = [doc for doc in results if _cursor_position(doc, order_by, end_before) < 0]
+    if limit is not None:
+        results = results[:limit]
+    return [(doc_id, copy.deepcopy(data)) for doc_id, data in results]
@@ -0,0 +1,66 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from .base import StorageBackend, Transaction
+from .local import apply_operation, run_query
+
+class _MemoryTransaction(Transaction):
+    def __init__(self, backend: "MemoryBackend"):
+        super().__init__()
+        self.backend = backend
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        self.reads += 1
+        return self.backend.get(collection, doc_id)
+
+class MemoryBackend(StorageBackend):
+    """Documents in process memory: fast and deterministic, for tests and load runs
+
+    Data is lost when the process exits. Transactions take a global lock,
+    so they never conflict or retry.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            doc = self._collections.get(collection, {}).get(doc_id)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        with self._lock:
+            return {doc_id: self.get(collection, doc_id) for doc_id in doc_ids}
+
+    def query(self, collection, filters, order_by, limit, start_after=None, end_before=None):
+        with self._lock:
+            docs = list(self._collections.get(collection, {}).items())
+            return run_query(docs, filters, order_by, limit, start_after, end_before)
+
+    def commit(self, operations) -> None:
+        with self._lock:
+            # คำนวณผลทั้งหมดก่อน ถ้ามี operation ไหนล้มเหลวจะไม่มีอะไรถูกเขียน
+            staged: Dict[tuple, Optional[Dict[str, Any]]] = {}
+            for operation in operations:
+                key = (operation[1], operation[2])
+                current = staged[key] if key in staged else self._collections.get(key[0], {}).get(key[1])
+                staged[key] = apply_operation(current, operation)
+            for (collection, doc_id), doc in staged.items():
+                if doc is None:
+                    self._collections.get(collection, {}).pop(doc_id, None)
+                else:
+                    self._collections.setdefault(collection, {})[doc_id] = doc
+
+    def run_transaction(self, fn: Callable[[Transaction], Any]) -> Any:
+        with self._lock:
+            transaction = _MemoryTransaction(self)
+            result = fn(transaction)
+            self.commit(transaction.operations)
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._collections.clear()
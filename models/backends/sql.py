@@ -0,0 +1,132 @@
+import base64
+import json
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import Column, MetaData, String, Table, Text, create_engine, func, select
+from sqlalchemy.engine import Connection
+from .base import StorageBackend, Transaction
+from .local import apply_operation, run_query
+
+metadata = MetaData()
+
+# เอกสารทุก collection อยู่ในตารางเดียว เก็บเนื้อหาเป็น JSON
+documents = Table(
+    "documents",
+    metadata,
+    Column("collection", String(255), primary_key=True),
+    Column("id", String(255), primary_key=True),
+    Column("data", Text, nullable=False),
+)
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode()}
+    raise TypeError(f"Type is not storable: {type(value).__name__}")
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+        if "__bytes__" in obj:
+            return base64.b64decode(obj["__bytes__"])
+    return obj
+
+def _dumps(doc: Dict[str, Any]) -> str:
+    return json.dumps(doc, default=_encode, ensure_ascii=False)
+
+def _loads(data: str) -> Dict[str, Any]:
+    return json.loads(data, object_hook=_decode)
+
+class _SQLTransaction(Transaction):
+    def __init__(self, backend: "SQLBackend", connection: Connection):
+        super().__init__()
+        self.backend = backend
+        self.connection = connection
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        self.reads += 1
+        return self.backend._get(self.connection, collection, doc_id)
+
+class SQLBackend(StorageBackend):
+    """Documents as JSON rows in a SQL database through SQLAlchemy (SQLite by default)
+
+    On SQLite, equality filters on plain values are pushed down with
+    json_extract. Every filter, the ordering and the cursors are then
+    evaluated in Python with the same rules as the in-memory backend, so
+    other databases give the same results, only without the pushdown.
+    Writes are serialized by a lock since SQLite allows one writer at a time.
+    """
+
+    name = "sql"
+
+    def __init__(self, url: str):
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args)
+        # json_extract มีเฉพาะ SQLite ฐานข้อมูลอื่นกรองใน Python อย่างเดียว
+        self._pushdown = self.engine.dialect.name == "sqlite"
+        metadata.create_all(self.engine)
+        self._lock = threading.RLock()
+
+    def _get(self, connection: Connection, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = connection.execute(
+            select(documents.c.data).where(documents.c.collection == collection, documents.c.id == doc_id)
+        ).first()
+        return _loads(row.data) if row else None
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as connection:
+            return self._get(connection, collection, doc_id)
+
+    def get_many(self, collection: str, doc_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        results: Dict[str, Optional[Dict[str, Any]]] = {doc_id: None for doc_id in doc_ids}
+        with self.engine.connect() as connection:
+            rows = connection.execute(
+                select(documents.c.id, documents.c.data)
+                .where(documents.c.collection == collection, documents.c.id.in_(doc_ids))
+            )
+            for row in rows:
+                results[row.id] = _loads(row.data)
+        return results
+
+    def query(self, collection, filters, order_by, limit, start_after=None, end_before=None):
+        filters = list(filters)
+        statement = select(documents.c.id, documents.c.data).where(documents.c.collection == collection)
+        if self._pushdown:
+            for field, op, value in filters:
+                if op == "==" and isinstance(value, (str, int, float, bool)):
+                    statement = statement.where(func.json_extract(documents.c.data, f"$.{field}") == value)
+        with self.engine.connect() as connection:
+            docs = [(row.id, _loads(row.data)) for row in connection.execute(statement)]
+        return run_query(docs, filters, order_by, limit, start_after, end_before)
+
+    def _commit(self, connection: Connection, operations) -> None:
+        staged: Dict[tuple, Optional[Dict[str, Any]]] = {}
+        for operation in operations:
+            key = (operation[1], operation[2])
+            current = staged[key] if key in staged else self._get(connection, *key)
+            staged[key] = apply_operation(current, operation)
+        for (collection, doc_id), doc in staged.items():
+            connection.execute(
+                documents.delete().where(documents.c.collection == collection, documents.c.id == doc_id)
+            )
+            if doc is not None:
+                connection.execute(documents.insert().values(collection=collection, id=doc_id, data=_dumps(doc)))
+
+    def commit(self, operations) -> None:
+        with self._lock, self.engine.begin() as connection:
+            self._commit(connection, operations)
+
+    def run_transaction(self, fn: Callable[[Transaction], Any]) -> Any:
+        with self._lock, self.engine.begin() as connection:
+            transaction = _SQLTransaction(self, connection)
+            result = fn(transaction)
+            self._commit(connection, transaction.operations)
+            return result
+
+    def ping(self) -> bool:
+        with self.engine.connect() as connection:
+            connection.execute(select(1))
+        return True
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import os
+from typing import Optional
+
+# ชนิดของรูปดูจาก magic bytes ไม่ต้องเก็บ metadata แยก
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def content_type(data: bytes) -> str:
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return 'application/octet-stream'
+
+class BlobStore(ABC):
+    """Content-addressed storage for binary objects such as profile pictures
+
+    Blobs are keyed by the SHA-256 of their content, so they are
+    immutable and the same bytes are stored once.
+    """
+
+    async def put(self, data: bytes) -> str:
+        """Store data and return its key"""
+        key = content_hash(data)
+        await asyncio.to_thread(self._write, key, data)
+        return key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if not _valid_key(key):
+            return None
+        return await asyncio.to_thread(self._read, key)
+
+    @abstractmethod
+    def _write(self, key: str, data: bytes) -> None:
+        """Store data under key, a no-op if it already exists"""
+
+    @abstractmethod
+    def _read(self, key: str) -> Optional[bytes]:
+        """Return the blob's bytes, or None if there is none"""
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under a directory, fanned out by key prefix"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # เขียนไฟล์ชั่วคราวก่อนแล้วค่อย rename เพื่อไม่ให้อ่านเจอไฟล์ที่เขียนไม่ครบ
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+class CloudStorageBlobStore(BlobStore):
+    """Blobs as objects in a Cloud Storage bucket of the Firebase project"""
+
+    def __init__(self, bucket: Optional[str], prefix: str = 'blobs'):
+        self.bucket_name = bucket or None
+        self.prefix = prefix
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        # เชื่อมต่อ bucket ตอนใช้งานครั้งแรก
+        if self._bucket is None:
+            from firebase_admin import storage
+            from firebase_config import get_firebase_app
+            self._bucket = storage.bucket(self.bucket_name, app=get_firebase_app())
+        return self._bucket
+
+    def _write(self, key: str, data: bytes) -> None:
+        blob = self.bucket.blob(f"{self.prefix}/{key}")
+        if not blob.exists():
+            blob.upload_from_string(data, content_type=content_type(data))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return self.bucket.blob(f"{self.prefix}/{key}").download_as_bytes()
+        except NotFound:
+            return None
+
+def _valid_key(key: str) -> bool:
+    return len(key) == 64 and all(c in '0123456789abcdef' for c in key)
+
+def create_blob_store(kind: str, path: str, bucket: Optional[str] = None) -> BlobStore:
+    """Build the store named by configuration ("local" or "cloud_storage")"""
+    if kind == "local":
+        return LocalBlobStore(path)
+    if kind == "cloud_storage":
+        return CloudStorageBlobStore(bucket)
+    raise ValueError(f"Unknown blob store: {kind}")
@@ -0,0 +1,190 @@
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# ค่าประมาณหน่วยความจำของข้อความหนึ่งข้อความ นอกเหนือจากเนื้อหา
+MESSAGE_OVERHEAD_BYTES = 400
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _position(message: Dict[str, Any]) -> Tuple[datetime, str]:
+    # ลำดับเดียวกับ query: created_at แล้วตาม message ID
+    return (message['created_at'], message['id'])
+
+def _size(message: Dict[str, Any]) -> int:
+    return MESSAGE_OVERHEAD_BYTES + sum(
+        len(value) for value in message.values() if isinstance(value, str)
+    )
+
+class _ChatWindow:
+    """Most recent messages of one chat, oldest first
+
+    Every message at or after the (created_at, message ID) position
+    `floor` is in the window. When `complete` is set the window holds the
+    chat's whole history.
+    """
+
+    def __init__(self, capacity: int):
+        self.messages: deque = deque()
+        self.ids = set()
+        self.capacity = capacity
+        self.floor: Optional[Tuple[datetime, str]] = None
+        self.complete = False
+        self.size = 0
+
+    def append(self, message: Dict[str, Any]) -> int:
+        """Add a message, returns the change in bytes"""
+        if message['id'] in self.ids:
+            return 0
+        position = _position(message)
+        if not self.messages or _position(self.messages[-1]) <= position:
+            self.messages.append(message)
+        else:
+            # เขียนเสร็จไม่ตรงลำดับ created_at แทรกไว้ตำแหน่งที่ถูกต้อง
+            index = len(self.messages)
+            while index > 0 and _position(self.messages[index - 1]) > position:
+                index -= 1
+            self.messages.insert(index, message)
+        self.ids.add(message['id'])
+        self.size += _size(message)
+        freed = 0
+        while len(self.messages) > self.capacity:
+            dropped = self.messages.popleft()
+            self.ids.discard(dropped['id'])
+            freed += _size(dropped)
+            self.complete = False
+        self.size -= freed
+        if self.floor is None or freed:
+            # ใช้ตำแหน่งเต็ม ไม่ใช่แค่เวลา: ข้อความที่ถูกทิ้งอาจมีเวลาเท่ากับข้อความแรกที่เหลือ
+            self.floor = _position(self.messages[0])
+        return _size(message) - freed
+
+class MessageBuffer:
+    """In-process ring buffers of recent messages for hot chats
+
+    Filled by writes and by the first full read of a chat, and evicted by
+    LRU when the total estimated size exceeds max_bytes. Assumes every
+    write to a chat goes through this process (the API runs as a single
+    worker), otherwise other workers' messages would be missed.
+    """
+
+    def __init__(self, messages_per_chat: int, max_bytes: int):
+        self.messages_per_chat = messages_per_chat
+        self.max_bytes = max_bytes
+        self._chats: "OrderedDict[str, _ChatWindow]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.messages_per_chat > 0
+
+    def append(self, chat_id: str, message: Dict[str, Any]) -> None:
+        """Record a message that was just written"""
+        if not self.enabled:
+            return
+        message = dict(message, created_at=_utc(message['created_at']))
+        window = self._chats.get(chat_id)
+        if window is None:
+            window = self._chats[chat_id] = _ChatWindow(self.messages_per_chat)
+        self._chats.move_to_end(chat_id)
+        self.bytes += window.append(message)
+        self._evict()
+
+    def seed(self, chat_id: str, newest_first: List[Dict[str, Any]], limit: int) -> None:
+        """Fill a window from a read of the newest `limit` messages
+
+        Messages already buffered by writes are kept, so a chat that was
+        only written to becomes servable once it has been read in full.
+        """
+        if not self.enabled:
+            return
+        existing = self._chats.pop(chat_id, None)
+        if existing is not None:
+            self.bytes -= existing.size
+        messages = {m['id']: dict(m, created_at=_utc(m['created_at'])) for m in newest_first}
+        for message in existing.messages if existing is not None else ():
+            messages.setdefault(message['id'], message)
+
+        window = self._chats[chat_id] = _ChatWindow(self.messages_per_chat)
+        for message in sorted(messages.values(), key=_position):
+            self.bytes += window.append(message)
+        # อ่านได้น้อยกว่าที่ขอ แปลว่าได้ประวัติครบทั้งห้อง
+        window.complete = (
+            (len(newest_first) < limit or (existing is not None and existing.complete))
+            and len(window.messages) == len(messages)
+        )
+        if window.floor is None:
+            window.floor = (datetime.now(timezone.utc), "")
+        self._evict()
+
+    def window(
+        self,
+        chat_id: str,
+        limit: int,
+        after: Optional[Tuple[datetime, str]] = None,
+        before: Optional[Tuple[datetime, str]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Serve a page newest first, or None if the buffer can't answer it exactly
+
+        after / before are (created_at, message ID) positions.
+        """
+        window = self._chats.get(chat_id)
+        if window is None:
+            self.misses += 1
+            return None
+        after = (_utc(after[0]), after[1]) if after is not None else None
+        before = (_utc(before[0]), before[1]) if before is not None else None
+
+        messages = [
+            m for m in window.messages
+            if (after is None or _position(m) > after)
+            and (before is None or _position(m) < before)
+        ]
+        if after is not None:
+            # ต้องมีทุกข้อความที่ใหม่กว่า after อยู่ในบัฟเฟอร์
+            if not window.complete and after < window.floor:
+                self.misses += 1
+                return None
+            page = messages[:limit]
+        else:
+            if len(messages) < limit and not window.complete:
+                self.misses += 1
+                return None
+            page = messages[-limit:]
+
+        self._chats.move_to_end(chat_id)
+        self.hits += 1
+        return [dict(m) for m in reversed(page)]
+
+    def latest_id(self, chat_id: str) -> Optional[str]:
+        """ID of the chat's newest message, "" if it has none, None if unknown"""
+        window = self._chats.get(chat_id)
+        if window is None:
+            return None
+        if window.messages:
+            return window.messages[-1]['id']
+        return "" if window.complete else None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "chats": len(self._chats),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+    def _evict(self) -> None:
+        while self.bytes > self.max_bytes and self._chats:
+            _, window = self._chats.popitem(last=False)
+            self.bytes -= window.size
+            self.evictions += 1
@@ -0,0 +1,156 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Hashable, Optional
+from logging_config import logger
+from . import store
+
+class LRUCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds
+
+    Not thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # เพิ่มทุกครั้งที่มีการ invalidate ใช้กันไม่ให้ค่าที่อ่านมาก่อนหน้าเขียนทับค่าใหม่
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """Store a value; skipped if anything was invalidated since `generation`"""
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+class InvalidationChannel:
+    """Carries cache invalidations between workers
+
+    The base channel only reaches caches in this process.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Callable[[str], None]] = {}
+
+    def subscribe(self, namespace: str, callback: Callable[[str], None]) -> None:
+        self._subscribers[namespace] = callback
+
+    async def publish(self, namespace: str, key: str) -> None:
+        pass
+
+    def poll(self) -> None:
+        """Pick up invalidations from other workers, if the channel needs polling"""
+        pass
+
+    def _deliver(self, namespace: str, key: str) -> None:
+        callback = self._subscribers.get(namespace)
+        if callback:
+            callback(key)
+
+class FirestoreInvalidationChannel(InvalidationChannel):
+    """Invalidations written to a Firestore collection and polled by each worker
+
+    Staleness is bounded by poll_seconds (plus the time a poll takes).
+    Old entries carry expires_at so a Firestore TTL policy can purge them.
+    """
+
+    def __init__(self, collection: str, poll_seconds: float):
+        super().__init__()
+        self.collection = collection
+        self.poll_seconds = poll_seconds
+        self._origin = uuid.uuid4().hex
+        self._since = datetime.utcnow()
+        self._last_poll = time.monotonic()
+        self._poll_task: Optional[asyncio.Task] = None
+
+    async def publish(self, namespace: str, key: str) -> None:
+        try:
+            now = datetime.utcnow()
+            await store.set_document(self.collection, store.new_document_id(self.collection), {
+                'namespace': namespace,
+                'key': key,
+                'origin': self._origin,
+                'created_at': now,
+                'expires_at': now + timedelta(hours=1)
+            })
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    def poll(self) -> None:
+        if time.monotonic() - self._last_poll < self.poll_seconds:
+            return
+        if self._poll_task and not self._poll_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # เรียกจากโค้ด sync ไม่มี loop ให้ poll ค่อยลองใหม่ครั้งหน้า
+            return
+        self._poll_task = store.background_task(self._poll())
+
+    async def _poll(self) -> None:
+        try:
+            # ย้อนเวลาเล็กน้อยเผื่อนาฬิกาแต่ละเครื่องไม่ตรงกัน
+            since = self._since - timedelta(seconds=self.poll_seconds)
+            started_at = datetime.utcnow()
+            docs = await store.query_documents(
+                self.collection,
+                filters=[('created_at', '>', since)]
+            )
+            for _, entry in docs:
+                if entry.get('origin') != self._origin:
+                    self._deliver(entry['namespace'], entry['key'])
+            self._since = started_at
+        except Exception as e:
+            logger.error(f"Error polling cache invalidations: {e}")
+        finally:
+            self._last_poll = time.monotonic()
+
+def create_invalidation_channel(kind: str, collection: str, poll_seconds: float) -> InvalidationChannel:
+    """Build the channel named by configuration ("local" or "firestore")"""
+    if kind == "firestore":
+        return FirestoreInvalidationChannel(collection, poll_seconds)
+    if kind == "local":
+        return InvalidationChannel()
+    raise ValueError(f"Unknown cache invalidation channel: {kind}")
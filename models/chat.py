@@ -1,35 +1,77 @@
-from firebase_config import db, CHATS_COLLECTION
+from firebase_config import CHATS_COLLECTION
 from datetime import datetime
 from .base import FirebaseError, NotFoundError
+from . import store
 from logging_config import logger
 
+# Firestore รับได้สูงสุด 500 operation ต่อ batch
+MAX_BATCH_SIZE = 500
+
+def _chat_document(user1_id: str, user2_id: str, school: str) -> dict:
+    now = datetime.utcnow()
+    return {
+        'user1_id': user1_id,
+        'user2_id': user2_id,
+        'users': [user1_id, user2_id],
+        'school': school,
+        'status': 'active',
+        'created_at': now,
+        'last_activity': now,
+        'last_message_id': None
+    }
+
 class Chat:
     @staticmethod
     async def create(user1_id: str, user2_id: str, school: str):
         """Create new chat"""
         try:
-            chat_ref = db.collection(CHATS_COLLECTION).document()
-            chat_ref.set({
-                'user1_id': user1_id,
-                'user2_id': user2_id,
-                'school': school,
-                'status': 'active',
-                'created_at': datetime.utcnow(),
-                'last_activity': datetime.utcnow()
-            })
-            return chat_ref.id
+            chat_id = store.new_document_id(CHATS_COLLECTION)
+            await store.set_document(CHATS_COLLECTION, chat_id, _chat_document(user1_id, user2_id, school))
+            return chat_id
             
         except Exception as e:
             logger.error(f"Error creating chat: {e}")
             raise FirebaseError(str(e))
 
+    @staticmethod
+    async def create_many(pairs):
+        """Create chats for (user1_id, user2_id, school) tuples in batched writes"""
+        try:
+            chat_ids = [store.new_document_id(CHATS_COLLECTION) for _ in pairs]
+            operations = [
+                ('set', CHATS_COLLECTION, chat_id, _chat_document(user1_id, user2_id, school))
+                for chat_id, (user1_id, user2_id, school) in zip(chat_ids, pairs)
+            ]
+            for i in range(0, len(operations), MAX_BATCH_SIZE):
+                await store.commit_batch(operations[i:i + MAX_BATCH_SIZE])
+            return chat_ids
+
+        except Exception as e:
+            logger.error(f"Error creating chats: {e}")
+            raise FirebaseError(str(e))
+
     @staticmethod
     async def get_chat(chat_id: str):
         """Get chat by ID"""
         try:
-            doc = db.collection(CHATS_COLLECTION).document(chat_id).get()
-            return doc.to_dict() if doc.exists else None
+            return await store.get_document(CHATS_COLLECTION, chat_id)
             
         except Exception as e:
             logger.error(f"Error getting chat: {e}")
-            raise FirebaseError(str(e))
\ No newline at end of file
+            raise FirebaseError(str(e))
+
+    @staticmethod
+    async def end_chat(chat_id: str):
+        """End chat session"""
+        try:
+            await store.update_document(CHATS_COLLECTION, chat_id, {
+                'status': 'ended',
+                'ended_at': datetime.utcnow()
+            })
+            return True
+
+        except NotFoundError:
+            raise
+        except Exception as e:
+            logger.error(f"Error ending chat: {e}")
+            raise FirebaseError(str(e))
@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+BatchFn = Callable[[List[str]], Awaitable[Dict[str, Any]]]
+
+class BatchLoader:
+    """Request-scoped loader that deduplicates and batches key lookups
+
+    Every load() made in the same event loop tick is collected and resolved
+    with a single call to batch_fn. Results are kept for the rest of the
+    request, so repeated loads of the same key cost nothing.
+    """
+
+    def __init__(self, batch_fn: BatchFn):
+        self._batch_fn = batch_fn
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+
+    def load(self, key: str) -> Awaitable[Any]:
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                loop.create_task(self._dispatch())
+        return future
+
+    async def load_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(keys))
+        values = await asyncio.gather(*(self.load(key) for key in keys))
+        return dict(zip(keys, values))
+
+    def prime(self, key: str, value: Any) -> None:
+        """Store a known value (e.g. right after a write)"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._cache[key] = future
+
+    def clear(self, key: str) -> None:
+        """Forget a key so the next load reads it again"""
+        if key not in self._queue:
+            self._cache.pop(key, None)
+
+    async def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        futures = [self._cache[key] for key in keys]
+        try:
+            results = await self._batch_fn(keys)
+        except Exception as e:
+            for key, future in zip(keys, futures):
+                # ไม่ cache ข้อผิดพลาด ให้ครั้งถัดไปลองอ่านใหม่
+                if self._cache.get(key) is future:
+                    del self._cache[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in zip(keys, futures):
+            if not future.done():
+                future.set_result(results.get(key))
+
+_loaders: ContextVar[Optional[Dict[str, BatchLoader]]] = ContextVar("request_loaders", default=None)
+
+@contextmanager
+def request_loaders():
+    """Give the enclosed request its own set of loaders"""
+    token = _loaders.set({})
+    try:
+        yield
+    finally:
+        _loaders.reset(token)
+
+def disable_loaders() -> None:
+    """Turn request loaders off for the rest of the current context
+
+    For long-lived work such as a streamed response: a loader keeps every
+    result for as long as it lives, which would serve stale documents for
+    the whole length of an SSE connection. Not a context manager, because
+    a generator may be closed from a different context than it started in.
+    """
+    _loaders.set(None)
+
+def get_loader(name: str, batch_fn: BatchFn) -> Optional[BatchLoader]:
+    """Return the current request's loader, or None outside a request"""
+    loaders = _loaders.get()
+    if loaders is None:
+        return None
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = BatchLoader(batch_fn)
+    return loader
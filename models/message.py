@@ -1,39 +1,126 @@
-from firebase_config import db, MESSAGES_COLLECTION
+from firebase_config import MESSAGES_COLLECTION, CHATS_COLLECTION
 from datetime import datetime
-from .base import FirebaseError
+from typing import Any, Dict, Optional, Tuple
+from .base import FirebaseError, NotFoundError
+from . import store
+from .buffer import MessageBuffer
+from .pipeline import WriteBatcher
+from config import settings
 from logging_config import logger
 
+# ข้อความล่าสุดของห้องที่ใช้งานอยู่ เก็บไว้ในหน่วยความจำ
+message_buffer = MessageBuffer(settings.MESSAGE_BUFFER_SIZE, settings.MESSAGE_BUFFER_MAX_BYTES)
+
+# รวมการเขียนข้อความจากผู้ส่งหลายคนเป็น batch เดียว
+message_writer = WriteBatcher(settings.MESSAGE_BATCH_MAX_OPS, settings.MESSAGE_BATCH_DELAY_MS / 1000)
+
+# ตำแหน่งในห้องแชท: (created_at, message ID)
+Position = Tuple[datetime, str]
+
+def _cursor(position: Position) -> Dict[str, Any]:
+    return {'created_at': position[0], store.DOCUMENT_ID: position[1]}
+
+def messages_collection(chat_id: str) -> str:
+    """Messages live in a subcollection of their chat: chats/{chat_id}/messages"""
+    return f"{CHATS_COLLECTION}/{chat_id}/{MESSAGES_COLLECTION}"
+
 class Message:
     @staticmethod
     async def create(message_data: dict):
         """Create new message"""
         try:
-            message_ref = db.collection(MESSAGES_COLLECTION).document()
-            message_data['created_at'] = datetime.utcnow()
-            message_ref.set(message_data)
-            return message_ref.id
-            
+            collection = messages_collection(message_data['chat_id'])
+            message_id = store.new_document_id(collection)
+            now = datetime.utcnow()
+            message_data['created_at'] = now
+
+            # เขียนข้อความพร้อมอัพเดทเวลาล่าสุดของห้อง ใน batch เดียวกับผู้ส่งคนอื่น
+            # ใช้ update ไม่ใช่ merge: ห้องที่ถูกลบไปแล้วต้องไม่ถูกสร้างกลับมาเป็นเอกสารเปล่า
+            await message_writer.submit([
+                ('set', collection, message_id, message_data),
+                ('update', CHATS_COLLECTION, message_data['chat_id'], {
+                    'last_message_id': message_id,
+                    'last_message_at': now,
+                    'last_activity': now
+                })
+            ])
+            message_buffer.append(message_data['chat_id'], dict(message_data, id=message_id))
+            return message_id
+
+        except NotFoundError:
+            raise
         except Exception as e:
             logger.error(f"Error creating message: {e}")
             raise FirebaseError(str(e))
 
     @staticmethod
-    async def get_chat_messages(chat_id: str, limit: int = 50):
-        """Get messages for chat"""
+    async def get_message(chat_id: str, message_id: str):
+        """Get message by ID"""
+        try:
+            message = await store.get_document(messages_collection(chat_id), message_id)
+            if message:
+                message['id'] = message_id
+            return message
+
+        except Exception as e:
+            logger.error(f"Error getting message: {e}")
+            raise FirebaseError(str(e))
+
+    @staticmethod
+    async def get_chat_messages(
+        chat_id: str,
+        limit: int = 50,
+        after: Optional[Position] = None,
+        before: Optional[Position] = None
+    ):
+        """Get messages for chat, newest first
+
+        Messages are ordered by (created_at, message ID), so messages written
+        in the same instant still have a stable order. after: only messages
+        past this position (oldest of them first in the query, so a poll
+        never skips messages); before: only messages before it.
+        """
         try:
+            buffered = message_buffer.window(chat_id, limit, after, before)
+            if buffered is not None:
+                return buffered
+
             messages = []
-            query = (db.collection(MESSAGES_COLLECTION)
-                    .where('chat_id', '==', chat_id)
-                    .order_by('created_at', direction='desc')
-                    .limit(limit))
+            if after is not None:
+                docs = await store.query_documents(
+                    messages_collection(chat_id),
+                    order_by=[('created_at', store.ASCENDING), (store.DOCUMENT_ID, store.ASCENDING)],
+                    limit=limit,
+                    start_after=_cursor(after),
+                    end_before=_cursor(before) if before is not None else None
+                )
+                docs.reverse()
+            else:
+                docs = await store.query_documents(
+                    messages_collection(chat_id),
+                    order_by=[('created_at', store.DESCENDING), (store.DOCUMENT_ID, store.DESCENDING)],
+                    limit=limit,
+                    start_after=_cursor(before) if before is not None else None
+                )
                     
-            for doc in query.stream():
-                message = doc.to_dict()
-                message['id'] = doc.id
+            for doc_id, message in docs:
+                message['id'] = doc_id
                 messages.append(message)
-                
+
+            if after is None and before is None:
+                message_buffer.seed(chat_id, messages, limit)
             return messages
             
         except Exception as e:
             logger.error(f"Error getting messages: {e}")
-            raise FirebaseError(str(e))
\ No newline at end of file
+            raise FirebaseError(str(e))
+
+    @staticmethod
+    def latest_id(chat_id: str):
+        """Newest message ID known without a read ("" for none, None if unknown)"""
+        return message_buffer.latest_id(chat_id)
+
+    @staticmethod
+    def buffer_stats():
+        """Hit rate and memory use of the hot-chat message buffer"""
+        return message_buffer.stats()
@@ -0,0 +1,121 @@
+import asyncio
+import contextvars
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from . import store
+from .base import NotFoundError
+from .store import Operation
+
+# Firestore รับได้สูงสุด 500 operation ต่อ batch
+MAX_BATCH_SIZE = 500
+
+class WriteBatcher:
+    """Group-commits writes from concurrent callers
+
+    Operations submitted within max_delay seconds of each other (or until
+    max_ops are pending) are committed as one Firestore batch, and every
+    caller's submit() resolves once its batch has committed. "merge"
+    operations on the same document within a batch are folded into one.
+    If an "update" in the batch hits a missing document, each caller's
+    operations are retried on their own, so only that caller fails.
+
+    Only one batch commits at a time and batches commit in the order they
+    were flushed, so writes become visible in the order they were made.
+    Callers that stamp created_at before submitting (messages) rely on
+    this: a later batch can never land behind a cursor that a reader has
+    already moved past.
+    """
+
+    def __init__(self, max_ops: int, max_delay: float):
+        self.max_ops = min(max_ops, MAX_BATCH_SIZE)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[List[Operation], asyncio.Future]] = []
+        self._pending_ops = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # batch ที่ flush แล้วแต่รอ batch ก่อนหน้า commit เสร็จ
+        self._ready: Deque[List[Tuple[List[Operation], asyncio.Future]]] = deque()
+        self._committer: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.operations = 0
+
+    async def submit(self, operations: List[Operation]) -> None:
+        # นับ operation ให้ request ที่ส่งมา ส่วน commit รวมไม่ถูกนับซ้ำ
+        store._count_writes(operations)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self._pending and self._pending_ops + len(operations) > self.max_ops:
+            self._flush()
+        self._pending.append((operations, future))
+        self._pending_ops += len(operations)
+        if self._pending_ops >= self.max_ops:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush, context=contextvars.Context())
+        await future
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self.batches,
+            "operations": self.operations,
+            "pending": self._pending_ops,
+            "queued_batches": len(self._ready)
+        }
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_ops = self._pending, [], 0
+        if pending:
+            self._ready.append(pending)
+            if self._committer is None or self._committer.done():
+                self._committer = store.background_task(self._drain())
+
+    async def _drain(self) -> None:
+        # commit ทีละ batch ตามลำดับ ไม่ให้ batch หลังเสร็จก่อน batch แรก
+        while self._ready:
+            await self._commit(self._ready.popleft())
+
+    async def _commit(self, pending: List[Tuple[List[Operation], asyncio.Future]]) -> None:
+        operations = _coalesce(op for ops, _ in pending for op in ops)
+        try:
+            await store.commit_batch(operations)
+        except NotFoundError as e:
+            if len(pending) == 1:
+                _resolve(pending, e)
+                return
+            # เอกสารที่หายไปของผู้ส่งคนเดียวไม่ควรทำให้ข้อความของคนอื่นใน batch ล้มไปด้วย
+            for entry in pending:
+                await self._commit([entry])
+            return
+        except Exception as e:
+            _resolve(pending, e)
+            return
+
+        self.batches += 1
+        self.operations += len(operations)
+        _resolve(pending, None)
+
+def _resolve(pending: List[Tuple[List[Operation], asyncio.Future]], error: Optional[Exception]) -> None:
+    for _, future in pending:
+        if future.done():
+            continue
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+def _coalesce(operations) -> List[Operation]:
+    merged: Dict[Tuple[str, str], Operation] = {}
+    result: List[Operation] = []
+    for op, collection, doc_id, data in operations:
+        if op != "merge":
+            result.append((op, collection, doc_id, data))
+            continue
+        key = (collection, doc_id)
+        if key in merged:
+            merged[key][3].update(data)
+        else:
+            merged[key] = (op, collection, doc_id, dict(data))
+            result.append(merged[key])
+    return result
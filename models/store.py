@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from config import settings
+from metrics import firestore_operation_duration, firestore_operation_errors
+from .backends import ASCENDING, DESCENDING, DOCUMENT_ID, Filter, Operation, StorageBackend, Transaction, create_backend
+
+# backend (Firestore, memory หรือ SQL) เป็นแบบ synchronous
+# ทุกการเรียกจึงถูกส่งไปรันใน thread pool ที่จำกัดขนาด เพื่อไม่ให้ event loop ค้าง
+_executor = ThreadPoolExecutor(
+    max_workers=settings.FIRESTORE_MAX_WORKERS,
+    thread_name_prefix="firestore"
+)
+
+_backend: Optional[StorageBackend] = None
+
+def get_backend() -> StorageBackend:
+    """The storage backend chosen by STORAGE_BACKEND, created on first use"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(settings.STORAGE_BACKEND, settings.STORAGE_SQL_URL)
+    return _backend
+
+def set_backend(backend: StorageBackend) -> None:
+    """Swap the backend (tests and benchmarks)"""
+    global _backend
+    _backend = backend
+
+class OperationStats:
+    """Firestore operations made while handling one request"""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"reads": self.reads, "writes": self.writes, "deletes": self.deletes}
+
+_stats: ContextVar[Optional[OperationStats]] = ContextVar("firestore_stats", default=None)
+
+@contextmanager
+def track_operations():
+    """Count Firestore operations made inside the block"""
+    stats = OperationStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+def _count_reads(count: int) -> None:
+    stats = _stats.get()
+    if stats is not None:
+        # Firestore คิดค่าอ่านอย่างน้อย 1 ครั้งแม้ query จะไม่เจอเอกสาร
+        stats.reads += max(count, 1)
+
+def _count_writes(operations: Iterable[Operation]) -> None:
+    stats = _stats.get()
+    if stats is not None:
+        for op, *_ in operations:
+            if op == "delete":
+                stats.deletes += 1
+            else:
+                stats.writes += 1
+
+def background_task(coro) -> asyncio.Task:
+    """Start a task that isn't billed to the request that happened to trigger it
+
+    The task runs in an empty context, so its Firestore operations are not
+    counted in that request's stats and it can't use the request's loaders.
+    """
+    return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking Firestore call on the bounded executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+def _collection_label(collection: str) -> str:
+    # chats/{chat_id}/messages -> chats/{id}/messages ไม่ให้ label แตกตาม document
+    if "/" not in collection:
+        return collection
+    parts = collection.split("/")
+    return "/".join("{id}" if i % 2 else part for i, part in enumerate(parts))
+
+async def _call(operation: str, collection: str, fn, *args, **kwargs):
+    """run() that records latency and errors per collection and operation"""
+    label = _collection_label(collection)
+    start = time.perf_counter()
+    try:
+        return await run(fn, *args, **kwargs)
+    except Exception:
+        firestore_operation_errors.inc(label, operation)
+        raise
+    finally:
+        firestore_operation_duration.observe(time.perf_counter() - start, label, operation)
+
+def new_document_id(collection: str) -> str:
+    """Generate a document ID without a round trip"""
+    return get_backend().new_id(collection)
+
+async def get_document(collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+    """Get document data, or None if it does not exist"""
+    _count_reads(1)
+    return await _call("get", collection, get_backend().get, collection, doc_id)
+
+async def get_documents(collection: str, doc_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """Get many documents in a single round trip, keyed by doc ID"""
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if not doc_ids:
+        return {}
+    _count_reads(len(doc_ids))
+    return await _call("get_many", collection, get_backend().get_many, collection, doc_ids)
+
+async def set_document(collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False) -> None:
+    """Create or overwrite a document"""
+    _count_writes([("merge" if merge else "set", collection, doc_id, data)])
+    await _call("set", collection, get_backend().set, collection, doc_id, data, merge=merge)
+
+async def update_document(collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+    """Update fields of an existing document, raises NotFoundError if missing"""
+    _count_writes([("update", collection, doc_id, data)])
+    await _call("update", collection, get_backend().update, collection, doc_id, data)
+
+async def delete_document(collection: str, doc_id: str) -> None:
+    """Delete a document (no-op if it does not exist)"""
+    _count_writes([("delete", collection, doc_id, None)])
+    await _call("delete", collection, get_backend().delete, collection, doc_id)
+
+async def query_documents(
+    collection: str,
+    filters: Iterable[Filter] = (),
+    order_by: Optional[Sequence[Tuple[str, str]]] = None,
+    limit: Optional[int] = None,
+    start_after: Optional[Dict[str, Any]] = None,
+    end_before: Optional[Dict[str, Any]] = None
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Run a query and return (doc_id, data) pairs
+
+    start_after / end_before are cursors given as {order_by field: value}.
+    """
+    docs = await _call(
+        "query", collection, get_backend().query,
+        collection, list(filters), order_by, limit, start_after, end_before
+    )
+    _count_reads(len(docs))
+    return docs
+
+def _batch_collection(operations: List[Operation]) -> str:
+    # batch และ transaction ที่แตะหลาย collection ถูกนับรวมไว้ที่ "*"
+    collections = {_collection_label(collection) for _, collection, _, _ in operations}
+    return collections.pop() if len(collections) == 1 else "*"
+
+async def commit_batch(operations: Iterable[Operation]) -> None:
+    """Commit ("set" | "merge" | "update" | "delete", collection, doc_id, data) operations atomically"""
+    operations = list(operations)
+    _count_writes(operations)
+    await _call("commit", _batch_collection(operations), get_backend().commit, operations)
+
+async def run_transaction(fn: Callable[[Transaction], Any]) -> Any:
+    """Run fn(transaction) on the executor; its buffered writes commit atomically
+
+    fn is blocking code: read with transaction.get() first, then write with
+    transaction.set/update/delete. It may be called again if Firestore
+    detects a conflicting write.
+    """
+    transactions: List[Transaction] = []
+
+    def body(transaction: Transaction) -> Any:
+        transactions.append(transaction)
+        return fn(transaction)
+
+    result = await _call("transaction", "*", get_backend().run_transaction, body)
+    if transactions:
+        if transactions[-1].reads:
+            _count_reads(transactions[-1].reads)
+        _count_writes(transactions[-1].operations)
+    return result
+
+async def ping() -> bool:
+    """Readiness probe of the storage backend"""
+    return await _call("ping", "*", get_backend().ping)
@@ -1,19 +1,59 @@
-from firebase_config import db, USERS_COLLECTION
+from firebase_config import USERS_COLLECTION, CACHE_INVALIDATIONS_COLLECTION
+import asyncio
 from datetime import datetime
 from .base import FirebaseError, NotFoundError, DuplicateError
+from . import store
+from .blobs import create_blob_store
+from .cache import LRUCache, create_invalidation_channel
+from .loader import get_loader
+from config import settings
 from logging_config import logger
 
+# cache เอกสารผู้ใช้ในหน่วยความจำ (LRU + TTL)
+user_cache = LRUCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+invalidation_channel = create_invalidation_channel(
+    settings.CACHE_INVALIDATION_CHANNEL,
+    CACHE_INVALIDATIONS_COLLECTION,
+    settings.CACHE_INVALIDATION_POLL_SECONDS
+)
+invalidation_channel.subscribe(USERS_COLLECTION, user_cache.invalidate)
+
+# รูปโปรไฟล์เก็บแยกจากเอกสารผู้ใช้ เอกสารเก็บแค่ hash ของรูป
+picture_store = create_blob_store(
+    settings.BLOB_STORE,
+    settings.BLOB_STORE_PATH,
+    settings.BLOB_STORE_BUCKET
+)
+
+async def _fetch_users(usernames):
+    generation = user_cache.generation
+    users = await store.get_documents(USERS_COLLECTION, usernames)
+    for username, user in users.items():
+        if user is not None:
+            user_cache.set(username, user, generation)
+    return users
+
+def _user_loader():
+    return get_loader('users', _fetch_users)
+
+async def _forget(username):
+    user_cache.invalidate(username)
+    await invalidation_channel.publish(USERS_COLLECTION, username)
+    loader = _user_loader()
+    if loader:
+        loader.clear(username)
+
+def _cached(username):
+    invalidation_channel.poll()
+    user = user_cache.get(username)
+    return dict(user) if user else None
+
 class User:
     @staticmethod
     async def create(user_data: dict):
         """Create new user"""
         try:
-            doc_ref = db.collection(USERS_COLLECTION).document(user_data['username'])
-            
-            if doc_ref.get().exists:
-                raise DuplicateError("Username already exists")
-                
-            doc_ref.set({
+            user_doc = {
                 'username': user_data['username'],
                 'email': user_data['email'],
                 'hashed_password': user_data['hashed_password'],
@@ -23,32 +63,89 @@ class User:
                 'interests': user_data.get('interests', []),
                 'profile_pic': user_data.get('profile_pic', None),
                 'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow(),
                 'last_online': datetime.utcnow(),
                 'is_active': True
-            })
+            }
+
+            # เช็คชื่อซ้ำและสร้างใน transaction เดียว กันสมัครชื่อเดียวกันพร้อมกัน
+            def create_if_absent(transaction):
+                if transaction.get(USERS_COLLECTION, user_data['username']) is not None:
+                    raise DuplicateError("Username already exists")
+                transaction.set(USERS_COLLECTION, user_data['username'], user_doc)
+
+            await store.run_transaction(create_if_absent)
+            user_cache.set(user_data['username'], user_doc)
+
+            loader = _user_loader()
+            if loader:
+                loader.prime(user_data['username'], user_doc)
             return user_data['username']
             
         except Exception as e:
             logger.error(f"Error creating user: {e}")
             raise FirebaseError(f"Error creating user: {str(e)}")
 
+    @staticmethod
+    def forget_cached(usernames):
+        """Drop users from this worker's cache after a write made outside this class
+
+        Other workers are not told: publishing one invalidation per user
+        would cost as many writes as the batch it follows. Their copies
+        expire after USER_CACHE_TTL_SECONDS.
+        """
+        for username in usernames:
+            user_cache.invalidate(username)
+
     @staticmethod
     async def get_by_username(username: str):
         """Get user by username"""
         try:
-            doc = db.collection(USERS_COLLECTION).document(username).get()
-            return doc.to_dict() if doc.exists else None
+            user = _cached(username)
+            if user:
+                return user
+
+            loader = _user_loader()
+            if loader is None:
+                user = (await _fetch_users([username]))[username]
+            else:
+                user = await loader.load(username)
+            return dict(user) if user else None
             
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             raise FirebaseError(f"Error getting user: {str(e)}")
 
+    @staticmethod
+    async def get_many(usernames):
+        """Get many users in one round trip, keyed by username (None if missing)"""
+        try:
+            users = {username: _cached(username) for username in usernames}
+            missing = [username for username, user in users.items() if user is None]
+            if missing:
+                loader = _user_loader()
+                if loader is None:
+                    fetched = await _fetch_users(missing)
+                else:
+                    fetched = await loader.load_many(missing)
+                for username, user in fetched.items():
+                    users[username] = dict(user) if user else None
+            return users
+
+        except Exception as e:
+            logger.error(f"Error getting users: {e}")
+            raise FirebaseError(f"Error getting users: {str(e)}")
+
     @staticmethod
     async def get_by_email(email: str):
         """Get user by email"""
         try:
-            users = db.collection(USERS_COLLECTION).where('email', '==', email).limit(1).get()
-            return users[0].to_dict() if users else None
+            users = await store.query_documents(
+                USERS_COLLECTION,
+                filters=[('email', '==', email)],
+                limit=1
+            )
+            return users[0][1] if users else None
             
         except Exception as e:
             logger.error(f"Error getting user by email: {e}")
@@ -58,10 +155,69 @@ class User:
     async def update(username: str, update_data: dict):
         """Update user data"""
         try:
-            doc_ref = db.collection(USERS_COLLECTION).document(username)
-            doc_ref.update(update_data)
+            await store.update_document(
+                USERS_COLLECTION,
+                username,
+                dict(update_data, updated_at=datetime.utcnow())
+            )
+            await _forget(username)
             return True
             
+        except NotFoundError:
+            raise
         except Exception as e:
             logger.error(f"Error updating user: {e}")
-            raise FirebaseError(f"Error updating user: {str(e)}")
\ No newline at end of file
+            raise FirebaseError(f"Error updating user: {str(e)}")
+
+    @staticmethod
+    async def deactivate(username: str):
+        """Deactivate user account"""
+        try:
+            await store.update_document(USERS_COLLECTION, username, {
+                'is_active': False,
+                'deactivated_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            })
+            await _forget(username)
+            logger.info(f"Deactivated user: {username}")
+            return True
+
+        except NotFoundError:
+            raise
+        except Exception as e:
+            logger.error(f"Error deactivating user: {e}")
+            raise FirebaseError(f"Error deactivating user: {str(e)}")
+
+    @staticmethod
+    async def set_profile_picture(username: str, image: bytes, thumbnail: bytes):
+        """Store a profile picture and its thumbnail and point the user at them
+
+        Returns the (picture ID, thumbnail ID) pair.
+        """
+        try:
+            picture_id, thumbnail_id = await asyncio.gather(
+                picture_store.put(image),
+                picture_store.put(thumbnail)
+            )
+            await User.update(username, {
+                'profile_pic_id': picture_id,
+                'profile_pic_thumbnail_id': thumbnail_id,
+                'profile_pic': None
+            })
+            return picture_id, thumbnail_id
+
+        except NotFoundError:
+            raise
+        except Exception as e:
+            logger.error(f"Error setting profile picture: {e}")
+            raise FirebaseError(f"Error setting profile picture: {str(e)}")
+
+    @staticmethod
+    async def get_profile_picture(picture_id: str):
+        """Picture bytes by ID, or None if there is no such picture"""
+        return await picture_store.get(picture_id)
+
+    @staticmethod
+    def cache_stats():
+        """Hit/miss/eviction counters of the user cache"""
+        return user_cache.stats()
@@ -7,8 +7,12 @@ from utils.auth import (
     create_access_token, 
     get_password_hash, 
     verify_password, 
-    get_current_user
+    get_current_user,
+    oauth2_scheme,
+    revoke_access_token,
+    user_claims
 )
+from utils.passwords import PasswordHasherBusy
 from models import User as UserModel
 from utils.chat import chat_manager
 from config import settings
@@ -17,6 +21,13 @@ from logging_config import logger
 # ประกาศ router แค่ครั้งเดียว
 router = APIRouter()
 
+def _busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/register", response_model=Profile)
 async def register(user: ProfileCreate):
     logger.info(f"Received registration request: {user.username}")
@@ -40,7 +51,7 @@ async def register(user: ProfileCreate):
             )
 
         # Hash password
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash(user.password)
         
         # สร้างข้อมูลผู้ใช้
         user_data = {
@@ -58,10 +69,12 @@ async def register(user: ProfileCreate):
         new_user = await UserModel.get_by_username(user_id)
         
         # อัพเดทสถานะออนไลน์
-        await chat_manager.update_user_status(user_id)
+        await chat_manager.update_user_status(user_id, user.school)
         
         return new_user
 
+    except PasswordHasherBusy:
+        raise _busy_exception()
     except Exception as e:
         logger.error(f"Error during registration: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -80,19 +93,33 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             )
 
         # เช็ครหัสผ่าน
-        if not verify_password(form_data.password, user['hashed_password']):
+        valid, new_hash = await verify_password(form_data.password, user['hashed_password'])
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect username or password"
             )
 
+        if not user.get('is_active', True):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Account is deactivated"
+            )
+
+        # hash เดิมใช้ cost เก่า เก็บ hash ใหม่แทน (เฉพาะบัญชีที่ยังใช้งานได้)
+        if new_hash:
+            try:
+                await UserModel.update(user['username'], {'hashed_password': new_hash})
+            except Exception as e:
+                logger.error(f"Error rehashing password for {user['username']}: {e}")
+
         # อัพเดทสถานะออนไลน์
-        await chat_manager.update_user_status(user['username'])
+        await chat_manager.update_user_status(user['username'], user['school'])
         logger.info(f"User logged in: {user['username']}")
 
         # สร้าง token
         access_token = create_access_token(
-            data={"sub": user['username']},
+            data=user_claims(user),
             expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         )
 
@@ -101,6 +128,8 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             "token_type": "bearer"
         }
 
+    except PasswordHasherBusy:
+        raise _busy_exception()
     except Exception as e:
         logger.error(f"Error during login: {str(e)}")
         raise HTTPException(
@@ -109,12 +138,18 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
 
 @router.post("/logout")
-async def logout(current_user: Annotated[str, Depends(get_current_user)]):
-    logger.info(f"Logout request from user: {current_user}")
+async def logout(
+    current_user: Annotated[dict, Depends(get_current_user)],
+    token: Annotated[str, Depends(oauth2_scheme)]
+):
+    logger.info(f"Logout request from user: {current_user['username']}")
     try:
+        # ยกเลิก token นี้ไม่ให้ใช้ได้อีก
+        await revoke_access_token(token)
+
         # อัพเดทสถานะออฟไลน์
-        await chat_manager.remove_user_status(current_user)
-        logger.info(f"User logged out: {current_user}")
+        await chat_manager.remove_user_status(current_user['username'])
+        logger.info(f"User logged out: {current_user['username']}")
         return {"message": "Logged out successfully"}
     except Exception as e:
         logger.error(f"Error during logout: {str(e)}")
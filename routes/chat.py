@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Annotated
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status as http_status
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Optional
 from datetime import datetime
-from models import User as UserModel
+from pydantic import ValidationError
+from models import FirebaseError, User as UserModel
+from models.loader import disable_loaders
 from schemas import ChatMessage, ChatResponse
-from utils.auth import get_current_user
+from utils.auth import get_current_user, authenticate_token
 from utils.chat import chat_manager
+from utils.connections import connection_manager
+from utils.events import event_bus, format_sse
+from utils.serialization import NegotiatedResponse
+from config import settings
 from logging_config import logger
 
 router = APIRouter()
@@ -26,20 +34,89 @@ async def start_chat(current_user: Annotated[str, Depends(get_current_user)]):
 @router.get("/waiting-status")
 async def check_waiting_status(current_user: Annotated[str, Depends(get_current_user)]):
     try:
-        status = await chat_manager.get_waiting_status(current_user)
+        status = await chat_manager.get_waiting_status(current_user['username'])
         return status
     except Exception as e:
         logger.error(f"Error checking waiting status: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/events")
+async def chat_events(request: Request, token: str = Query(...)):
+    """Server-Sent Events: waiting, matched, partner_left and chat_ended"""
+    # EventSource ส่ง header ไม่ได้ จึงรับ token ทาง query
+    current_user = await authenticate_token(token)
+    username = current_user['username']
+    school = current_user.get('school')
+
+    async def stream():
+        disable_loaders()
+        # สมัครรับ event ตอน stream เริ่มจริง ถ้า client หลุดก่อน body เริ่ม finally จะไม่ทำงานและคิวค้าง
+        # ต้องสมัครก่อนอ่านสถานะปัจจุบัน ไม่ให้พลาด event ที่เกิดระหว่างนั้น
+        queue = event_bus.subscribe(username)
+        try:
+            # ส่งสถานะปัจจุบันก่อน เผื่อจับคู่ไปแล้วก่อนเชื่อมต่อ
+            current = await chat_manager.get_waiting_status(username)
+            if current:
+                event = "waiting" if current["status"] == "waiting" else "matched"
+                yield format_sse(event, current)
+
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(
+                        queue.get(),
+                        timeout=settings.SSE_KEEPALIVE_SECONDS
+                    )
+                    yield format_sse(event, data)
+                except asyncio.TimeoutError:
+                    # keep-alive และถือเป็น heartbeat ให้ยังอยู่ในคิวรอ
+                    await chat_manager.update_user_status(username, school)
+                    yield ": ping\n\n"
+        finally:
+            event_bus.unsubscribe(username, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/chat-messages/{chat_id}")
 async def get_chat_messages(
     chat_id: str,
-    current_user: Annotated[str, Depends(get_current_user)]
+    request: Request,
+    current_user: Annotated[str, Depends(get_current_user)],
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100)
 ):
+    """Messages newest first; cursors for the next calls are returned in headers
+
+    X-Next-Cursor: pass as after= to fetch only newer messages
+    X-Prev-Cursor: pass as before= to scroll back
+    Send the returned ETag as If-None-Match to get 304 when nothing changed.
+    """
     try:
-        messages = await chat_manager.get_messages(chat_id, current_user)
-        return messages
+        page = await chat_manager.get_messages(
+            chat_id,
+            current_user['username'],
+            limit=limit,
+            after=after,
+            before=before,
+            if_none_match=request.headers.get("if-none-match")
+        )
+        if page["not_modified"]:
+            return Response(status_code=http_status.HTTP_304_NOT_MODIFIED, headers={"ETag": page["etag"]})
+        headers = {}
+        if page["etag"]:
+            headers["ETag"] = page["etag"]
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        if page["prev_cursor"]:
+            headers["X-Prev-Cursor"] = page["prev_cursor"]
+        # ส่ง response เองเพื่อข้าม jsonable_encoder ของ FastAPI
+        return NegotiatedResponse(page["messages"], headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting messages: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -51,8 +128,15 @@ async def send_chat_message(
     current_user: Annotated[str, Depends(get_current_user)]
 ):
     try:
-        result = await chat_manager.send_message(chat_id, current_user, message.content)
+        result = await chat_manager.send_message(
+            chat_id,
+            current_user['username'],
+            message.content,
+            message.emoji
+        )
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error sending message: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -63,8 +147,10 @@ async def leave_chat(
     current_user: Annotated[str, Depends(get_current_user)]
 ):
     try:
-        await chat_manager.leave_chat(chat_id, current_user)
+        await chat_manager.leave_chat(chat_id, current_user['username'])
         return {"message": "Successfully left chat"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error leaving chat: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -96,4 +182,54 @@ async def submit_chat_rating(
         return {"message": "Rating submitted successfully"}
     except Exception as e:
         logger.error(f"Error submitting rating: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.websocket("/ws/{chat_id}")
+async def chat_websocket(
+    websocket: WebSocket,
+    chat_id: str,
+    token: str = Query(...)
+):
+    """Push new messages to participants and accept sends on one connection"""
+    # ยืนยันตัวตนครั้งเดียวตอนเชื่อมต่อ (browser ส่ง header ไม่ได้ จึงรับ token ทาง query)
+    try:
+        current_user = await authenticate_token(token)
+        await chat_manager.get_chat_for_user(chat_id, current_user['username'])
+    except HTTPException as e:
+        logger.error(f"WebSocket rejected for chat {chat_id}: {e.detail}")
+        await websocket.close(code=http_status.WS_1008_POLICY_VIOLATION)
+        return
+
+    username = current_user['username']
+    await connection_manager.connect(chat_id, websocket)
+    await chat_manager.update_user_status(username, current_user.get('school'))
+    try:
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except (ValueError, KeyError):
+                # frame ที่ไม่ใช่ JSON (หรือเป็น binary) เสียแค่ข้อความเดียว ไม่ต้องตัดการเชื่อมต่อ
+                await websocket.send_json({"type": "error", "detail": "Invalid JSON"})
+                continue
+            try:
+                message = ChatMessage(**data)
+                await chat_manager.send_message(chat_id, username, message.content, message.emoji)
+                await chat_manager.update_user_status(username, current_user.get('school'))
+            except (ValidationError, TypeError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail})
+            except FirebaseError as e:
+                logger.error(f"Error sending WebSocket message in chat {chat_id}: {e}")
+                await websocket.send_json({"type": "error", "detail": "Could not send message, please retry"})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error in chat {chat_id}: {e}")
+        # ปิดให้ถูกต้อง client จะได้รู้ว่าควรเชื่อมต่อใหม่
+        try:
+            await websocket.close(code=http_status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            pass
+    finally:
+        connection_manager.disconnect(chat_id, websocket)
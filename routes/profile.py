@@ -1,21 +1,62 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from schemas import ProfileUpdate, Profile
-from utils.auth import get_current_user
+from datetime import timedelta
+from utils.auth import claims_changed, create_access_token, get_current_user, user_claims
+from utils.revocation import revocation_list
 from models import User
 from models.base import FirebaseError, NotFoundError
+from models.blobs import content_type
+from utils.etag import etag_matches, weak_etag
+from utils.images import InvalidImageError, UploadTooLargeError, make_thumbnails, read_multipart_file
+from config import settings
 from typing import Dict, Any, List
 from logging_config import logger
 
 router = APIRouter()
 
+# รูปอ้างอิงด้วย hash ของเนื้อหา ไม่มีวันเปลี่ยน จึง cache ได้นาน
+PICTURE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# เผื่อขนาดของ header multipart นอกเหนือจากตัวไฟล์
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+def _picture_url(picture_id: str) -> str:
+    return f"/profile/picture/{picture_id}"
+
+def _with_picture_url(user: Dict[str, Any]) -> Dict[str, Any]:
+    if user.get('profile_pic_id'):
+        user['profile_pic'] = _picture_url(user['profile_pic_id'])
+    if user.get('profile_pic_thumbnail_id'):
+        user['profile_pic_thumbnail'] = _picture_url(user['profile_pic_thumbnail_id'])
+    return user
+
+def _profile_etag(user: Dict[str, Any]) -> str:
+    # เอกสารที่ยังไม่เคยแก้ไขหลังมี updated_at ใช้เวลาสร้างแทน
+    return weak_etag(
+        user['username'],
+        user.get('updated_at') or user.get('created_at'),
+        user.get('last_online')
+    )
+
 @router.get("/", response_model=Profile)
-async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
-    """Get user profile"""
+async def get_profile(
+    request: Request,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Get user profile (supports If-None-Match)"""
     try:
+        # ผู้ใช้ที่อยู่ใน cache ไม่ต้องอ่าน Firestore เลย
         user = await User.get_by_username(current_user['username'])
         if not user:
             raise NotFoundError("User not found")
-        return user
+
+        etag = _profile_etag(user)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+        return _with_picture_url(user)
         
     except NotFoundError as e:
         raise HTTPException(
@@ -32,9 +73,15 @@ async def get_profile(current_user: Dict[str, Any] = Depends(get_current_user)):
 @router.post("/update", response_model=Profile)
 async def update_profile(
     profile_update: ProfileUpdate,
+    response: Response,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Update user profile"""
+    """Update user profile
+
+    When the change touches claims carried in the access token (school,
+    display_name), a fresh token is returned in the X-Access-Token header
+    and the client should use it from then on.
+    """
     try:
         # เช็คอีเมลซ้ำ
         if profile_update.email:
@@ -55,8 +102,15 @@ async def update_profile(
         updated_user = await User.get_by_username(current_user['username'])
         if not updated_user:
             raise NotFoundError("User not found")
-            
-        return updated_user
+
+        # token เดิมยังมี school/display_name ค่าเก่า ออก token ใหม่ให้ client ใช้แทน
+        if claims_changed(current_user, updated_user):
+            response.headers["X-Access-Token"] = create_access_token(
+                data=user_claims(updated_user),
+                expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            )
+
+        return _with_picture_url(updated_user)
         
     except NotFoundError as e:
         raise HTTPException(
@@ -79,22 +133,48 @@ async def update_profile(
 
 @router.post("/picture")
 async def update_profile_picture(
-    profile_pic: str,  # Base64 encoded image
+    request: Request,
     current_user: Dict[str, Any] = Depends(get_current_user)
 ):
-    """Update profile picture"""
+    """Update profile picture from a multipart upload (field "file")"""
     try:
-        # อัพเดทรูปโปรไฟล์
-        await User.update(
+        content_length = request.headers.get("content-length")
+        if content_length and int(content_length) > settings.AVATAR_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+            raise UploadTooLargeError("File too large")
+
+        upload = await read_multipart_file(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            "file",
+            settings.AVATAR_MAX_BYTES
+        )
+        # ย่อรูปใน process pool แล้วเก็บเฉพาะ thumbnail ไม่เก็บไฟล์ต้นฉบับ
+        # เก็บแค่ขนาดเล็กสุดกับใหญ่สุด ขนาดอื่นไม่ต้องย่อ
+        sizes = sorted({min(settings.AVATAR_SIZES), max(settings.AVATAR_SIZES)})
+        thumbnails = await make_thumbnails(upload, sizes)
+        picture_id, thumbnail_id = await User.set_profile_picture(
             current_user['username'],
-            {"profile_pic": profile_pic}
+            thumbnails[sizes[-1]],
+            thumbnails[sizes[0]]
         )
-        
+
         return {
             "status": "success",
-            "message": "อัพเดทรูปโปรไฟล์สำเร็จ"
+            "message": "อัพเดทรูปโปรไฟล์สำเร็จ",
+            "profile_pic": _picture_url(picture_id),
+            "profile_pic_thumbnail": _picture_url(thumbnail_id)
         }
-        
+
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"รูปภาพต้องมีขนาดไม่เกิน {settings.AVATAR_MAX_BYTES // (1024 * 1024)} MB"
+        )
+    except InvalidImageError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="รูปแบบรูปภาพไม่ถูกต้อง"
+        )
     except Exception as e:
         logger.error(f"Error updating profile picture: {e}")
         raise HTTPException(
@@ -102,6 +182,23 @@ async def update_profile_picture(
             detail=str(e)
         )
 
+@router.get("/picture/{picture_id}")
+async def get_profile_picture(picture_id: str, request: Request):
+    """Serve a profile picture by its content hash"""
+    etag = f'"{picture_id}"'
+    headers = {"ETag": etag, "Cache-Control": PICTURE_CACHE_CONTROL}
+    # ID คือ hash ของเนื้อหา ถ้า ETag ตรงก็ไม่ต้องอ่านรูป
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    image = await User.get_profile_picture(picture_id)
+    if image is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Picture not found"
+        )
+    return Response(content=image, media_type=content_type(image), headers=headers)
+
 @router.post("/interests")
 async def update_interests(
     interests: List[str],
@@ -131,4 +228,28 @@ async def update_interests(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.post("/deactivate")
+async def deactivate_account(current_user: Dict[str, Any] = Depends(get_current_user)):
+    """Deactivate account and revoke all of its tokens"""
+    try:
+        await User.deactivate(current_user['username'])
+        await revocation_list.revoke_user(current_user['username'])
+
+        return {
+            "status": "success",
+            "message": "ปิดบัญชีผู้ใช้สำเร็จ"
+        }
+
+    except NotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error deactivating account: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
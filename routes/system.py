@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import PlainTextResponse
 from typing import Annotated
 from datetime import datetime
 from utils.auth import get_current_user
 from utils.chat import chat_manager
+from utils.connections import connection_manager
+from utils.presence import presence_tracker
 from logging_config import logger
-from firebase_config import db
+from models import store
+import metrics
 
 router = APIRouter()
 
+@router.options("/update-status")
+async def options_update_status():
+    return {"message": "OK"}
+
 @router.post("/update-status")
-@router.options("/update-status")  # เพิ่ม options method
-async def update_status():  # ลบ current_user dependency
+async def update_status(current_user: Annotated[dict, Depends(get_current_user)]):
+    """Heartbeat: mark the user online without touching Firestore"""
     try:
+        await chat_manager.update_user_status(current_user['username'], current_user.get('school'))
         return {
             "status": "online",
             "last_updated": datetime.now().isoformat()
@@ -25,9 +34,10 @@ async def get_system_status(current_user: Annotated[str, Depends(get_current_use
     try:
         return {
             "status": "healthy",
-            "waiting_users_count": len(chat_manager.waiting_users),
-            "active_chats_count": len(chat_manager.active_chats),
-            "online_users_count": len(chat_manager.online_users),
+            "waiting_users_count": chat_manager.queue.depth(),
+            "active_chats_count": chat_manager.active_chat_count(),
+            "online_users_count": presence_tracker.online_total(),
+            "websocket_connections": connection_manager.count(),
             "current_time": datetime.now().isoformat()
         }
     except Exception as e:
@@ -43,4 +53,29 @@ async def health_check():
     return {
         "status": "ok",
         "timestamp": datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: checks the storage backend (one document read on Firestore)"""
+    try:
+        await store.ping()
+        return {
+            "status": "ready",
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Readiness check failed: {str(e)}")
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {
+            "status": "unavailable",
+            "detail": str(e)
+        }
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape target (text exposition format 0.0.4)"""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
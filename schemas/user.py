@@ -11,6 +11,7 @@ class ProfileBase(BaseModel):
     bio: Optional[str] = None
     interests: List[str] = []
     profile_pic: Optional[str] = None
+    profile_pic_thumbnail: Optional[str] = None
 
 # Profile for registration with password
 class ProfileCreate(ProfileBase):
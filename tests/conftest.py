@@ -0,0 +1,58 @@
+import itertools
+import os
+import sys
+
+# ต้องตั้งก่อน import main: ใช้ backend ในหน่วยความจำ และส่งจำนวน operation กลับใน header
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["FIRESTORE_STATS_HEADER"] = "true"
+os.environ["BCRYPT_ROUNDS"] = "4"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from models import store
+from models.backends.memory import MemoryBackend
+from models.message import message_buffer
+from models.user import user_cache
+from utils.revocation import revocation_list
+
+_ids = itertools.count()
+
+@pytest.fixture(scope="session")
+def client():
+    # ใช้ client เดียวทั้ง session เพื่อให้ background task อยู่บน event loop เดียวกัน
+    with TestClient(app) as client:
+        # โหลด revocation list ตั้งแต่ต้น ไม่ให้ query นี้ไปนับใน test แรกที่ยืนยันตัวตน
+        client.portal.call(revocation_list.ensure_loaded)
+        yield client
+
+@pytest.fixture(autouse=True)
+def fresh_store():
+    """Every test starts from an empty database and cold caches"""
+    store.set_backend(MemoryBackend())
+    user_cache.clear()
+    message_buffer._chats.clear()
+    yield
+
+@pytest.fixture
+def school():
+    # แต่ละ test ใช้โรงเรียนของตัวเอง คิวจับคู่จะได้ไม่ปนกัน
+    return f"school-{next(_ids)}"
+
+@pytest.fixture
+def register(client, school):
+    """Register and log in a new user, returning (username, auth headers)"""
+    def register(name: str = "student"):
+        username = f"{name}{next(_ids)}"
+        response = client.post("/register", json={
+            "username": username,
+            "email": f"{username}@example.com",
+            "school": school,
+            "password": "test-password"
+        })
+        assert response.status_code == 200, response.text
+        token = client.post("/token", data={"username": username, "password": "test-password"})
+        assert token.status_code == 200, token.text
+        return username, {"Authorization": f"Bearer {token.json()['access_token']}"}
+    return register
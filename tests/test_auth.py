@@ -0,0 +1,35 @@
+import gc
+from utils import auth
+from utils.revocation import RevocationList
+
+def test_fresh_worker_loads_revocations_before_first_check(client, register, monkeypatch):
+    _, headers = register()
+    assert client.post("/logout", headers=headers).status_code == 200
+
+    # worker ใหม่ยังไม่เคยโหลดรายการ ต้องโหลดก่อนตรวจ token ครั้งแรก
+    monkeypatch.setattr(auth, "revocation_list", RevocationList(refresh_seconds=3600))
+    response = client.get("/profile/", headers=headers)
+    assert response.status_code == 401
+
+def test_profile_update_reissues_token_with_new_claims(client, register, monkeypatch):
+    monkeypatch.setattr(auth.settings, "STATELESS_AUTH", True)
+    _, headers = register()
+
+    response = client.post("/profile/update", json={"school": "another-school"}, headers=headers)
+    assert response.status_code == 200, response.text
+    token = response.headers["x-access-token"]
+
+    user = client.portal.call(auth.authenticate_token, token)
+    assert user["school"] == "another-school"
+
+def test_profile_update_without_claim_changes_keeps_token(client, register):
+    _, headers = register()
+    response = client.post("/profile/update", json={"bio": "สวัสดี"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert "x-access-token" not in response.headers
+
+def test_revocation_check_outside_an_event_loop_starts_nothing(recwarn):
+    revocations = RevocationList(refresh_seconds=0)
+    assert not revocations.is_revoked(None, "someone", 0.0)
+    gc.collect()
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
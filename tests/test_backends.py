@@ -0,0 +1,164 @@
+"""Query and write semantics shared by the local backends
+
+Both run models/backends/local.py, but the SQL backend first narrows
+equality filters in SQLite, so every case runs against each backend and
+against SQL without that pushdown (as on databases other than SQLite).
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from models.backends import ASCENDING, DESCENDING, DOCUMENT_ID
+from models.backends.memory import MemoryBackend
+from models.backends.sql import SQLBackend
+from models.base import NotFoundError
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(params=["memory", "sql", "sql-no-pushdown"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBackend()
+    backend = SQLBackend(f"sqlite:///{tmp_path / 'documents.db'}")
+    backend._pushdown = request.param == "sql"
+    return backend
+
+@pytest.fixture
+def users(backend):
+    backend.commit([
+        ("set", "users", "ann", {"age": 20, "school": "a", "tags": ["x", "y"], "profile": {"city": "bkk"}}),
+        ("set", "users", "ben", {"age": 25, "school": "b", "tags": ["y"], "profile": {"city": "cnx"}}),
+        ("set", "users", "cat", {"age": 30, "school": "a", "tags": [], "active": True}),
+        ("set", "users", "dan", {"age": "30", "school": None}),
+    ])
+    return backend
+
+def ids(documents):
+    return [doc_id for doc_id, _ in documents]
+
+@pytest.mark.parametrize("filters, expected", [
+    ([("school", "==", "a")], ["ann", "cat"]),
+    ([("school", "!=", "a")], ["ben"]),
+    ([("age", ">", 20)], ["ben", "cat"]),
+    ([("age", ">=", 25), ("age", "<", 30)], ["ben"]),
+    ([("age", "<=", 20)], ["ann"]),
+    ([("age", "==", "30")], ["dan"]),
+    ([("school", "in", ["b", None])], ["ben", "dan"]),
+    ([("school", "not-in", ["a"])], ["ben"]),
+    ([("tags", "array_contains", "y")], ["ann", "ben"]),
+    ([("tags", "array_contains_any", ["x", "z"])], ["ann"]),
+    ([("profile.city", "==", "cnx")], ["ben"]),
+    ([("active", "==", True)], ["cat"]),
+])
+def test_filters(users, filters, expected):
+    assert ids(users.query("users", filters, None, None)) == expected
+
+def test_unknown_operator(users):
+    with pytest.raises(ValueError):
+        users.query("users", [("age", "~", 1)], None, None)
+
+@pytest.fixture
+def messages(backend):
+    # สองข้อความแรกเวลาเท่ากัน ต้องเรียงต่อด้วย document ID
+    backend.commit([
+        ("set", "messages", "m2", {"created_at": START, "n": 2}),
+        ("set", "messages", "m1", {"created_at": START, "n": 1}),
+        ("set", "messages", "m3", {"created_at": START + timedelta(seconds=1), "n": 3}),
+        ("set", "messages", "m4", {"n": 4}),
+    ])
+    return backend
+
+ORDER = [("created_at", ASCENDING), (DOCUMENT_ID, ASCENDING)]
+NEWEST_FIRST = [("created_at", DESCENDING), (DOCUMENT_ID, DESCENDING)]
+
+def test_order_skips_documents_without_the_field(messages):
+    assert ids(messages.query("messages", [], ORDER, None)) == ["m1", "m2", "m3"]
+    assert ids(messages.query("messages", [], NEWEST_FIRST, 2)) == ["m3", "m2"]
+    assert ids(messages.query("messages", [], [("n", DESCENDING)], None)) == ["m4", "m3", "m2", "m1"]
+
+def test_cursors_on_time_and_document_id(messages):
+    after_m1 = {"created_at": START, DOCUMENT_ID: "m1"}
+    assert ids(messages.query("messages", [], ORDER, None, start_after=after_m1)) == ["m2", "m3"]
+    assert ids(messages.query("messages", [], NEWEST_FIRST, None, start_after={
+        "created_at": START + timedelta(seconds=1), DOCUMENT_ID: "m3"
+    })) == ["m2", "m1"]
+    assert ids(messages.query("messages", [], ORDER, None, end_before={
+        "created_at": START + timedelta(seconds=1), DOCUMENT_ID: "m3"
+    })) == ["m1", "m2"]
+
+def test_cursor_on_a_prefix_of_the_order(messages):
+    # cursor ที่มีแค่ created_at ข้ามทุกข้อความที่เวลาเท่ากัน
+    after = {"created_at": START}
+    assert ids(messages.query("messages", [], ORDER, None, start_after=after)) == ["m3"]
+
+def test_naive_and_aware_times_compare_equal(messages):
+    naive = START.replace(tzinfo=None)
+    assert ids(messages.query("messages", [("created_at", "==", naive)], ORDER, None)) == ["m1", "m2"]
+    assert messages.get("messages", "m1")["created_at"] == START
+
+def test_merge_is_deep_and_update_sets_dotted_paths(backend):
+    backend.commit([("set", "chats", "c1", {"meta": {"a": 1, "b": 1}, "count": 1})])
+    backend.commit([("merge", "chats", "c1", {"meta": {"b": 2, "c": 3}})])
+    backend.commit([("update", "chats", "c1", {"meta.a": 10, "new.field": "x"})])
+    assert backend.get("chats", "c1") == {
+        "meta": {"a": 10, "b": 2, "c": 3},
+        "count": 1,
+        "new": {"field": "x"}
+    }
+    backend.commit([("merge", "chats", "c2", {"count": 1})])
+    assert backend.get("chats", "c2") == {"count": 1}
+
+def test_update_of_a_missing_document_fails_the_whole_batch(backend):
+    with pytest.raises(NotFoundError):
+        backend.commit([
+            ("set", "chats", "c1", {"count": 1}),
+            ("update", "chats", "missing", {"count": 1}),
+        ])
+    assert backend.get("chats", "c1") is None
+
+def test_later_operations_in_a_batch_see_earlier_ones(backend):
+    backend.commit([
+        ("set", "chats", "c1", {"count": 1}),
+        ("update", "chats", "c1", {"count": 2}),
+        ("set", "chats", "c2", {"count": 1}),
+        ("delete", "chats", "c2", None),
+    ])
+    assert backend.get_many("chats", ["c1", "c2"]) == {"c1": {"count": 2}, "c2": None}
+
+def test_transaction_reads_then_commits(backend):
+    backend.commit([("set", "counters", "c", {"value": 1})])
+
+    def increment(transaction):
+        current = transaction.get("counters", "c")
+        transaction.update("counters", "c", {"value": current["value"] + 1})
+        transaction.set("counters", "log", {"last": current["value"]}, merge=True)
+        return transaction.reads
+
+    assert backend.run_transaction(increment) == 1
+    assert backend.get("counters", "c") == {"value": 2}
+    assert backend.get("counters", "log") == {"last": 1}
+
+def test_failed_transaction_writes_nothing(backend):
+    def failing(transaction):
+        transaction.set("counters", "c", {"value": 1})
+        raise RuntimeError("abort")
+
+    with pytest.raises(RuntimeError):
+        backend.run_transaction(failing)
+    assert backend.get("counters", "c") is None
+
+def test_query_results_are_copies(backend):
+    backend.commit([("set", "chats", "c1", {"meta": {"a": 1}})])
+    (_, data), = backend.query("chats", [], None, None)
+    data["meta"]["a"] = 2
+    assert backend.get("chats", "c1") == {"meta": {"a": 1}}
+
+def test_backends_must_implement_storage_methods():
+    from models.backends import StorageBackend, Transaction
+
+    class Partial(StorageBackend):
+        def get(self, collection, doc_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+    with pytest.raises(TypeError):
+        Transaction()
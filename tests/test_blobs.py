@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+from models.blobs import BlobStore, LocalBlobStore, content_hash, content_type, create_blob_store
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+
+def test_blob_store_requires_read_and_write():
+    with pytest.raises(TypeError):
+        BlobStore()
+
+def test_local_store_round_trip(tmp_path):
+    blobs = LocalBlobStore(str(tmp_path))
+    key = asyncio.run(blobs.put(PNG))
+    assert key == content_hash(PNG)
+    assert (tmp_path / key[:2] / key).read_bytes() == PNG
+    # เก็บซ้ำได้ key เดิม
+    assert asyncio.run(blobs.put(PNG)) == key
+    assert asyncio.run(blobs.get(key)) == PNG
+
+def test_missing_and_invalid_keys(tmp_path):
+    blobs = LocalBlobStore(str(tmp_path))
+    assert asyncio.run(blobs.get(content_hash(b"other"))) is None
+    assert asyncio.run(blobs.get("../../etc/passwd")) is None
+
+def test_content_type_from_magic_bytes():
+    assert content_type(PNG) == 'image/png'
+    assert content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    assert content_type(b'plain text') == 'application/octet-stream'
+
+def test_unknown_store_kind():
+    with pytest.raises(ValueError):
+        create_blob_store("s3", "/tmp")
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from models.buffer import MESSAGE_OVERHEAD_BYTES, MessageBuffer
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def message(i, chat_id="c1", content="x"):
+    return {"id": f"m{i:03d}", "chat_id": chat_id, "content": content, "created_at": START + timedelta(seconds=i)}
+
+def ids(messages):
+    return [m["id"] for m in messages]
+
+def position(i):
+    return (START + timedelta(seconds=i), f"m{i:03d}")
+
+def test_written_messages_do_not_answer_full_pages_until_seeded():
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=1_000_000)
+    for i in range(3):
+        buffer.append("c1", message(i))
+    # ไม่รู้ว่ามีข้อความเก่ากว่านี้อีกไหม
+    assert buffer.window("c1", limit=5) is None
+
+    buffer.seed("c1", [message(2), message(1), message(0)], limit=5)
+    assert ids(buffer.window("c1", limit=5)) == ["m002", "m001", "m000"]
+    assert buffer.latest_id("c1") == "m002"
+
+def test_empty_chat_seeded_as_complete():
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=1_000_000)
+    assert buffer.latest_id("c1") is None
+    buffer.seed("c1", [], limit=50)
+    assert buffer.window("c1", limit=50) == []
+    assert buffer.latest_id("c1") == ""
+
+def test_capacity_drops_oldest_and_limits_what_can_be_served():
+    buffer = MessageBuffer(messages_per_chat=3, max_bytes=1_000_000)
+    buffer.seed("c1", [], limit=50)
+    for i in range(5):
+        buffer.append("c1", message(i))
+
+    assert ids(buffer.window("c1", limit=3)) == ["m004", "m003", "m002"]
+    # หน้าที่ใหญ่กว่าที่เก็บไว้ต้องไปอ่านจาก Firestore
+    assert buffer.window("c1", limit=4) is None
+    assert ids(buffer.window("c1", limit=10, after=position(2))) == ["m004", "m003"]
+    # after ที่เก่ากว่าข้อความที่ยังเก็บอยู่ ตอบไม่ได้ครบ
+    assert buffer.window("c1", limit=10, after=position(0)) is None
+
+def test_before_and_after_pages():
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=1_000_000)
+    buffer.seed("c1", [message(i) for i in reversed(range(6))], limit=50)
+    assert ids(buffer.window("c1", limit=2, before=position(4))) == ["m003", "m002"]
+    assert ids(buffer.window("c1", limit=2, after=position(1))) == ["m003", "m002"]
+    assert ids(buffer.window("c1", limit=10, after=position(1), before=position(4))) == ["m003", "m002"]
+
+def test_duplicate_appends_are_ignored():
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=1_000_000)
+    buffer.seed("c1", [], limit=50)
+    buffer.append("c1", message(1))
+    buffer.append("c1", message(1))
+    assert ids(buffer.window("c1", limit=10)) == ["m001"]
+
+def test_byte_budget_evicts_least_recently_used_chat():
+    per_message = MESSAGE_OVERHEAD_BYTES + len("m000") + len("c1") + len("x")
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=per_message * 3)
+    buffer.seed("c1", [], limit=50)
+    buffer.seed("c2", [], limit=50)
+    buffer.append("c1", message(0, "c1"))
+    buffer.append("c2", message(1, "c2"))
+    buffer.window("c1", limit=10)
+    buffer.append("c2", message(2, "c2"))
+    buffer.append("c2", message(3, "c2"))
+
+    assert buffer.latest_id("c1") is None
+    assert buffer.stats()["evictions"] == 1
+    assert buffer.stats()["bytes"] <= per_message * 3
+
+def test_disabled_buffer_never_answers():
+    buffer = MessageBuffer(messages_per_chat=0, max_bytes=1_000_000)
+    buffer.seed("c1", [], limit=50)
+    buffer.append("c1", message(0))
+    assert buffer.window("c1", limit=10) is None
+
+def test_cursor_at_the_floor_timestamp_uses_the_id_tiebreak():
+    buffer = MessageBuffer(messages_per_chat=3, max_bytes=1_000_000)
+    buffer.seed("c1", [], limit=50)
+    # เวลาเท่ากันทั้งหมด เหมือนข้อความใน batch เดียวกัน m000 ถูกทิ้งออกจากบัฟเฟอร์
+    for i in range(4):
+        buffer.append("c1", dict(message(i), created_at=START))
+
+    # ข้อความก่อน m001 ที่เวลาเดียวกันอยู่แค่ใน Firestore
+    assert buffer.window("c1", limit=10, after=(START, "")) is None
+    assert ids(buffer.window("c1", limit=10, after=(START, "m001"))) == ["m003", "m002"]
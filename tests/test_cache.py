@@ -0,0 +1,97 @@
+import gc
+import pytest
+from models import User
+from models.cache import FirestoreInvalidationChannel, InvalidationChannel, LRUCache, create_invalidation_channel
+from models.user import user_cache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("models.cache.time.monotonic", clock)
+    return clock
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(max_size=10, ttl=30)
+    cache.set("a", 1)
+    clock.now += 29
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+def test_read_started_before_an_invalidation_is_not_cached(clock):
+    cache = LRUCache(max_size=10, ttl=60)
+    generation = cache.generation
+    # มีการเขียน (และ invalidate) ระหว่างที่อ่านค่าเก่าอยู่
+    cache.invalidate("a")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+
+    cache.set("a", "fresh", cache.generation)
+    assert cache.get("a") == "fresh"
+
+def test_hits_and_misses_are_counted(clock):
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+def test_invalidation_channel_delivers_to_subscribers():
+    channel = InvalidationChannel()
+    seen = []
+    channel.subscribe("users", seen.append)
+    channel._deliver("users", "alice")
+    channel._deliver("chats", "ignored")
+    assert seen == ["alice"]
+
+def test_unknown_invalidation_channel_is_rejected():
+    with pytest.raises(ValueError):
+        create_invalidation_channel("redis", "cache_invalidations", 1.0)
+
+def test_user_update_invalidates_cached_document(client, register):
+    username, _ = register()
+
+    async def scenario():
+        assert (await User.get_by_username(username))["bio"] == ""
+        await User.update(username, {"bio": "ใหม่"})
+        assert user_cache.get(username) is None
+        assert (await User.get_by_username(username))["bio"] == "ใหม่"
+
+    client.portal.call(scenario)
+
+def test_cached_users_are_copies(client, register):
+    username, _ = register()
+
+    async def scenario():
+        user = await User.get_by_username(username)
+        user["bio"] = "แก้ในตัวแปร"
+        assert (await User.get_by_username(username))["bio"] == ""
+
+    client.portal.call(scenario)
+
+def test_poll_outside_an_event_loop_starts_nothing(recwarn):
+    channel = FirestoreInvalidationChannel("cache_invalidations", poll_seconds=0)
+    channel.poll()
+    gc.collect()
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+from utils.etag import etag_matches, weak_etag
+
+def test_weak_etag_depends_on_every_part():
+    etag = weak_etag("chat", "m1", 50, None, None)
+    assert etag.startswith('W/"')
+    assert etag == weak_etag("chat", "m1", 50, None, None)
+    assert etag != weak_etag("chat", "m2", 50, None, None)
+    assert etag != weak_etag("chat", "m1", 20, None, None)
+
+def test_naive_and_aware_utc_times_give_the_same_etag():
+    naive = datetime(2026, 1, 1, 12, 0, 0)
+    assert weak_etag(naive) == weak_etag(naive.replace(tzinfo=timezone.utc))
+
+def test_if_none_match_uses_weak_comparison():
+    etag = weak_etag("x")
+    strong = etag[2:]
+    assert etag_matches(etag, etag)
+    assert etag_matches(strong, etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('W/"other"', etag)
+
+def test_profile_not_modified_until_updated(client, register):
+    _, headers = register()
+    first = client.get("/profile/", headers=headers)
+    etag = first.headers["etag"]
+
+    cached = client.get("/profile/", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+    client.post("/profile/update", json={"bio": "hello"}, headers=headers)
+    changed = client.get("/profile/", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["bio"] == "hello"
+    assert changed.headers["etag"] != etag
+
+def test_messages_not_modified_until_a_new_message(client, register):
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    url = f"/chat/chat-messages/{chat_id}"
+    client.post(f"/chat/send-message/{chat_id}", json={"content": "one"}, headers=alice_headers)
+
+    first = client.get(url, headers=bob_headers)
+    etag = first.headers["etag"]
+    cached = client.get(url, headers={**bob_headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    # หน้าที่ขอต่างกันต้องไม่ใช้ ETag เดียวกัน
+    other_page = client.get(url, params={"limit": 10}, headers={**bob_headers, "If-None-Match": etag})
+    assert other_page.status_code == 200
+
+    client.post(f"/chat/send-message/{chat_id}", json={"content": "two"}, headers=alice_headers)
+    changed = client.get(url, headers={**bob_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert [m["content"] for m in changed.json()] == ["two", "one"]
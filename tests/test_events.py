@@ -0,0 +1,133 @@
+import asyncio
+import json
+import queue
+from starlette.requests import Request
+from main import app
+from routes.chat import chat_events
+from utils.events import event_bus
+
+class EventStream:
+    """GET /chat/events driven at the ASGI level
+
+    TestClient waits for the whole body, which an SSE stream never
+    finishes, so the app runs as a task on the client's loop and the
+    test reads what it sends from a thread-safe queue.
+    """
+
+    def __init__(self, client, token):
+        self.client = client
+        self.sent: queue.Queue = queue.Queue()
+        self.buffer = ""
+        self.disconnected = client.portal.call(self._event)
+        self.received_request = False
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/chat/events",
+            "raw_path": b"/chat/events",
+            "root_path": "",
+            "query_string": f"token={token}".encode(),
+            "headers": [(b"host", b"testserver"), (b"accept", b"text/event-stream")],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        self.done = client.portal.start_task_soon(app, scope, self._receive, self._send)
+
+    @staticmethod
+    async def _event():
+        return asyncio.Event()
+
+    async def _receive(self):
+        if not self.received_request:
+            self.received_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def _send(self, message):
+        self.sent.put(message)
+
+    def next_event(self, timeout=5):
+        """(event, data) of the next event, skipping keep-alives"""
+        while True:
+            if "\n\n" in self.buffer:
+                block, self.buffer = self.buffer.split("\n\n", 1)
+                if block.startswith(":"):
+                    continue
+                fields = dict(line.split(": ", 1) for line in block.splitlines())
+                return fields["event"], json.loads(fields["data"])
+            message = self.sent.get(timeout=timeout)
+            if message["type"] == "http.response.start":
+                assert message["status"] == 200
+            else:
+                self.buffer += message.get("body", b"").decode()
+
+    def close(self):
+        self.client.portal.call(self.disconnected.set)
+        self.done.result(timeout=5)
+
+def token(headers):
+    return headers["Authorization"].split()[1]
+
+def test_waiting_then_matched(client, register):
+    alice, alice_headers = register("alice")
+    bob, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+
+    stream = EventStream(client, token(alice_headers))
+    try:
+        event, data = stream.next_event()
+        assert event == "waiting"
+
+        chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+        event, data = stream.next_event()
+        assert event == "matched"
+        assert data["chat_id"] == chat_id
+        assert data["partner"]["username"] == bob
+    finally:
+        stream.close()
+
+def test_partner_left_and_chat_ended(client, register):
+    _, alice_headers = register("alice")
+    bob, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+
+    stream = EventStream(client, token(alice_headers))
+    try:
+        # ถูกจับคู่ไปก่อนเชื่อมต่อ ได้ผลเป็นสถานะแรก
+        event, data = stream.next_event()
+        assert (event, data["chat_id"]) == ("matched", chat_id)
+
+        assert client.post(f"/chat/leave-chat/{chat_id}", headers=bob_headers).status_code == 200
+        assert stream.next_event() == ("partner_left", {"chat_id": chat_id, "partner": bob})
+        assert stream.next_event() == ("chat_ended", {"chat_id": chat_id})
+    finally:
+        stream.close()
+
+def test_disconnect_unsubscribes(client, register):
+    alice, alice_headers = register("alice")
+    client.post("/chat/start-chat", headers=alice_headers)
+
+    stream = EventStream(client, token(alice_headers))
+    assert stream.next_event()[0] == "waiting"
+    assert alice in event_bus._subscribers
+    stream.close()
+    assert alice not in event_bus._subscribers
+
+def test_no_subscription_until_the_stream_starts(client, register):
+    alice, alice_headers = register("alice")
+
+    async def open_without_reading():
+        request = Request({"type": "http", "method": "GET", "path": "/chat/events", "headers": [], "query_string": b""})
+        # client หลุดก่อน body เริ่ม: response ถูกทิ้งโดยไม่เคยอ่าน
+        await chat_events(request, token(alice_headers))
+
+    client.portal.call(open_without_reading)
+    assert alice not in event_bus._subscribers
+
+def test_invalid_token_is_rejected(client):
+    assert client.get("/chat/events", params={"token": "not-a-token"}).status_code == 401
@@ -0,0 +1,57 @@
+import io
+import pytest
+from PIL import Image
+from utils.images import InvalidImageError, _thumbnails
+
+def png(size=(64, 48)):
+    output = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(output, 'PNG')
+    return output.getvalue()
+
+def noisy_jpeg():
+    output = io.BytesIO()
+    Image.effect_noise((256, 256), 64).convert('RGB').save(output, 'JPEG')
+    return output.getvalue()
+
+def test_renders_square_webp_thumbnails():
+    thumbnails = _thumbnails(png(), [16, 32])
+    for size, data in thumbnails.items():
+        image = Image.open(io.BytesIO(data))
+        assert image.format == 'WEBP'
+        assert image.size == (size, size)
+
+@pytest.mark.parametrize("data", [
+    b"not an image",
+    noisy_jpeg()[:2000],
+    png()[:60],
+])
+def test_corrupt_upload_is_an_invalid_image(data):
+    with pytest.raises(InvalidImageError):
+        _thumbnails(data, [16, 32])
+
+def test_truncated_upload_is_rejected_with_400(client, register):
+    _, headers = register()
+    response = client.post(
+        "/profile/picture",
+        headers=headers,
+        files={"file": ("avatar.jpg", noisy_jpeg()[:2000], "image/jpeg")}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "รูปแบบรูปภาพไม่ถูกต้อง"
+
+def test_upload_renders_only_the_stored_sizes(client, register, monkeypatch, tmp_path):
+    from models.user import picture_store
+    from routes import profile
+    _, headers = register()
+    rendered = []
+
+    async def fake_thumbnails(data, sizes):
+        rendered.append(sizes)
+        return {size: _thumbnails(data, [size])[size] for size in sizes}
+
+    monkeypatch.setattr(profile.settings, "AVATAR_SIZES", [128, 32, 64])
+    monkeypatch.setattr(profile, "make_thumbnails", fake_thumbnails)
+    monkeypatch.setattr(picture_store, "root", str(tmp_path))
+    response = client.post("/profile/picture", headers=headers, files={"file": ("a.png", png(), "image/png")})
+    assert response.status_code == 200, response.text
+    assert rendered == [[32, 128]]
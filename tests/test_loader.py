@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from models.loader import BatchLoader, disable_loaders, get_loader, request_loaders
+
+def recording_loader(results=None, error=None):
+    calls = []
+
+    async def batch_fn(keys):
+        calls.append(list(keys))
+        if error is not None:
+            raise error
+        return {key: (results or {}).get(key, key.upper()) for key in keys}
+
+    return BatchLoader(batch_fn), calls
+
+def test_loads_in_one_tick_are_batched_and_deduplicated():
+    async def scenario():
+        loader, calls = recording_loader()
+        values = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("a"))
+        assert values == ["A", "B", "A"]
+        assert calls == [["a", "b"]]
+
+        # โหลดซ้ำหลังจากนั้นใช้ผลเดิม ไม่เรียก batch_fn อีก
+        assert await loader.load("b") == "B"
+        assert calls == [["a", "b"]]
+
+    asyncio.run(scenario())
+
+def test_missing_keys_resolve_to_none():
+    async def scenario():
+        async def batch_fn(keys):
+            return {}
+        assert await BatchLoader(batch_fn).load("ghost") is None
+
+    asyncio.run(scenario())
+
+def test_errors_are_not_cached():
+    async def scenario():
+        loader, calls = recording_loader(error=RuntimeError("boom"))
+        with pytest.raises(RuntimeError):
+            await loader.load("a")
+        with pytest.raises(RuntimeError):
+            await loader.load("a")
+        assert calls == [["a"], ["a"]]
+
+    asyncio.run(scenario())
+
+def test_prime_and_clear():
+    async def scenario():
+        loader, calls = recording_loader()
+        loader.prime("a", "primed")
+        assert await loader.load("a") == "primed"
+        loader.clear("a")
+        assert await loader.load("a") == "A"
+        assert calls == [["a"]]
+
+    asyncio.run(scenario())
+
+def test_loaders_only_exist_inside_a_request():
+    async def batch_fn(keys):
+        return {}
+
+    assert get_loader("users", batch_fn) is None
+    with request_loaders():
+        loader = get_loader("users", batch_fn)
+        assert loader is not None
+        assert get_loader("users", batch_fn) is loader
+        disable_loaders()
+        assert get_loader("users", batch_fn) is None
+    assert get_loader("users", batch_fn) is None
+
+def test_request_scope_covers_streamed_bodies(client):
+    # scope ต้องยังเปิดอยู่ตอนที่ body ถูกส่ง ไม่ใช่ถูกปิดไปตั้งแต่ handler คืน response
+    from fastapi.responses import StreamingResponse
+    from main import app
+    from models import store
+
+    seen = {}
+
+    async def batch_fn(keys):
+        return {}
+
+    async def stream_endpoint():
+        async def body():
+            seen["loader"] = get_loader("users", batch_fn)
+            await store.get_document("users", "nobody")
+            yield b"done"
+        return StreamingResponse(body())
+
+    app.add_api_route("/_test/stream", stream_endpoint)
+    try:
+        response = client.get("/_test/stream")
+    finally:
+        app.router.routes.pop()
+    assert response.text == "done"
+    assert seen["loader"] is not None
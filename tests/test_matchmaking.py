@@ -0,0 +1,129 @@
+import pytest
+from utils.matchmaking import MatchmakingQueue, PendingMatches
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.matchmaking.time.monotonic", clock)
+    return clock
+
+def test_match_takes_the_longest_waiting_user_of_the_same_school(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    assert queue.match("alice", "a") is None
+    assert queue.match("bob", "a") == "alice"
+    assert queue.match("carol", "b") is None
+    assert queue.match("dave", "a") is None
+    assert queue.match("erin", "a") == "dave"
+    assert queue.depth() == 1
+    assert queue.depth("b") == 1
+
+def test_cancel_removes_a_waiting_user(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    queue.enqueue("alice", "a")
+    assert queue.cancel("alice")
+    assert not queue.cancel("alice")
+    assert queue.match("bob", "a") is None
+
+def test_users_who_stop_polling_are_skipped(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    queue.enqueue("alice", "a")
+    clock.now += 30
+    queue.enqueue("bob", "a")
+    clock.now += 45
+    # alice รอเกิน 60 วินาทีโดยไม่ได้เช็คสถานะ ส่วน bob ยังอยู่
+    assert queue.match("carol", "a") == "bob"
+    assert queue.depth() == 0
+
+def test_touch_keeps_a_user_waiting(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    queue.enqueue("alice", "a")
+    clock.now += 50
+    assert queue.touch("alice") == "a"
+    clock.now += 50
+    assert queue.match("bob", "a") == "alice"
+    assert queue.touch("nobody") is None
+
+def test_pending_matches_are_picked_up_once(clock):
+    matches = PendingMatches(ttl=60)
+    matches.set("alice", {"chat_id": "c1"})
+    assert matches.pop("alice") == {"chat_id": "c1"}
+    assert matches.pop("alice") is None
+
+def test_pending_matches_expire_when_never_picked_up(clock):
+    matches = PendingMatches(ttl=60)
+    matches.set("alice", {"chat_id": "c1"})
+    clock.now += 30
+    matches.set("bob", {"chat_id": "c2"})
+    clock.now += 31
+    assert len(matches) == 1
+    assert matches.pop("alice") is None
+    assert matches.pop("bob") == {"chat_id": "c2"}
+
+def test_replacing_a_pending_match_restarts_its_timeout(clock):
+    matches = PendingMatches(ttl=60)
+    matches.set("alice", {"chat_id": "c1"})
+    matches.set("bob", {"chat_id": "c2"})
+    clock.now += 50
+    matches.set("alice", {"chat_id": "c3"})
+    clock.now += 20
+    assert matches.pop("bob") is None
+    assert matches.pop("alice") == {"chat_id": "c3"}
+
+def test_waiting_user_receives_the_match_through_waiting_status(client, register):
+    alice, alice_headers = register("alice")
+    bob, bob_headers = register("bob")
+    assert client.post("/chat/start-chat", headers=alice_headers).json()["status"] == "waiting"
+    matched = client.post("/chat/start-chat", headers=bob_headers).json()
+    assert matched["partner"]["username"] == alice
+
+    status = client.get("/chat/waiting-status", headers=alice_headers).json()
+    assert status["status"] == "matched"
+    assert status["chat_id"] == matched["chat_id"]
+    assert status["partner"]["username"] == bob
+
+def test_pair_all_pairs_each_school_oldest_first(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    for username, school in [("a1", "a"), ("b1", "b"), ("a2", "a"), ("a3", "a"), ("b2", "b")]:
+        queue.enqueue(username, school)
+    assert queue.pair_all(max_pairs=10) == [("a1", "a2", "a"), ("b1", "b2", "b")]
+    # a3 ไม่มีคู่ ยังรออยู่ที่หัวคิว
+    assert queue.depth() == 1
+    assert queue.touch("a3") == "a"
+
+def test_lone_waiter_times_out_across_ticks(clock):
+    queue = MatchmakingQueue(wait_timeout=60)
+    queue.enqueue("alice", "a")
+    for _ in range(5):
+        clock.now += 10
+        assert queue.pair_all(max_pairs=10) == []
+    assert queue.depth() == 1
+
+    # การจับคู่แต่ละรอบต้องไม่ต่อเวลาให้ คนที่เลิกเช็คสถานะจะหลุดจากคิว
+    clock.now += 15
+    assert queue.pair_all(max_pairs=10) == []
+    assert queue.depth() == 0
+
+def test_ticker_stops_once_an_abandoned_waiter_times_out(monkeypatch):
+    import asyncio
+    from config import settings
+    from utils.chat import ChatManager
+
+    monkeypatch.setattr(settings, "MATCHMAKING_MODE", "tick")
+    monkeypatch.setattr(settings, "MATCHMAKING_TICK_MS", 10)
+    manager = ChatManager()
+    manager.queue = MatchmakingQueue(wait_timeout=0.1)
+
+    async def scenario():
+        manager.queue.enqueue("alice", "a")
+        manager._ensure_ticker()
+        await asyncio.wait_for(manager._ticker, timeout=2)
+
+    asyncio.run(scenario())
+    assert manager.queue.depth() == 0
@@ -0,0 +1,57 @@
+def sample(text, prefix):
+    """Value of the first sample line starting with prefix"""
+    for line in text.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def scrape(client):
+    response = client.get("/system/metrics")
+    assert response.status_code == 200
+    return response.text
+
+def increase(before, after, prefix):
+    """How much a sample grew between two scrapes (a missing sample counts as 0)"""
+    return (sample(after, prefix) or 0) - (sample(before, prefix) or 0)
+
+def test_metrics_use_route_templates(client, register):
+    before = scrape(client)
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    client.post(f"/chat/send-message/{chat_id}", json={"content": "สวัสดี"}, headers=alice_headers)
+
+    response = client.get("/system/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    route = 'method="POST",route="/chat/send-message/{chat_id}",status="200"'
+    assert increase(before, text, f"http_request_duration_seconds_count{{{route}}}") == 1
+    assert increase(before, text, f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 1
+    # chat_id ต้องไม่โผล่เป็น label
+    assert chat_id not in text
+
+    # batch ของข้อความแตะทั้งห้องแชทและ subcollection ข้อความ
+    assert increase(before, text, 'firestore_operation_duration_seconds_count{collection="*",operation="commit"}') >= 1
+    assert increase(before, text, 'firestore_operation_duration_seconds_count{collection="users",operation="get_many"}') >= 1
+    assert increase(before, text, "chat_active_chats") == 1
+    assert sample(text, "matchmaking_queue_depth") is not None
+
+def test_metrics_count_unmatched_routes_once(client):
+    before = scrape(client)
+    client.get("/no-such-page/123")
+    client.get("/no-such-page/456")
+    text = scrape(client)
+    assert increase(before, text, 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}') == 2
+    assert "/no-such-page" not in text
+
+def test_system_status(client, register):
+    _, headers = register()
+    client.post("/chat/start-chat", headers=headers)
+    body = client.get("/system/status", headers=headers).json()
+    assert body["status"] == "healthy"
+    assert body["waiting_users_count"] >= 1
+    assert body["online_users_count"] >= 1
@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+import pytest
+from google.cloud.firestore_v1.bulk_writer import BulkWriteFailure, BulkWriterSetOperation
+import migrate_messages
+from migrate_messages import ID_ALPHABET, _retry, shard_bounds
+
+def failure(attempts):
+    reference = SimpleNamespace(path="chats/c1/messages/m1")
+    operation = BulkWriterSetOperation(reference=reference, document_data={}, attempts=attempts)
+    return BulkWriteFailure(operation=operation, code=14, message="unavailable")
+
+def test_retry_until_fifth_attempt():
+    failures = []
+    assert _retry(failure(attempts=1), failures) is True
+    assert _retry(failure(attempts=4), failures) is True
+    assert failures == []
+
+def test_gives_up_and_records_the_failed_document(caplog):
+    failures = []
+    failed = failure(attempts=5)
+    assert _retry(failed, failures) is False
+    assert failures == [failed]
+    assert "chats/c1/messages/m1" in caplog.text
+
+def test_shards_cover_the_id_space_without_gaps():
+    bounds = shard_bounds(4)
+    assert bounds[0][0] is None
+    assert bounds[-1][1] is None
+    for (_, high), (low, _) in zip(bounds, bounds[1:]):
+        assert high == low and high in ID_ALPHABET
+
+def test_more_workers_than_first_characters():
+    bounds = shard_bounds(100)
+    assert len(bounds) == len(ID_ALPHABET)
+    lows = [low for low, _ in bounds[1:]]
+    assert lows == sorted(set(lows))
+    for low, high in bounds[1:-1]:
+        assert low < high
+
+class FakeQuery:
+    def order_by(self, field):
+        return self
+
+    def where(self, filter):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def stream(self):
+        raise RuntimeError("deadline exceeded")
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id):
+        return doc_id
+
+class FakeWriter:
+    closed = False
+
+    def on_write_error(self, callback):
+        pass
+
+    def close(self):
+        self.closed = True
+
+class FakeDb:
+    def __init__(self):
+        self.writer = FakeWriter()
+
+    def collection(self, name):
+        return FakeCollection()
+
+    def bulk_writer(self):
+        return self.writer
+
+def test_writer_is_closed_when_a_shard_fails(monkeypatch):
+    db = FakeDb()
+    monkeypatch.setattr(migrate_messages, "get_firestore_db", lambda: db)
+    with pytest.raises(RuntimeError):
+        migrate_messages.migrate_shard(0, None, None, None, 100, False, migrate_messages.Progress())
+    assert db.writer.closed
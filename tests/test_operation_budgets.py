@@ -0,0 +1,182 @@
+"""Firestore operation budgets per endpoint
+
+Every request reports the reads, writes and deletes it made through the
+X-Firestore-* headers (FIRESTORE_STATS_HEADER). Each test drives one
+endpoint and checks it against the budget declared below, so a change
+that adds a read per message or an extra write per request fails here
+before it shows up on the bill. Lower a budget when an endpoint gets
+cheaper; raising one should be a deliberate decision in review.
+
+Reads follow Firestore billing: a query that returns nothing still
+costs one read.
+"""
+import pytest
+
+PAGE_SIZE = 5
+
+# endpoint -> (reads, writes, deletes)
+BUDGETS = {
+    # เช็ค username, query อีเมล และ transaction ที่อ่านซ้ำก่อนสร้าง
+    "POST /register": (3, 1, 0),
+    # ผู้ใช้ที่เพิ่งสมัครอยู่ใน cache แล้ว
+    "POST /token": (0, 0, 0),
+    "POST /chat/start-chat (waiting)": (1, 0, 0),
+    "POST /chat/start-chat (matched)": (1, 1, 0),
+    "GET /chat/waiting-status": (0, 0, 0),
+    # ข้อความกับ last_message_id ของห้องแชท
+    "POST /chat/send-message": (1, 2, 0),
+    # เอกสารห้องแชท + หนึ่ง read ต่อข้อความในหน้า ห้ามเพิ่มตามจำนวนผู้ส่ง
+    "GET /chat/chat-messages (cold)": (1 + PAGE_SIZE, 0, 0),
+    "GET /chat/chat-messages (buffered)": (1, 0, 0),
+    "GET /chat/chat-messages (not modified)": (1, 0, 0),
+    "POST /chat/leave-chat": (1, 1, 0),
+    "GET /chat/online-users": (0, 0, 0),
+    "GET /profile/": (0, 0, 0),
+    # เขียนโดยไม่อ่านก่อน แล้วอ่านโปรไฟล์ใหม่กลับไปหนึ่งครั้ง
+    "POST /profile/update": (1, 1, 0),
+    "POST /profile/interests": (0, 1, 0),
+    "POST /system/update-status": (0, 0, 0),
+    "POST /logout": (0, 1, 0),
+}
+
+def operations(response):
+    return tuple(
+        int(response.headers[f"x-firestore-{kind}"])
+        for kind in ("reads", "writes", "deletes")
+    )
+
+def assert_within_budget(endpoint, response, expected_status=200):
+    assert response.status_code == expected_status, response.text
+    reads, writes, deletes = operations(response)
+    budget_reads, budget_writes, budget_deletes = BUDGETS[endpoint]
+    assert reads <= budget_reads, f"{endpoint} made {reads} reads, budget is {budget_reads}"
+    assert writes <= budget_writes, f"{endpoint} made {writes} writes, budget is {budget_writes}"
+    assert deletes <= budget_deletes, f"{endpoint} made {deletes} deletes, budget is {budget_deletes}"
+
+@pytest.fixture
+def chat(client, register):
+    """Two users of the same school matched into a chat"""
+    alice, alice_headers = register("alice")
+    bob, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    return chat_id, alice_headers, bob_headers
+
+def send_messages(client, chat_id, headers, count):
+    for i in range(count):
+        response = client.post(f"/chat/send-message/{chat_id}", json={"content": f"ข้อความ {i}"}, headers=headers)
+        assert response.status_code == 200, response.text
+
+def test_register(client, school):
+    response = client.post("/register", json={
+        "username": "newstudent",
+        "email": "newstudent@example.com",
+        "school": school,
+        "password": "test-password"
+    })
+    assert_within_budget("POST /register", response)
+
+def test_token(client, register):
+    username, _ = register()
+    response = client.post("/token", data={"username": username, "password": "test-password"})
+    assert_within_budget("POST /token", response)
+
+def test_start_chat(client, register):
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+
+    waiting = client.post("/chat/start-chat", headers=alice_headers)
+    assert_within_budget("POST /chat/start-chat (waiting)", waiting)
+    assert waiting.json()["status"] == "waiting"
+
+    matched = client.post("/chat/start-chat", headers=bob_headers)
+    assert_within_budget("POST /chat/start-chat (matched)", matched)
+    assert matched.json()["status"] == "matched"
+
+def test_waiting_status(client, register):
+    _, headers = register()
+    client.post("/chat/start-chat", headers=headers)
+    response = client.get("/chat/waiting-status", headers=headers)
+    assert_within_budget("GET /chat/waiting-status", response)
+
+def test_send_message(client, chat):
+    chat_id, alice_headers, _ = chat
+    response = client.post(f"/chat/send-message/{chat_id}", json={"content": "สวัสดี"}, headers=alice_headers)
+    assert_within_budget("POST /chat/send-message", response)
+
+def test_chat_messages_cold(client, chat):
+    from models.message import message_buffer
+
+    chat_id, alice_headers, bob_headers = chat
+    send_messages(client, chat_id, alice_headers, PAGE_SIZE // 2)
+    send_messages(client, chat_id, bob_headers, PAGE_SIZE - PAGE_SIZE // 2)
+    # จำลอง worker ที่เพิ่งเริ่ม ไม่มีข้อความใน buffer
+    message_buffer._chats.clear()
+
+    response = client.get(f"/chat/chat-messages/{chat_id}", headers=alice_headers)
+    assert_within_budget("GET /chat/chat-messages (cold)", response)
+    assert len(response.json()) == PAGE_SIZE
+
+def test_chat_messages_buffered(client, chat):
+    chat_id, alice_headers, _ = chat
+    send_messages(client, chat_id, alice_headers, PAGE_SIZE)
+    client.get(f"/chat/chat-messages/{chat_id}", headers=alice_headers)
+
+    response = client.get(f"/chat/chat-messages/{chat_id}", headers=alice_headers)
+    assert_within_budget("GET /chat/chat-messages (buffered)", response)
+    assert len(response.json()) == PAGE_SIZE
+
+    not_modified = client.get(
+        f"/chat/chat-messages/{chat_id}",
+        headers={**alice_headers, "If-None-Match": response.headers["etag"]}
+    )
+    assert_within_budget("GET /chat/chat-messages (not modified)", not_modified, expected_status=304)
+
+def test_chat_messages_reads_do_not_grow_with_senders(client, chat, register):
+    # N+1: จำนวน read ต้องขึ้นกับขนาดหน้าเท่านั้น ไม่ใช่จำนวนผู้ส่งหรือข้อความทั้งหมด
+    from models.message import message_buffer
+
+    chat_id, alice_headers, bob_headers = chat
+    send_messages(client, chat_id, alice_headers, PAGE_SIZE)
+    send_messages(client, chat_id, bob_headers, PAGE_SIZE)
+    message_buffer._chats.clear()
+
+    response = client.get(f"/chat/chat-messages/{chat_id}?limit={PAGE_SIZE}", headers=alice_headers)
+    assert_within_budget("GET /chat/chat-messages (cold)", response)
+    assert len(response.json()) == PAGE_SIZE
+
+def test_leave_chat(client, chat):
+    chat_id, alice_headers, _ = chat
+    response = client.post(f"/chat/leave-chat/{chat_id}", headers=alice_headers)
+    assert_within_budget("POST /chat/leave-chat", response)
+
+def test_online_users(client, register, school):
+    _, headers = register()
+    response = client.get(f"/chat/online-users/{school}", headers=headers)
+    assert_within_budget("GET /chat/online-users", response)
+
+def test_get_profile(client, register):
+    _, headers = register()
+    response = client.get("/profile/", headers=headers)
+    assert_within_budget("GET /profile/", response)
+
+def test_update_profile(client, register):
+    _, headers = register()
+    response = client.post("/profile/update", json={"display_name": "นักเรียน"}, headers=headers)
+    assert_within_budget("POST /profile/update", response)
+    assert response.json()["display_name"] == "นักเรียน"
+
+def test_update_interests(client, register):
+    _, headers = register()
+    response = client.post("/profile/interests", json=["ดนตรี", "กีฬา"], headers=headers)
+    assert_within_budget("POST /profile/interests", response)
+
+def test_update_status(client, register):
+    _, headers = register()
+    response = client.post("/system/update-status", headers=headers)
+    assert_within_budget("POST /system/update-status", response)
+
+def test_logout(client, register):
+    _, headers = register()
+    response = client.post("/logout", headers=headers)
+    assert_within_budget("POST /logout", response)
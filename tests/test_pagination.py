@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+import pytest
+from firebase_config import CHATS_COLLECTION
+from models import store
+from models.message import message_buffer, messages_collection
+from utils.chat import decode_cursor, encode_cursor
+
+@pytest.fixture
+def chat(client, register):
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    return chat_id, alice_headers
+
+def write_messages_at(client, chat_id, created_at, ids):
+    """Messages that share one timestamp, as a group commit produces"""
+    operations = [
+        ("set", messages_collection(chat_id), message_id, {
+            "chat_id": chat_id, "sender_id": "alice", "content": message_id, "created_at": created_at
+        })
+        for message_id in ids
+    ]
+    operations.append(("merge", CHATS_COLLECTION, chat_id, {"last_message_id": ids[-1]}))
+    client.portal.call(store.commit_batch, operations)
+
+def scroll_back(client, chat_id, headers, limit):
+    seen, params = [], {"limit": limit}
+    while True:
+        response = client.get(f"/chat/chat-messages/{chat_id}", params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = [m["content"] for m in response.json()]
+        if not page:
+            return seen
+        seen.extend(page)
+        params = {"limit": limit, "before": response.headers["x-prev-cursor"]}
+
+def test_scrolling_back_through_messages_with_equal_timestamps(client, chat):
+    chat_id, headers = chat
+    ids = [f"m{i}" for i in range(7)]
+    write_messages_at(client, chat_id, datetime(2026, 1, 1, 12, 0, 0), ids)
+    message_buffer._chats.clear()
+
+    seen = scroll_back(client, chat_id, headers, limit=2)
+    assert seen == list(reversed(ids))
+
+def test_polling_after_a_cursor_with_equal_timestamps(client, chat):
+    chat_id, headers = chat
+    created_at = datetime(2026, 1, 1, 12, 0, 0)
+    write_messages_at(client, chat_id, created_at, ["a1", "a2"])
+    message_buffer._chats.clear()
+
+    first = client.get(f"/chat/chat-messages/{chat_id}", headers=headers)
+    assert [m["content"] for m in first.json()] == ["a2", "a1"]
+    cursor = first.headers["x-next-cursor"]
+
+    # ข้อความที่เวลาเท่ากันแต่ ID มาทีหลังต้องไม่หลุด และข้อความเดิมต้องไม่ซ้ำ
+    write_messages_at(client, chat_id, created_at, ["a3"])
+    message_buffer._chats.clear()
+    newer = client.get(f"/chat/chat-messages/{chat_id}", params={"after": cursor}, headers=headers)
+    assert [m["content"] for m in newer.json()] == ["a3"]
+
+def test_buffered_pages_use_the_same_order(client, chat):
+    chat_id, headers = chat
+    ids = [f"m{i}" for i in range(5)]
+    write_messages_at(client, chat_id, datetime(2026, 1, 1, 12, 0, 0), ids)
+    message_buffer._chats.clear()
+    # อ่านเต็มหน้าครั้งแรกเพื่อ seed บัฟเฟอร์ หน้าถัดไปมาจากบัฟเฟอร์
+    client.get(f"/chat/chat-messages/{chat_id}", headers=headers)
+    hits = message_buffer.hits
+
+    assert scroll_back(client, chat_id, headers, limit=2) == list(reversed(ids))
+    assert message_buffer.hits > hits
+
+def test_cursor_round_trip_and_legacy_cursors():
+    created_at = datetime(2026, 1, 1, 12, 0, 0)
+    decoded = decode_cursor(encode_cursor(created_at, "abc"))
+    assert decoded[1] == "abc"
+    assert decoded[0].replace(tzinfo=None) == created_at
+
+    legacy = base64.urlsafe_b64encode(json.dumps({"t": created_at.isoformat()}).encode()).decode().rstrip("=")
+    assert decode_cursor(legacy) == (created_at, None)
+    assert decode_cursor("not a cursor") is None
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from firebase_config import USERS_COLLECTION
+from models import store
+from models.user import user_cache
+from utils import auth
+from utils.passwords import PasswordHasher, PasswordHasherBusy
+
+def test_full_queue_fails_fast():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=0)
+    with pytest.raises(PasswordHasherBusy):
+        asyncio.run(hasher.verify("password", "not-a-hash"))
+    assert hasher.stats() == {"pending": 0, "rejected": 1}
+
+def test_outdated_hash_is_upgraded():
+    old = PasswordHasher(rounds=4, workers=1, max_pending=4)
+    current = PasswordHasher(rounds=5, workers=1, max_pending=4)
+
+    async def scenario():
+        hashed = await old.hash("password")
+        assert await current.verify_and_update("wrong", hashed) == (False, None)
+        valid, new_hash = await current.verify_and_update("password", hashed)
+        assert valid and new_hash
+        assert await current.verify_and_update("password", new_hash) == (True, None)
+
+    asyncio.run(scenario())
+
+def stored_hash(client, username):
+    return client.portal.call(store.get_document, USERS_COLLECTION, username)["hashed_password"]
+
+def set_user_fields(client, username, fields):
+    client.portal.call(store.update_document, USERS_COLLECTION, username, fields)
+    user_cache.clear()
+
+def login(client, username):
+    return client.post("/token", data={"username": username, "password": "test-password"})
+
+@pytest.fixture
+def outdated_hash(client):
+    old = PasswordHasher(rounds=5, workers=1, max_pending=4)
+    return client.portal.call(old.hash, "test-password")
+
+def test_login_rehashes_an_outdated_password(client, register, outdated_hash):
+    username, _ = register()
+    set_user_fields(client, username, {"hashed_password": outdated_hash})
+
+    assert login(client, username).status_code == 200
+    rehashed = stored_hash(client, username)
+    assert rehashed != outdated_hash
+    assert client.portal.call(auth.verify_password, "test-password", rehashed) == (True, None)
+
+def test_deactivated_login_does_not_rehash(client, register, outdated_hash):
+    username, _ = register()
+    set_user_fields(client, username, {"hashed_password": outdated_hash, "is_active": False})
+
+    assert login(client, username).status_code == 401
+    assert stored_hash(client, username) == outdated_hash
+
+def test_login_when_hasher_is_busy(client, register, monkeypatch):
+    username, _ = register()
+    monkeypatch.setattr(auth.password_hasher, "max_pending", 0)
+    response = login(client, username)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
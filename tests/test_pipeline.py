@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from models import store
+from models.base import NotFoundError
+from models.buffer import MessageBuffer
+from models.pipeline import WriteBatcher
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+class SlowCommits:
+    """Stands in for store.commit_batch, each call waits until released"""
+
+    def __init__(self):
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.release = {}
+
+    async def __call__(self, operations):
+        index = len(self.batches)
+        self.batches.append(operations)
+        self.release[index] = asyncio.Event()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await self.release[index].wait()
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def commits(monkeypatch):
+    commits = SlowCommits()
+    monkeypatch.setattr(store, "commit_batch", commits)
+    return commits
+
+def test_batches_commit_one_at_a_time_in_order(client, commits):
+    async def scenario():
+        batcher = WriteBatcher(max_ops=1, max_delay=60)
+        first = asyncio.ensure_future(batcher.submit([("set", "messages", "a", {})]))
+        second = asyncio.ensure_future(batcher.submit([("set", "messages", "b", {})]))
+        await asyncio.sleep(0.01)
+        # batch ที่สองต้องรอ batch แรก แม้จะพร้อมแล้ว
+        assert len(commits.batches) == 1
+        assert batcher.stats()["queued_batches"] == 1
+
+        commits.release[0].set()
+        await first
+        await asyncio.sleep(0.01)
+        assert len(commits.batches) == 2
+        assert not second.done()
+
+        commits.release[1].set()
+        await second
+        return [ops[0][2] for ops in commits.batches], batcher.stats()
+
+    order, stats = client.portal.call(scenario)
+    assert order == ["a", "b"]
+    assert commits.max_in_flight == 1
+    assert stats["batches"] == 2
+    assert stats["queued_batches"] == 0
+
+def test_merges_on_the_same_document_are_coalesced(client, commits):
+    async def scenario():
+        batcher = WriteBatcher(max_ops=10, max_delay=0.01)
+        submits = [
+            asyncio.ensure_future(batcher.submit([("merge", "chats", "c1", {"count": i})]))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        commits.release[0].set()
+        await asyncio.gather(*submits)
+        return commits.batches
+
+    batches = client.portal.call(scenario)
+    assert batches == [[("merge", "chats", "c1", {"count": 2})]]
+
+def test_failed_commit_fails_every_caller_and_later_batches_still_run(client, monkeypatch):
+    calls = []
+
+    async def commit_batch(operations):
+        calls.append(operations)
+        if len(calls) == 1:
+            raise RuntimeError("unavailable")
+
+    monkeypatch.setattr(store, "commit_batch", commit_batch)
+
+    async def scenario():
+        batcher = WriteBatcher(max_ops=2, max_delay=0.01)
+        results = await asyncio.gather(
+            batcher.submit([("set", "messages", "a", {})]),
+            batcher.submit([("set", "messages", "b", {})]),
+            return_exceptions=True
+        )
+        await asyncio.gather(
+            batcher.submit([("set", "messages", "c", {})]),
+            batcher.submit([("set", "messages", "d", {})])
+        )
+        return results
+
+    results = client.portal.call(scenario)
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+    assert len(calls) == 2
+
+def test_buffer_keeps_messages_sorted_when_appends_arrive_out_of_order():
+    buffer = MessageBuffer(messages_per_chat=10, max_bytes=1_000_000)
+    buffer.seed("c1", [], limit=50)
+    for i in (0, 3, 1, 2):
+        buffer.append("c1", {"id": f"m{i}", "chat_id": "c1", "content": "x", "created_at": START + timedelta(seconds=i)})
+
+    assert [m["id"] for m in buffer.window("c1", limit=10)] == ["m3", "m2", "m1", "m0"]
+    assert buffer.latest_id("c1") == "m3"
+
+def test_missing_document_only_fails_its_own_caller(client):
+    client.portal.call(store.set_document, "chats", "live", {"count": 0})
+
+    async def scenario():
+        batcher = WriteBatcher(max_ops=10, max_delay=0.01)
+        return await asyncio.gather(
+            batcher.submit([("set", "messages", "a", {}), ("update", "chats", "gone", {"count": 1})]),
+            batcher.submit([("set", "messages", "b", {}), ("update", "chats", "live", {"count": 1})]),
+            return_exceptions=True
+        )
+
+    failed, committed = client.portal.call(scenario)
+    assert isinstance(failed, NotFoundError)
+    assert committed is None
+    assert client.portal.call(store.get_documents, "messages", ["a", "b"]) == {"a": None, "b": {}}
+    assert client.portal.call(store.get_document, "chats", "gone") is None
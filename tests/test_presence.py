@@ -0,0 +1,123 @@
+import gc
+import pytest
+from datetime import datetime, timedelta
+from firebase_config import ONLINE_COUNTS_COLLECTION, USERS_COLLECTION
+from models import store
+from models.user import user_cache
+from utils.presence import PresenceTracker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("utils.presence.time.time", clock)
+    return clock
+
+@pytest.fixture
+def tracker():
+    # heartbeat นอก event loop ไม่สร้าง background flush test จึงสั่ง flush เอง
+    return PresenceTracker(online_seconds=60, flush_seconds=3600)
+
+def test_online_counts_follow_heartbeats_and_expiry(clock, tracker):
+    tracker.heartbeat("alice", "a")
+    tracker.heartbeat("bob", "a")
+    tracker.heartbeat("carol", "b")
+    assert tracker.online_count("a") == 2
+    assert tracker.online_total() == 3
+
+    clock.now += 40
+    tracker.heartbeat("alice")
+    clock.now += 30
+    # bob กับ carol หมดเวลา alice ยังส่ง heartbeat อยู่
+    assert tracker.online_count("a") == 1
+    assert tracker.online_count("b") == 0
+    assert tracker.is_online("alice") is True
+    assert tracker.is_online("bob") is False
+    assert tracker.is_online("nobody") is None
+
+def test_changing_school_moves_the_count(clock, tracker):
+    tracker.heartbeat("alice", "a")
+    tracker.heartbeat("alice", "b")
+    assert (tracker.online_count("a"), tracker.online_count("b")) == (0, 1)
+
+def test_remove_marks_offline(clock, tracker):
+    tracker.heartbeat("alice", "a")
+    tracker.remove("alice")
+    assert tracker.online_count("a") == 0
+    assert tracker.is_online("alice") is False
+
+def test_flush_writes_once_per_user_and_invalidates_the_cache(client, register, clock, tracker):
+    username, _ = register()
+    assert user_cache.get(username) is not None
+
+    for _ in range(3):
+        tracker.heartbeat(username, "a")
+    assert client.portal.call(tracker.flush) == 1
+    assert client.portal.call(tracker.flush) == 0
+
+    assert user_cache.get(username) is None
+    user = client.portal.call(store.get_document, USERS_COLLECTION, username)
+    assert user["last_online"].replace(tzinfo=None) == datetime.utcfromtimestamp(clock.now)
+
+def test_deleted_user_does_not_block_the_batch(client, register, clock, tracker):
+    alive, _ = register("alive")
+    deleted, _ = register("deleted")
+    client.portal.call(store.delete_document, USERS_COLLECTION, deleted)
+
+    tracker.heartbeat(alive, "a")
+    tracker.heartbeat(deleted, "a")
+    assert client.portal.call(tracker.flush) == 1
+
+    # ไม่สร้างเอกสารให้ผู้ใช้ที่ถูกลบ และไม่เก็บไว้ลองใหม่ทุกรอบ
+    assert client.portal.call(store.get_document, USERS_COLLECTION, deleted) is None
+    assert client.portal.call(store.get_document, USERS_COLLECTION, alive)["last_online"] is not None
+    assert client.portal.call(tracker.flush) == 0
+
+def test_heartbeat_outside_an_event_loop_starts_nothing(recwarn):
+    tracker = PresenceTracker(online_seconds=60, flush_seconds=0)
+    tracker.heartbeat("ann", "s1")
+    assert tracker.online_count("s1") == 1
+    gc.collect()
+    assert not [w for w in recwarn if issubclass(w.category, RuntimeWarning)]
+
+def test_remote_counts_survive_a_slow_flush(client):
+    tracker = PresenceTracker(online_seconds=300, flush_seconds=10)
+    now = datetime.utcnow()
+    client.portal.call(store.set_document, ONLINE_COUNTS_COLLECTION, "slow-worker", {
+        'counts': {'a': 2}, 'updated_at': now - timedelta(seconds=120)
+    })
+    client.portal.call(store.set_document, ONLINE_COUNTS_COLLECTION, "dead-worker", {
+        'counts': {'a': 5}, 'updated_at': now - timedelta(seconds=600)
+    })
+    client.portal.call(tracker._refresh_remote)
+    # ผ่านไปเกินสองรอบ flush แต่ยังอยู่ใน online window
+    assert tracker._remote_counts == {'a': 2}
+
+def test_close_removes_this_workers_counts(client, register, tracker):
+    username, _ = register()
+    tracker.heartbeat(username, "a")
+    client.portal.call(tracker.flush)
+    assert client.portal.call(store.get_document, ONLINE_COUNTS_COLLECTION, tracker._worker_id)["counts"] == {"a": 1}
+
+    tracker.heartbeat(username, "a")
+    client.portal.call(tracker.close)
+    assert client.portal.call(store.get_document, ONLINE_COUNTS_COLLECTION, tracker._worker_id) is None
+    # ข้อมูลที่ค้างอยู่ยังถูกเขียนก่อนปิด
+    assert client.portal.call(tracker.flush) == 0
+
+def test_close_without_writes_makes_no_calls(client, monkeypatch):
+    tracker = PresenceTracker(online_seconds=60, flush_seconds=3600)
+    calls = []
+
+    async def delete_document(*args):
+        calls.append(args)
+
+    monkeypatch.setattr(store, "delete_document", delete_document)
+    client.portal.call(tracker.close)
+    assert calls == []
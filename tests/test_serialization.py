@@ -0,0 +1,57 @@
+from datetime import datetime
+import msgpack
+import pytest
+from models.message import message_buffer
+from utils.serialization import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, preferred_media_type
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("*/*", JSON_MEDIA_TYPE),
+    ("application/*", JSON_MEDIA_TYPE),
+    ("application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/json, application/msgpack", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack, application/json;q=0.5", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=0.5, application/json", JSON_MEDIA_TYPE),
+    ("application/msgpack;q=0, application/json", JSON_MEDIA_TYPE),
+    ("application/msgpack;q=0", JSON_MEDIA_TYPE),
+    ("application/msgpack; q=0.8, */*;q=0.1", MSGPACK_MEDIA_TYPE),
+    ("APPLICATION/MSGPACK", MSGPACK_MEDIA_TYPE),
+    ("application/msgpack;q=abc, application/json", JSON_MEDIA_TYPE),
+    ("application/x-msgpack-like", JSON_MEDIA_TYPE),
+])
+def test_preferred_media_type(accept, expected):
+    assert preferred_media_type(accept) == expected
+
+@pytest.fixture
+def chat_with_messages(client, register):
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    for content in ("หนึ่ง", "two"):
+        client.post(f"/chat/send-message/{chat_id}", json={"content": content}, headers=alice_headers)
+    return chat_id, bob_headers
+
+def test_message_page_round_trips_through_msgpack(client, chat_with_messages):
+    chat_id, headers = chat_with_messages
+    url = f"/chat/chat-messages/{chat_id}"
+    as_json = client.get(url, headers={**headers, "Accept": "application/json"})
+    as_msgpack = client.get(url, headers={**headers, "Accept": MSGPACK_MEDIA_TYPE})
+
+    assert as_msgpack.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert as_msgpack.headers["vary"] == "Accept"
+    page = msgpack.unpackb(as_msgpack.content, raw=False)
+    assert page == as_json.json()
+    assert [m["content"] for m in page] == ["two", "หนึ่ง"]
+    datetime.fromisoformat(page[0]["created_at"])
+
+def test_json_when_msgpack_is_refused(client, chat_with_messages):
+    chat_id, headers = chat_with_messages
+    message_buffer._chats.clear()
+    response = client.get(
+        f"/chat/chat-messages/{chat_id}",
+        headers={**headers, "Accept": "application/msgpack;q=0, application/json"}
+    )
+    assert response.headers["content-type"].startswith(JSON_MEDIA_TYPE)
+    assert response.headers["vary"] == "Accept"
+    assert [m["content"] for m in response.json()] == ["two", "หนึ่ง"]
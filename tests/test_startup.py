@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from models import store
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# import main และรันทั้ง startup/shutdown ใน process ใหม่ที่ใช้ Firestore จริง แต่ห้ามเชื่อมต่อ
+NO_FIRESTORE_AT_STARTUP = """
+import firebase_admin
+from firebase_admin import firestore
+
+calls = []
+
+def forbidden(name):
+    def call(*args, **kwargs):
+        calls.append(name)
+        raise AssertionError(f"{name} called during startup")
+    return call
+
+firebase_admin.initialize_app = forbidden("initialize_app")
+firestore.client = forbidden("firestore.client")
+
+import main
+import firebase_config
+from fastapi.testclient import TestClient
+
+with TestClient(main.app) as client:
+    assert client.get("/system/health").status_code == 200
+assert calls == [], calls
+assert firebase_config._app is None and firebase_config._db is None
+print("ok")
+"""
+
+def test_import_and_startup_make_no_firestore_calls():
+    env = dict(os.environ, STORAGE_BACKEND="firestore", STARTUP_READINESS_CHECK="false")
+    env.pop("FIREBASE_CREDENTIALS", None)
+    result = subprocess.run(
+        [sys.executable, "-c", NO_FIRESTORE_AT_STARTUP],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+
+def test_ready_when_the_backend_answers(client):
+    response = client.get("/system/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+def test_not_ready_when_ping_fails(client, monkeypatch):
+    async def ping():
+        raise ConnectionError("backend unreachable")
+
+    monkeypatch.setattr(store, "ping", ping)
+    response = client.get("/system/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "unavailable", "detail": "backend unreachable"}
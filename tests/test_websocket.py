@@ -0,0 +1,82 @@
+import pytest
+from firebase_config import CHATS_COLLECTION
+from models import FirebaseError, store
+from models.message import messages_collection
+from utils.auth import authenticate_token
+from utils.chat import chat_manager
+
+@pytest.fixture
+def chat(client, register):
+    _, alice_headers = register("alice")
+    _, bob_headers = register("bob")
+    client.post("/chat/start-chat", headers=alice_headers)
+    chat_id = client.post("/chat/start-chat", headers=bob_headers).json()["chat_id"]
+    token = alice_headers["Authorization"].split()[1]
+    return chat_id, token
+
+def test_messages_are_broadcast(client, chat):
+    chat_id, token = chat
+    with client.websocket_connect(f"/chat/ws/{chat_id}?token={token}") as ws:
+        ws.send_json({"content": "สวัสดี"})
+        event = ws.receive_json()
+        assert event["type"] == "message"
+        assert event["message"]["content"] == "สวัสดี"
+
+def test_malformed_frames_keep_the_socket_open(client, chat):
+    chat_id, token = chat
+    with client.websocket_connect(f"/chat/ws/{chat_id}?token={token}") as ws:
+        ws.send_text("{not json")
+        assert ws.receive_json() == {"type": "error", "detail": "Invalid JSON"}
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json(["not", "an", "object"])
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_json({"content": "ยังใช้ได้"})
+        assert ws.receive_json()["message"]["content"] == "ยังใช้ได้"
+
+def test_storage_errors_are_reported_per_message(client, chat, monkeypatch):
+    chat_id, token = chat
+    original = chat_manager.send_message
+
+    async def failing_send(*args, **kwargs):
+        raise FirebaseError("deadline exceeded")
+
+    with client.websocket_connect(f"/chat/ws/{chat_id}?token={token}") as ws:
+        monkeypatch.setattr(chat_manager, "send_message", failing_send)
+        ws.send_json({"content": "หาย"})
+        assert ws.receive_json()["type"] == "error"
+
+        monkeypatch.setattr(chat_manager, "send_message", original)
+        ws.send_json({"content": "ส่งใหม่"})
+        assert ws.receive_json()["message"]["content"] == "ส่งใหม่"
+
+def test_pushed_and_paged_messages_have_the_same_timestamp(client, chat):
+    chat_id, token = chat
+    headers = {"Authorization": f"Bearer {token}"}
+    with client.websocket_connect(f"/chat/ws/{chat_id}?token={token}") as ws:
+        ws.send_json({"content": "เวลา"})
+        pushed = ws.receive_json()["message"]
+
+    sent = client.post(f"/chat/send-message/{chat_id}", json={"content": "อีกข้อความ"}, headers=headers).json()
+    paged = {m["id"]: m for m in client.get(f"/chat/chat-messages/{chat_id}", headers=headers).json()}
+    assert paged[pushed["id"]]["created_at"] == pushed["created_at"]
+    assert paged[sent["id"]]["created_at"] == sent["created_at"]
+    assert pushed["created_at"].endswith("+00:00")
+
+def test_sending_to_a_deleted_chat_does_not_recreate_it(client, chat, monkeypatch):
+    chat_id, token = chat
+    headers = {"Authorization": f"Bearer {token}"}
+    active = client.portal.call(chat_manager.get_chat_for_user, chat_id, client.portal.call(authenticate_token, token)['username'])
+
+    # ห้องถูกลบหลังจากตรวจสิทธิ์แล้ว แต่ก่อนเขียนข้อความ
+    client.portal.call(store.delete_document, CHATS_COLLECTION, chat_id)
+
+    async def stale_chat(*args):
+        return active
+
+    monkeypatch.setattr(chat_manager, "get_chat_for_user", stale_chat)
+    response = client.post(f"/chat/send-message/{chat_id}", json={"content": "หาย"}, headers=headers)
+    assert response.status_code == 404
+    assert client.portal.call(store.get_document, CHATS_COLLECTION, chat_id) is None
+    assert client.portal.call(store.query_documents, messages_collection(chat_id)) == []
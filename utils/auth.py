@@ -1,30 +1,60 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+from uuid import uuid4
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-import models
-from database import get_db
+from models import User
+from utils.passwords import PasswordHasher
+from utils.revocation import revocation_list
 from config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    settings.BCRYPT_ROUNDS,
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_PENDING
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# ข้อมูลผู้ใช้ที่ฝังไว้ใน token เพื่อให้ route ใช้ได้โดยไม่ต้องอ่านฐานข้อมูล
+PRINCIPAL_CLAIMS = ('school', 'display_name', 'is_active')
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; the second value is a new hash if the stored one is outdated"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.hash(password)
+
+def user_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Build token claims for a user document"""
+    claims = {"sub": user['username']}
+    for claim in PRINCIPAL_CLAIMS:
+        claims[claim] = user.get(claim)
+    return claims
+
+def claims_changed(payload_user: Dict[str, Any], user: Dict[str, Any]) -> bool:
+    """Whether a user's token claims no longer match their document"""
+    return any(payload_user.get(claim) != user.get(claim) for claim in PRINCIPAL_CLAIMS)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + (expires_delta or timedelta(minutes=15))
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid4().hex})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def revoke_access_token(token: str) -> None:
+    """Revoke a token (e.g. on logout) until it expires"""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    if payload.get("jti"):
+        await revocation_list.revoke_token(payload["jti"], payload["exp"])
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+    return await authenticate_token(token)
+
+async def authenticate_token(token: str) -> Dict[str, Any]:
+    """Resolve the user for a bearer token (also used by WebSocket routes)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -32,12 +62,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise credentials_exception
-        user = db.query(models.User).filter(models.User.username == username).first()
-        if not user:
-            raise credentials_exception
-        return user
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+    username: str = payload.get("sub")
+    if not username:
+        raise credentials_exception
+    await revocation_list.ensure_loaded()
+    if revocation_list.is_revoked(payload.get("jti"), username, payload.get("iat", 0)):
+        raise credentials_exception
+
+    # token รุ่นเก่าไม่มีข้อมูลผู้ใช้ ต้องอ่านจากฐานข้อมูลแทน
+    if settings.STATELESS_AUTH and all(claim in payload for claim in PRINCIPAL_CLAIMS):
+        user = {"username": username}
+        for claim in PRINCIPAL_CLAIMS:
+            user[claim] = payload[claim]
+    else:
+        user = await User.get_by_username(username)
+
+    if not user or not user.get('is_active', True):
+        raise credentials_exception
+    return user
@@ -1,54 +1,82 @@
 # utils/chat.py
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException
 from logging_config import logger
-from models import User, Chat, Message
-from firebase_config import db, USERS_COLLECTION, CHATS_COLLECTION
-import random
+from models import User, Chat, Message, NotFoundError, store
+from firebase_config import CHATS_COLLECTION
+from utils.matchmaking import MatchmakingQueue, PendingMatches
+from utils.presence import presence_tracker
+from utils.connections import connection_manager
+from utils.events import event_bus
+from utils.etag import etag_matches, weak_etag
+from metrics import Gauge
+from config import settings
 
 class ChatManager:
     def __init__(self):
-        # ไม่จำเป็นต้องเก็บข้อมูลในตัวแปรแล้ว เพราะใช้ Firebase
-        pass
+        # คิวรออยู่ในหน่วยความจำ ใช้ Firebase เก็บเฉพาะห้องแชทที่จับคู่ได้
+        self.queue = MatchmakingQueue(settings.MATCHMAKING_WAIT_TIMEOUT_SECONDS)
+        # ผลการจับคู่ที่ผู้รอยังไม่ได้รับ หมดอายุเท่ากับเวลารอในคิว
+        self.matches = PendingMatches(settings.MATCHMAKING_WAIT_TIMEOUT_SECONDS)
+        # นับห้องที่เริ่ม/จบบน worker นี้ ไม่ต้อง query Firestore เพื่อนับห้องที่ active
+        self.chats_started = 0
+        self.chats_ended = 0
+        self._ticker: Optional[asyncio.Task] = None
 
-    async def update_user_status(self, user_id: str) -> None:
+    async def update_user_status(self, user_id: str, school: Optional[str] = None) -> None:
+        # heartbeat: บันทึกในหน่วยความจำ แล้วค่อยเขียนลง Firestore เป็นรอบ
+        presence_tracker.heartbeat(user_id, school)
+        self.queue.touch(user_id)
+
+    async def remove_user_status(self, user_id: str) -> None:
         try:
-            await User.update_last_online(user_id, datetime.utcnow())
-            logger.info(f"Updated online status for user {user_id}")
+            self.queue.cancel(user_id)
+            self.matches.pop(user_id)
+            presence_tracker.remove(user_id)
+            logger.info(f"Removed online status for user {user_id}")
         except Exception as e:
-            logger.error(f"Error updating user status: {e}")
+            logger.error(f"Error removing user status: {e}")
 
     async def is_user_online(self, user_id: str) -> bool:
+        return (await self.are_users_online([user_id]))[user_id]
+
+    async def are_users_online(self, user_ids: List[str]) -> Dict[str, bool]:
+        """Resolve presence locally, reading unknown users in one batch"""
         try:
-            user_doc = db.collection(USERS_COLLECTION).document(user_id).get()
-            if not user_doc.exists:
-                return False
-                
-            user_data = user_doc.to_dict()
-            last_online = user_data.get('last_online')
-            if not last_online:
-                return False
-                
-            is_online = (datetime.utcnow() - last_online) < timedelta(minutes=5)
-            logger.info(f"User {user_id} online status: {is_online}")
-            return is_online
+            online = {user_id: presence_tracker.is_online(user_id) for user_id in user_ids}
+            unknown = [user_id for user_id, is_online in online.items() if is_online is None]
+            if unknown:
+                users = await User.get_many(unknown)
+                for user_id in unknown:
+                    online[user_id] = _is_online(users.get(user_id))
+            return online
             
         except Exception as e:
             logger.error(f"Error checking online status: {e}")
-            return False
+            return {user_id: False for user_id in user_ids}
+
+    async def get_online_users_count(self, school: str) -> int:
+        return presence_tracker.online_count(school)
 
     async def get_waiting_status(self, user_id: str) -> Optional[Dict]:
         try:
             # เช็คในคิวรอ
-            waiting_doc = db.collection('waiting_users').document(user_id).get()
-            if waiting_doc.exists:
-                waiting_data = waiting_doc.to_dict()
+            school = self.queue.touch(user_id)
+            if school is not None:
                 return {
                     "status": "waiting",
-                    "school": waiting_data['school']
+                    "school": school
                 }
-            return None
+
+            # ถูกจับคู่ไปแล้วระหว่างรอ
+            match = self.matches.pop(user_id)
+            if match:
+                return match
+            return await self.get_active_chat_status(user_id)
         except Exception as e:
             logger.error(f"Error getting waiting status: {e}")
             return None
@@ -56,32 +84,34 @@ class ChatManager:
     async def get_active_chat_status(self, user_id: str) -> Optional[Dict]:
         try:
             # หาแชทที่กำลังใช้งาน
-            chats = db.collection(CHATS_COLLECTION)\
-                .where('status', '==', 'active')\
-                .where('users', 'array_contains', user_id)\
-                .limit(1)\
-                .get()
+            chats = await store.query_documents(
+                CHATS_COLLECTION,
+                filters=[
+                    ('status', '==', 'active'),
+                    ('users', 'array_contains', user_id)
+                ],
+                limit=1
+            )
 
             if not chats:
                 return None
 
-            chat = chats[0]
-            chat_data = chat.to_dict()
+            chat_id, chat_data = chats[0]
 
             # หาคู่สนทนา
             partner_id = chat_data['user2_id'] if user_id == chat_data['user1_id'] else chat_data['user1_id']
-            partner = await User.get_by_username(partner_id)
+            partner = (await User.get_many([partner_id]))[partner_id]
 
             if not partner:
                 return None
 
             return {
                 "status": "in_chat",
-                "chat_id": chat.id,
+                "chat_id": chat_id,
                 "partner": {
                     "username": partner['username'],
                     "school": chat_data['school'],
-                    "online": await self.is_user_online(partner_id)
+                    "online": _presence(partner_id, partner)
                 }
             }
 
@@ -89,61 +119,47 @@ class ChatManager:
             logger.error(f"Error getting active chat status: {e}")
             return None
 
+    async def start_chat(self, current_user: Dict) -> Dict:
+        return await self.find_match(current_user, current_user['school'])
+
     async def find_match(self, current_user: Dict, school: str) -> Dict:
         try:
+            username = current_user['username']
+
             # เช็คว่าอยู่ในแชทอยู่แล้วหรือไม่
-            active_chat = await self.get_active_chat_status(current_user['username'])
+            active_chat = await self.get_active_chat_status(username)
             if active_chat:
                 raise HTTPException(status_code=400, detail="Already in chat")
 
-            # ลบออกจากคิวรอถ้ามี
-            waiting_ref = db.collection('waiting_users').document(current_user['username'])
-            if waiting_ref.get().exists:
-                waiting_ref.delete()
-
-            # หาคู่จากโรงเรียนเดียวกัน
-            waiting_users = db.collection('waiting_users')\
-                .where('school', '==', school)\
-                .where('username', '!=', current_user['username'])\
-                .get()
-
-            available_users = [
-                user.to_dict() for user in waiting_users 
-                if await self.is_user_online(user.get('username'))
-            ]
-
-            if available_users:
-                # สุ่มเลือกคู่สนทนา
-                partner = random.choice(available_users)
-                
-                # สร้างห้องแชท
+            self.matches.pop(username)
+
+            # โหมด tick: เข้าคิวไว้ก่อน แล้วรอให้ match_tick จับคู่ทั้งโรงเรียนพร้อมกัน
+            if settings.MATCHMAKING_MODE == "tick":
+                if self.queue.touch(username) is None:
+                    self.queue.enqueue(username, school)
+                self._ensure_ticker()
+                event_bus.publish(username, "waiting", {"school": school})
+                return {"status": "waiting"}
+
+            # จับคู่กับคนที่รอนานที่สุดในโรงเรียนเดียวกัน ถ้าไม่มีจะถูกใส่เข้าคิวรอ
+            partner_id = self.queue.match(username, school)
+            if partner_id is None:
+                event_bus.publish(username, "waiting", {"school": school})
+                return {"status": "waiting"}
+
+            try:
                 chat_id = await Chat.create(
-                    user1_id=current_user['username'],
-                    user2_id=partner['username'],
+                    user1_id=username,
+                    user2_id=partner_id,
                     school=school
                 )
+            except Exception:
+                # สร้างห้องไม่สำเร็จ คืนคู่สนทนากลับไปหัวคิว
+                self.queue.enqueue(partner_id, school, front=True)
+                raise
 
-                # ลบคู่สนทนาออกจากคิวรอ
-                db.collection('waiting_users').document(partner['username']).delete()
-
-                return {
-                    "status": "matched",
-                    "chat_id": chat_id,
-                    "partner": {
-                        "username": partner['username'],
-                        "school": school,
-                        "online": True
-                    }
-                }
-
-            # ถ้าไม่เจอคู่ ใส่เข้าคิวรอ
-            waiting_ref.set({
-                'username': current_user['username'],
-                'school': school,
-                'joined_at': datetime.utcnow()
-            })
-            
-            return {"status": "waiting"}
+            self._record_match(chat_id, username, partner_id, school)
+            return self._match_result(chat_id, partner_id, school)
 
         except HTTPException:
             raise
@@ -151,28 +167,269 @@ class ChatManager:
             logger.error(f"Error finding match: {e}")
             raise HTTPException(status_code=400, detail=str(e))
 
+    async def get_chat_for_user(self, chat_id: str, user_id: str) -> Dict:
+        """Get a chat, making sure the user takes part in it"""
+        chat = await Chat.get_chat(chat_id)
+        if not chat:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        if user_id not in (chat.get('user1_id'), chat.get('user2_id')):
+            raise HTTPException(status_code=403, detail="Not a participant of this chat")
+        return chat
+
+    async def get_messages(
+        self,
+        chat_id: str,
+        user_id: str,
+        limit: int = 50,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        if_none_match: Optional[str] = None
+    ) -> Dict:
+        """Get a page of messages (newest first) plus cursors for the next calls
+
+        next_cursor is passed as after= to fetch only newer messages,
+        prev_cursor as before= to scroll back. The page's ETag comes from the
+        chat's newest message ID; when it matches if_none_match the result is
+        {"etag", "not_modified": True} and no messages are read.
+        """
+        chat = await self.get_chat_for_user(chat_id, user_id)
+        etag = self._messages_etag(chat_id, chat, limit, after, before)
+        if etag and etag_matches(if_none_match, etag):
+            return {"etag": etag, "not_modified": True}
+
+        after_position = await self._resolve_cursor(chat_id, after, AFTER_ALL_IDS)
+        before_position = await self._resolve_cursor(chat_id, before, BEFORE_ALL_IDS)
+        messages = await Message.get_chat_messages(chat_id, limit, after_position, before_position)
+
+        if messages:
+            next_cursor = encode_cursor(messages[0]['created_at'], messages[0]['id'])
+            prev_cursor = encode_cursor(messages[-1]['created_at'], messages[-1]['id'])
+        else:
+            # ไม่มีข้อความใหม่ ให้ใช้ cursor เดิมในการ poll ครั้งถัดไป
+            next_cursor = encode_cursor(*after_position) if after_position else None
+            prev_cursor = None
+        return {
+            "messages": messages,
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+            "etag": etag,
+            "not_modified": False
+        }
+
+    def _messages_etag(
+        self,
+        chat_id: str,
+        chat: Dict,
+        limit: int,
+        after: Optional[str],
+        before: Optional[str]
+    ) -> Optional[str]:
+        # รู้ข้อความล่าสุดจากบัฟเฟอร์หรือจากเอกสารห้อง ไม่ต้อง query ข้อความ
+        latest = Message.latest_id(chat_id)
+        if latest is None and 'last_message_id' in chat:
+            latest = chat['last_message_id'] or ""
+        if latest is None:
+            # ห้องเก่าที่ยังไม่มี last_message_id
+            return None
+        return weak_etag(chat_id, latest, limit, after, before)
+
+    async def _resolve_cursor(
+        self,
+        chat_id: str,
+        value: Optional[str],
+        missing_id: str
+    ) -> Optional[Tuple[datetime, str]]:
+        """Accept an opaque cursor, an ISO timestamp or a message ID as a (created_at, ID) position
+
+        A bare timestamp has no message ID; missing_id stands in for it so the
+        cursor still means "strictly after" or "strictly before" that time.
+        """
+        if not value:
+            return None
+        position = decode_cursor(value)
+        if position is not None:
+            return position[0], position[1] if position[1] is not None else missing_id
+        try:
+            return datetime.fromisoformat(value), missing_id
+        except ValueError:
+            pass
+        message = await Message.get_message(chat_id, value)
+        if not message:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return message['created_at'], message['id']
+
+    async def send_message(self, chat_id: str, user_id: str, content: str, emoji: Optional[str] = None) -> Dict:
+        chat = await self.get_chat_for_user(chat_id, user_id)
+        if chat.get('status') != 'active':
+            raise HTTPException(status_code=400, detail="Chat has ended")
+
+        message = {
+            'chat_id': chat_id,
+            'sender_id': user_id,
+            'content': content,
+            'emoji': emoji
+        }
+        # Message.create ใส่ created_at ลงใน dict ให้
+        try:
+            message['id'] = await Message.create(message)
+        except NotFoundError:
+            # ห้องถูกลบไประหว่างส่ง
+            raise HTTPException(status_code=404, detail="Chat not found")
+        # เวลาเป็น UTC แบบไม่มี timezone ต้องส่งออกไปแบบมี offset เหมือนตอนอ่านจาก Firestore
+        if message['created_at'].tzinfo is None:
+            message['created_at'] = message['created_at'].replace(tzinfo=timezone.utc)
+
+        # ส่งข้อความใหม่ให้ทุกคนที่เปิด WebSocket ของห้องนี้อยู่
+        await connection_manager.broadcast(chat_id, {"type": "message", "message": message})
+        return message
+
+    async def match_tick(self) -> int:
+        """Pair everyone waiting and create their chats in one batch"""
+        pairs = self.queue.pair_all(settings.MATCHMAKING_MAX_BATCH)
+        if not pairs:
+            return 0
+
+        try:
+            chat_ids = await Chat.create_many(pairs)
+        except Exception as e:
+            logger.error(f"Error creating chats for match tick: {e}")
+            # คืนทุกคนกลับไปหัวคิว รอรอบถัดไป
+            for user1_id, user2_id, school in reversed(pairs):
+                self.queue.enqueue(user2_id, school, front=True)
+                self.queue.enqueue(user1_id, school, front=True)
+            return 0
+
+        for chat_id, (user1_id, user2_id, school) in zip(chat_ids, pairs):
+            self._record_match(chat_id, user1_id, user2_id, school)
+            self.matches.set(user1_id, self._match_result(chat_id, user2_id, school))
+        logger.info(f"Match tick created {len(pairs)} chats")
+        return len(pairs)
+
+    def _ensure_ticker(self) -> None:
+        if self._ticker is None or self._ticker.done():
+            self._ticker = store.background_task(self._run_ticks())
+
+    async def _run_ticks(self) -> None:
+        # ทำงานเฉพาะตอนที่มีคนรอ และหยุดเองเมื่อคิวว่าง
+        while self.queue.depth():
+            await asyncio.sleep(settings.MATCHMAKING_TICK_MS / 1000)
+            try:
+                await self.match_tick()
+            except Exception as e:
+                logger.error(f"Error in match tick: {e}")
+
+    def active_chat_count(self) -> int:
+        """Chats started on this worker since startup that have not ended"""
+        return max(self.chats_started - self.chats_ended, 0)
+
+    def _record_match(self, chat_id: str, user_id: str, partner_id: str, school: str) -> None:
+        self.chats_started += 1
+        # ผู้ที่รออยู่ (partner) ได้รับผลผ่าน waiting-status หรือ SSE
+        result = self._match_result(chat_id, user_id, school)
+        self.matches.set(partner_id, result)
+        event_bus.publish(partner_id, "matched", result)
+        event_bus.publish(user_id, "matched", self._match_result(chat_id, partner_id, school))
+
+    async def leave_chat(self, chat_id: str, user_id: str) -> None:
+        chat = await self.get_chat_for_user(chat_id, user_id)
+        partner_id = chat['user2_id'] if user_id == chat['user1_id'] else chat['user1_id']
+        if chat.get('status') == 'active':
+            await Chat.end_chat(chat_id)
+            self.chats_ended += 1
+
+        self.matches.pop(user_id)
+        self.matches.pop(partner_id)
+        event_bus.publish(partner_id, "partner_left", {"chat_id": chat_id, "partner": user_id})
+        for participant in (user_id, partner_id):
+            event_bus.publish(participant, "chat_ended", {"chat_id": chat_id})
+        await connection_manager.broadcast(chat_id, {"type": "chat_ended", "chat_id": chat_id})
+
+    @staticmethod
+    def _match_result(chat_id: str, partner_id: str, school: str) -> Dict:
+        return {
+            "status": "matched",
+            "chat_id": chat_id,
+            "partner": {
+                "username": partner_id,
+                "school": school,
+                "online": True
+            }
+        }
+
     async def reset(self) -> None:
         try:
             # ลบข้อมูลทั้งหมด
-            batch = db.batch()
-            
-            # ลบคิวรอ
-            waiting_refs = db.collection('waiting_users').limit(500).get()
-            for ref in waiting_refs:
-                batch.delete(ref.reference)
+            # ล้างคิวรอ
+            self.queue.clear()
+            self.matches.clear()
             
             # ลบแชทที่ active
-            chat_refs = db.collection(CHATS_COLLECTION).where('status', '==', 'active').limit(500).get()
-            for ref in chat_refs:
-                batch.delete(ref.reference)
+            operations = []
+            chat_docs = await store.query_documents(
+                CHATS_COLLECTION,
+                filters=[('status', '==', 'active')],
+                limit=500
+            )
+            for doc_id, _ in chat_docs:
+                operations.append(('delete', CHATS_COLLECTION, doc_id, None))
             
             # ดำเนินการลบ
-            batch.commit()
+            await store.commit_batch(operations)
             logger.info("Reset chat system completed")
             
         except Exception as e:
             logger.error(f"Error resetting chat system: {e}")
             raise HTTPException(status_code=400, detail=str(e))
 
+# ใช้แทน message ID ที่ไม่รู้ (cursor รุ่นเก่าหรือ timestamp เปล่า)
+# AFTER_ALL_IDS อยู่หลังทุก ID ในเวลาเดียวกัน ส่วน BEFORE_ALL_IDS อยู่ก่อนทุก ID
+AFTER_ALL_IDS = "\uffff"
+BEFORE_ALL_IDS = ""
+
+def encode_cursor(created_at: datetime, message_id: str) -> str:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    payload = json.dumps({"t": created_at.isoformat(), "id": message_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(value: str) -> Optional[Tuple[datetime, Optional[str]]]:
+    """(created_at, message ID); the ID is None for cursors issued before IDs were included"""
+    try:
+        padded = value + "=" * (-len(value) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), payload.get("id")
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+def _presence(user_id: str, user_data: Optional[Dict]) -> bool:
+    is_online = presence_tracker.is_online(user_id)
+    return _is_online(user_data) if is_online is None else is_online
+
+def _is_online(user_data: Optional[Dict]) -> bool:
+    last_online = user_data.get('last_online') if user_data else None
+    if not last_online:
+        return False
+    # Firestore คืนค่า datetime แบบมี timezone
+    if last_online.tzinfo is not None:
+        last_online = last_online.astimezone(timezone.utc).replace(tzinfo=None)
+    return (datetime.utcnow() - last_online) < timedelta(seconds=settings.ONLINE_WINDOW_SECONDS)
+
 # สร้าง instance เดียวใช้ทั้งระบบ
-chat_manager = ChatManager()
\ No newline at end of file
+chat_manager = ChatManager()
+
+# อ่านค่าตอน scrape เท่านั้น ไม่มีต้นทุนบน hot path
+Gauge(
+    "matchmaking_queue_depth",
+    "Users waiting for a partner on this worker",
+    function=lambda: chat_manager.queue.depth()
+)
+Gauge(
+    "chat_active_chats",
+    "Chats started on this worker that have not ended",
+    function=chat_manager.active_chat_count
+)
+Gauge(
+    "chat_websocket_connections",
+    "Open chat WebSocket connections on this worker",
+    function=connection_manager.count
+)
\ No newline at end of file
@@ -0,0 +1,48 @@
+# utils/connections.py
+import asyncio
+from typing import Any, Dict, Set
+from fastapi import WebSocket
+from logging_config import logger
+from utils.serialization import dumps_json
+
+class ConnectionManager:
+    """Open chat WebSockets grouped by chat_id
+
+    Connections live in this process, so both participants of a chat must
+    be connected to the same worker to see each other's pushes.
+    """
+
+    def __init__(self):
+        self._connections: Dict[str, Set[WebSocket]] = {}
+
+    async def connect(self, chat_id: str, websocket: WebSocket) -> None:
+        await websocket.accept()
+        self._connections.setdefault(chat_id, set()).add(websocket)
+
+    def disconnect(self, chat_id: str, websocket: WebSocket) -> None:
+        connections = self._connections.get(chat_id)
+        if connections is None:
+            return
+        connections.discard(websocket)
+        if not connections:
+            del self._connections[chat_id]
+
+    async def broadcast(self, chat_id: str, payload: Dict[str, Any]) -> None:
+        connections = list(self._connections.get(chat_id, ()))
+        if not connections:
+            return
+        # encode ครั้งเดียวแล้วส่งให้ทุกการเชื่อมต่อ
+        data = dumps_json(payload).decode()
+        results = await asyncio.gather(
+            *(websocket.send_text(data) for websocket in connections),
+            return_exceptions=True
+        )
+        for websocket, result in zip(connections, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error pushing to chat {chat_id}: {result}")
+                self.disconnect(chat_id, websocket)
+
+    def count(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+connection_manager = ConnectionManager()
@@ -0,0 +1,32 @@
+# utils/etag.py
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+def _part(value: Any) -> str:
+    if isinstance(value, datetime):
+        # เวลาจาก cache (naive UTC) กับจาก Firestore (มี timezone) ต้องได้ค่าเดียวกัน
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).isoformat()
+    return "" if value is None else str(value)
+
+def weak_etag(*parts: Any) -> str:
+    """Weak ETag from the values a response depends on (versions, query params)"""
+    digest = hashlib.sha1("\x1f".join(_part(p) for p in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check using weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
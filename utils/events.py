@@ -0,0 +1,45 @@
+# utils/events.py
+import asyncio
+from typing import Any, Dict, Optional, Set
+from utils.serialization import dumps_json
+
+# จำนวน event ที่ค้างได้ต่อการเชื่อมต่อ ถ้าเกินจะทิ้ง event ใหม่
+MAX_PENDING_EVENTS = 100
+
+class EventBus:
+    """Per-user event queues for Server-Sent Events streams
+
+    Subscribers live in this process, so events only reach clients
+    connected to the worker that published them.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def subscribe(self, username: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        self._subscribers.setdefault(username, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, username: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(username)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[username]
+
+    def publish(self, username: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        for queue in self._subscribers.get(username, ()):
+            try:
+                queue.put_nowait((event, data or {}))
+            except asyncio.QueueFull:
+                pass
+
+    def count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps_json(data).decode()}\n\n"
+
+event_bus = EventBus()
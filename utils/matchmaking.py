@@ -0,0 +1,137 @@
+# utils/matchmaking.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+class MatchmakingQueue:
+    """Per-school waiting queues kept in memory
+
+    Every operation is O(1) and none of them awaits, so pairing is atomic on
+    the event loop: two callers can never take the same partner. Queues are
+    per process, so matchmaking must run on a single worker (or with users
+    of a school routed to the same worker).
+    """
+
+    def __init__(self, wait_timeout: float):
+        # ถ้าไม่ได้เช็คสถานะเกินเวลานี้ ถือว่าออกจากคิวไปแล้ว
+        self.wait_timeout = wait_timeout
+        self._queues: Dict[str, "OrderedDict[str, float]"] = {}  # school -> {username: last_seen}
+        self._schools: Dict[str, str] = {}                        # username -> school
+
+    def enqueue(self, username: str, school: str, front: bool = False, last_seen: Optional[float] = None) -> None:
+        """Add a waiting user; pass last_seen when putting someone back so their timeout keeps running"""
+        self.cancel(username)
+        queue = self._queues.setdefault(school, OrderedDict())
+        queue[username] = time.monotonic() if last_seen is None else last_seen
+        if front:
+            queue.move_to_end(username, last=False)
+        self._schools[username] = school
+
+    def cancel(self, username: str) -> bool:
+        school = self._schools.pop(username, None)
+        if school is None:
+            return False
+        queue = self._queues[school]
+        del queue[username]
+        if not queue:
+            del self._queues[school]
+        return True
+
+    def touch(self, username: str) -> Optional[str]:
+        """Mark a waiting user as still present, returns their school"""
+        school = self._schools.get(username)
+        if school is not None:
+            self._queues[school][username] = time.monotonic()
+        return school
+
+    def match(self, username: str, school: str) -> Optional[str]:
+        """Take the longest-waiting partner, or enqueue the user if there is none"""
+        self.cancel(username)
+        partner = self._pop(school)
+        if partner is None:
+            self.enqueue(username, school)
+        return partner
+
+    def pair_all(self, max_pairs: int) -> List[Tuple[str, str, str]]:
+        """Pair up everyone waiting, oldest first, as (user1, user2, school)"""
+        pairs = []
+        for school in list(self._queues):
+            while len(pairs) < max_pairs:
+                entry = self._pop_entry(school)
+                if entry is None:
+                    break
+                first, first_seen = entry
+                second = self._pop(school)
+                if second is None:
+                    # เหลือคนเดียว ให้รอรอบถัดไปที่หัวคิว โดยไม่ต่อเวลารอให้
+                    # ถ้าเลิกเช็คสถานะไปแล้วจะหมดเวลาและหลุดจากคิว ticker จะได้หยุด
+                    self.enqueue(first, school, front=True, last_seen=first_seen)
+                    break
+                pairs.append((first, second, school))
+        return pairs
+
+    def depth(self, school: Optional[str] = None) -> int:
+        if school is None:
+            return len(self._schools)
+        return len(self._queues.get(school, ()))
+
+    def clear(self) -> None:
+        self._queues.clear()
+        self._schools.clear()
+
+    def _pop(self, school: str) -> Optional[str]:
+        entry = self._pop_entry(school)
+        return entry[0] if entry else None
+
+    def _pop_entry(self, school: str) -> Optional[Tuple[str, float]]:
+        """Oldest user still waiting as (username, last_seen), dropping timed-out ones"""
+        queue = self._queues.get(school)
+        deadline = time.monotonic() - self.wait_timeout
+        entry = None
+        while queue:
+            username, last_seen = queue.popitem(last=False)
+            del self._schools[username]
+            if last_seen >= deadline:
+                entry = (username, last_seen)
+                break
+        if queue is not None and not queue:
+            del self._queues[school]
+        return entry
+
+class PendingMatches:
+    """Match results waiting to be picked up by the user who was waiting
+
+    Entries expire after ttl seconds, the same as a waiting user who stops
+    polling, so results for clients that never come back don't pile up.
+    Every entry has the same ttl, so insertion order is expiry order and
+    the sweep only looks at the oldest entries.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._results: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def set(self, username: str, result: Dict[str, Any]) -> None:
+        self._expire()
+        self._results.pop(username, None)
+        self._results[username] = (time.monotonic() + self.ttl, result)
+
+    def pop(self, username: str) -> Optional[Dict[str, Any]]:
+        self._expire()
+        entry = self._results.pop(username, None)
+        return entry[1] if entry else None
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._results)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._results:
+            username, (expires_at, _) = next(iter(self._results.items()))
+            if expires_at > now:
+                break
+            del self._results[username]
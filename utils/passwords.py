@@ -0,0 +1,56 @@
+# utils/passwords.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from passlib.context import CryptContext
+
+class PasswordHasherBusy(Exception):
+    """Too many hash/verify calls are already waiting for a worker"""
+
+class PasswordHasher:
+    """bcrypt hashing and verification off the event loop
+
+    bcrypt releases the GIL while it works, so a thread pool runs one hash
+    per core in parallel without the cost of shipping work to processes.
+    Calls beyond max_pending fail fast with PasswordHasherBusy instead of
+    queueing without bound behind a login burst.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        # min/max เท่ากับ rounds: hash ที่ใช้ cost อื่นจะถูกนับว่าต้อง rehash
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds
+        )
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.rejected = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(self.context.verify, password, hashed)
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash when the stored one is outdated"""
+        return await self._run(self.context.verify_and_update, password, hashed)
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending, "rejected": self.rejected}
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+        finally:
+            self.pending -= 1
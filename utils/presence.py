@@ -0,0 +1,235 @@
+# utils/presence.py
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from logging_config import logger
+from models import User, store
+from models.base import NotFoundError
+from firebase_config import USERS_COLLECTION, ONLINE_COUNTS_COLLECTION
+from config import settings
+
+# Firestore รับได้สูงสุด 500 operation ต่อ batch
+MAX_BATCH_SIZE = 500
+
+class PresenceTracker:
+    """Last-seen times kept in memory and flushed to Firestore in batches
+
+    Heartbeats only touch memory. A background flush writes the latest
+    last_online of each changed user at most once per flush_seconds, so a
+    user with many open tabs still costs one write per interval.
+
+    Online users are also counted per school as heartbeats arrive and
+    expire. Each worker persists its counts with every flush and sums the
+    other workers' counts from Firestore, refreshed in the background.
+    A worker removes its counts on close(); counts of workers that died
+    carry expires_at so a Firestore TTL policy can purge them.
+    """
+
+    def __init__(self, online_seconds: float, flush_seconds: float):
+        self.online_seconds = online_seconds
+        self.flush_seconds = flush_seconds
+        self._last_seen: Dict[str, Optional[float]] = {}  # username -> epoch (None = offline)
+        self._dirty: set = set()
+        self._flusher: Optional[asyncio.Task] = None
+        # ผู้ใช้ที่ออนไลน์ เรียงจาก heartbeat เก่าสุด ใช้ลดตัวนับเมื่อหมดเวลา
+        self._active: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._counts: Dict[str, int] = {}          # school -> online users on this worker
+        self._remote_counts: Dict[str, int] = {}   # school -> online users on other workers
+        self._remote_refreshed = 0.0
+        self._remote_task: Optional[asyncio.Task] = None
+        self._worker_id = uuid.uuid4().hex
+        self._counts_written = False
+
+    def heartbeat(self, username: str, school: Optional[str] = None) -> None:
+        now = time.time()
+        self._last_seen[username] = now
+        self._mark_dirty(username)
+
+        previous = self._active.pop(username, None)
+        if previous is None:
+            self._increment(school)
+        else:
+            school = school or previous[1]
+            if school != previous[1]:
+                self._decrement(previous[1])
+                self._increment(school)
+        self._active[username] = (now, school)
+        self._expire(now)
+
+    def remove(self, username: str) -> None:
+        """Mark a user offline (e.g. on logout)"""
+        self._last_seen[username] = None
+        self._mark_dirty(username)
+        entry = self._active.pop(username, None)
+        if entry is not None:
+            self._decrement(entry[1])
+
+    def online_count(self, school: str) -> int:
+        """Online users in a school across all workers, O(1)"""
+        self._expire(time.time())
+        self._maybe_refresh_remote()
+        return self._counts.get(school, 0) + self._remote_counts.get(school, 0)
+
+    def online_total(self) -> int:
+        """Online users of every school across all workers"""
+        self._expire(time.time())
+        self._maybe_refresh_remote()
+        return sum(self._counts.values()) + sum(self._remote_counts.values())
+
+    def is_online(self, username: str) -> Optional[bool]:
+        """Answer locally, or None if this worker has not seen the user"""
+        if username not in self._last_seen:
+            return None
+        last_seen = self._last_seen[username]
+        return last_seen is not None and time.time() - last_seen < self.online_seconds
+
+    async def flush(self) -> int:
+        """Write pending last_online values, returns the number of users written"""
+        if not self._dirty:
+            return 0
+        usernames, self._dirty = list(self._dirty), set()
+        operations = []
+        for username in usernames:
+            last_seen = self._last_seen.get(username)
+            last_online = datetime.utcfromtimestamp(last_seen) if last_seen is not None else None
+            operations.append(('update', USERS_COLLECTION, username, {'last_online': last_online}))
+
+        written = 0
+        for i in range(0, len(operations), MAX_BATCH_SIZE):
+            chunk = operations[i:i + MAX_BATCH_SIZE]
+            try:
+                written += await self._commit_presence(chunk)
+            except Exception as e:
+                logger.error(f"Error flushing presence: {e}")
+                # เขียนไม่สำเร็จ เก็บไว้ลองใหม่รอบหน้า
+                self._dirty.update(username for _, _, username, _ in chunk)
+
+        try:
+            self._expire(time.time())
+            now = datetime.utcnow()
+            await store.set_document(ONLINE_COUNTS_COLLECTION, self._worker_id, {
+                'counts': dict(self._counts),
+                'updated_at': now,
+                'expires_at': now + timedelta(hours=1)
+            })
+            self._counts_written = True
+        except Exception as e:
+            logger.error(f"Error persisting online counts: {e}")
+
+        self._prune()
+        return written
+
+    async def close(self) -> None:
+        """Flush pending writes and remove this worker's counts (on shutdown)"""
+        await self.flush()
+        if not self._counts_written:
+            # ไม่เคยเขียนตัวนับ ไม่ต้องแตะ Firestore ตอนปิด
+            return
+        try:
+            await store.delete_document(ONLINE_COUNTS_COLLECTION, self._worker_id)
+            self._counts_written = False
+        except Exception as e:
+            logger.error(f"Error removing online counts: {e}")
+
+    def _stale_after(self) -> float:
+        # ผู้ใช้ของ worker ยังนับว่าออนไลน์ได้ตลอด online window แม้ flush รอบล่าสุดจะช้า
+        return max(2 * self.flush_seconds, self.online_seconds)
+
+    async def _commit_presence(self, chunk) -> int:
+        """Commit one batch of last_online updates, skipping users that no longer exist"""
+        try:
+            await store.commit_batch(chunk)
+        except NotFoundError:
+            # เอกสารผู้ใช้ที่ถูกลบไปทำให้ทั้ง batch ล้ม ตัดคนที่ไม่มีแล้วออกแล้วลองใหม่
+            # ไม่ใช้ merge เพราะจะสร้างเอกสารผู้ใช้ว่างๆ ขึ้นมาใหม่
+            existing = await store.get_documents(USERS_COLLECTION, [username for _, _, username, _ in chunk])
+            chunk = [op for op in chunk if existing.get(op[2]) is not None]
+            if chunk:
+                await store.commit_batch(chunk)
+        # cache ของ worker นี้ยังถือ last_online ค่าเก่าอยู่
+        User.forget_cached(username for _, _, username, _ in chunk)
+        return len(chunk)
+
+    def _mark_dirty(self, username: str) -> None:
+        self._dirty.add(username)
+        if self._flusher is None or self._flusher.done():
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # นอก event loop ไม่ต้องสร้าง coroutine ที่ไม่มีใคร await
+                return
+            self._flusher = store.background_task(self._run_flushes())
+
+    async def _run_flushes(self) -> None:
+        # ทำงานเฉพาะตอนที่มีข้อมูลรอเขียน และหยุดเองเมื่อไม่มี
+        while self._dirty:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def _increment(self, school: Optional[str]) -> None:
+        if school is not None:
+            self._counts[school] = self._counts.get(school, 0) + 1
+
+    def _decrement(self, school: Optional[str]) -> None:
+        if school is None:
+            return
+        count = self._counts.get(school, 0) - 1
+        if count > 0:
+            self._counts[school] = count
+        else:
+            self._counts.pop(school, None)
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.online_seconds
+        while self._active:
+            username, (last_seen, school) = next(iter(self._active.items()))
+            if last_seen >= cutoff:
+                break
+            self._active.popitem(last=False)
+            self._decrement(school)
+
+    def _maybe_refresh_remote(self) -> None:
+        if time.monotonic() - self._remote_refreshed < self.flush_seconds:
+            return
+        if self._remote_task and not self._remote_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._remote_task = store.background_task(self._refresh_remote())
+
+    async def _refresh_remote(self) -> None:
+        try:
+            # นับเฉพาะ worker ที่ยังเขียนตัวนับภายในสองรอบล่าสุด หรือภายใน online window ถ้านานกว่า
+            since = datetime.utcnow() - timedelta(seconds=self._stale_after())
+            docs = await store.query_documents(
+                ONLINE_COUNTS_COLLECTION,
+                filters=[('updated_at', '>', since)]
+            )
+            counts: Dict[str, int] = {}
+            for worker_id, entry in docs:
+                if worker_id == self._worker_id:
+                    continue
+                for school, count in entry.get('counts', {}).items():
+                    counts[school] = counts.get(school, 0) + count
+            self._remote_counts = counts
+        except Exception as e:
+            logger.error(f"Error refreshing online counts: {e}")
+        finally:
+            self._remote_refreshed = time.monotonic()
+
+    def _prune(self) -> None:
+        # ลืมผู้ใช้ที่ออฟไลน์ไปนานแล้ว ให้กลับไปใช้ข้อมูลจาก Firestore แทน
+        cutoff = time.time() - self.online_seconds
+        for username, last_seen in list(self._last_seen.items()):
+            if username not in self._dirty and (last_seen is None or last_seen < cutoff):
+                del self._last_seen[username]
+
+presence_tracker = PresenceTracker(
+    settings.ONLINE_WINDOW_SECONDS,
+    settings.PRESENCE_FLUSH_SECONDS
+)
@@ -0,0 +1,127 @@
+# utils/revocation.py
+import asyncio
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from logging_config import logger
+from models import store
+from firebase_config import REVOKED_TOKENS_COLLECTION
+from config import settings
+
+class RevocationList:
+    """In-memory set of revoked tokens and users
+
+    Entries are persisted to Firestore so every worker sees them. A worker
+    loads the collection before its first check (see ensure_loaded) and then
+    reloads it in the background every REVOCATION_REFRESH_SECONDS instead
+    of reading it per request.
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._tokens: Dict[str, float] = {}        # jti -> expires_at (epoch)
+        self._users: Dict[str, float] = {}         # username -> revoked_at (epoch)
+        self._user_expiry: Dict[str, float] = {}   # username -> expires_at (epoch)
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loaded = False
+        self._load_lock: Optional[asyncio.Lock] = None
+
+    async def ensure_loaded(self) -> None:
+        """Load revocations once before the first check on this worker"""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            # ถ้าโหลดไม่สำเร็จ จะลองใหม่ในการเช็คครั้งถัดไป
+            if not self._loaded:
+                self._loaded = await self.refresh()
+
+    def is_revoked(self, jti: Optional[str], username: str, issued_at: float) -> bool:
+        self._maybe_refresh()
+        now = time.time()
+        if jti and self._tokens.get(jti, 0) > now:
+            return True
+        revoked_at = self._users.get(username)
+        return (
+            revoked_at is not None
+            and self._user_expiry[username] > now
+            and issued_at <= revoked_at
+        )
+
+    async def revoke_token(self, jti: str, expires_at: float) -> None:
+        """Revoke a single token until it would have expired anyway"""
+        self._tokens[jti] = expires_at
+        await store.set_document(REVOKED_TOKENS_COLLECTION, f"token:{jti}", {
+            'type': 'token',
+            'jti': jti,
+            'expires_at': datetime.utcfromtimestamp(expires_at)
+        })
+
+    async def revoke_user(self, username: str) -> None:
+        """Revoke every token issued to a user up to now"""
+        revoked_at = time.time()
+        expires_at = revoked_at + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        self._users[username] = revoked_at
+        self._user_expiry[username] = expires_at
+        await store.set_document(REVOKED_TOKENS_COLLECTION, f"user:{username}", {
+            'type': 'user',
+            'username': username,
+            'revoked_at': datetime.utcfromtimestamp(revoked_at),
+            'expires_at': datetime.utcfromtimestamp(expires_at)
+        })
+
+    async def refresh(self) -> bool:
+        """Reload unexpired revocations from Firestore, returns whether it succeeded"""
+        try:
+            docs = await store.query_documents(
+                REVOKED_TOKENS_COLLECTION,
+                filters=[('expires_at', '>', datetime.utcnow())]
+            )
+            tokens, users, user_expiry = {}, {}, {}
+            for _, entry in docs:
+                expires_at = _epoch(entry['expires_at'])
+                if entry.get('type') == 'user':
+                    users[entry['username']] = _epoch(entry['revoked_at'])
+                    user_expiry[entry['username']] = expires_at
+                else:
+                    tokens[entry['jti']] = expires_at
+
+            # เก็บรายการที่เพิ่ง revoke ในเครื่องนี้ไว้ด้วย เผื่อ Firestore ยังไม่ทันเห็น
+            now = time.time()
+            for jti, expires_at in self._tokens.items():
+                if expires_at > now:
+                    tokens.setdefault(jti, expires_at)
+            for username, revoked_at in self._users.items():
+                if self._user_expiry[username] > now and username not in users:
+                    users[username] = revoked_at
+                    user_expiry[username] = self._user_expiry[username]
+
+            self._tokens, self._users, self._user_expiry = tokens, users, user_expiry
+            return True
+        except Exception as e:
+            logger.error(f"Error refreshing revocation list: {e}")
+            return False
+        finally:
+            self._last_refresh = time.monotonic()
+
+    def _maybe_refresh(self) -> None:
+        if time.monotonic() - self._last_refresh < self.refresh_seconds:
+            return
+        if self._refresh_task and not self._refresh_task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # ยังไม่มี event loop ไว้ refresh ตอนตรวจ token ครั้งถัดไป
+            return
+        self._refresh_task = store.background_task(self.refresh())
+
+def _epoch(value: datetime) -> float:
+    # Firestore คืนค่าเป็น datetime แบบมี timezone ส่วนค่าที่เราเขียนเป็น UTC แบบ naive
+    if value.tzinfo is None:
+        return (value - datetime(1970, 1, 1)).total_seconds()
+    return value.timestamp()
+
+revocation_list = RevocationList(settings.REVOCATION_REFRESH_SECONDS)
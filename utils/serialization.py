@@ -0,0 +1,105 @@
+# utils/serialization.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+import msgpack
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# รูปแบบ response ที่ client ขอผ่าน Accept ตั้งค่าต่อ request ใน middleware
+_media_type: ContextVar[str] = ContextVar("response_media_type", default=JSON_MEDIA_TYPE)
+
+def _default(obj: Any) -> Any:
+    # orjson จัดการ datetime ธรรมดาเองได้ แต่ไม่รู้จัก subclass ของ Firestore
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Type is not serializable: {type(obj).__name__}")
+
+def dumps_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+def dumps_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+def _media_ranges(accept: str) -> List[Tuple[str, float]]:
+    """(media range, q) pairs of an Accept header; ranges with a malformed q are ignored"""
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = -1.0
+        if 0.0 <= quality <= 1.0:
+            ranges.append((media_range.lower(), quality))
+    return ranges
+
+def _quality(ranges: List[Tuple[str, float]], media_type: str) -> Tuple[int, float]:
+    """(specificity, q) of the most specific range matching media_type, (-1, 0) if none does"""
+    best = (-1, 0.0)
+    for media_range, quality in ranges:
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == media_type.split("/")[0] + "/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best[0]:
+            best = (specificity, quality)
+    return best
+
+def preferred_media_type(accept: Optional[str]) -> str:
+    """MessagePack when Accept names it with a q at least as high as JSON's, JSON otherwise
+
+    Wildcards alone never select MessagePack, since most clients send */*.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    ranges = _media_ranges(accept)
+    specificity, msgpack_quality = _quality(ranges, MSGPACK_MEDIA_TYPE)
+    if specificity == 2 and msgpack_quality > 0 and msgpack_quality >= _quality(ranges, JSON_MEDIA_TYPE)[1]:
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+@contextmanager
+def negotiate(accept: Optional[str]):
+    """Pick the response format for the request handled inside the block"""
+    token = _media_type.set(preferred_media_type(accept))
+    try:
+        yield
+    finally:
+        _media_type.reset(token)
+
+class NegotiatedResponse(Response):
+    """orjson-encoded JSON, or MessagePack if the request asked for it
+
+    Used as the app's default response class. Routes on hot paths can also
+    return it directly to skip FastAPI's jsonable_encoder pass.
+    """
+
+    def __init__(self, content: Any = None, *args, **kwargs):
+        self.media_type = _media_type.get()
+        super().__init__(content, *args, **kwargs)
+        self.headers.setdefault("vary", "Accept")
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type == MSGPACK_MEDIA_TYPE:
+            return dumps_msgpack(content)
+        return dumps_json(content)